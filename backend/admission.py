@@ -0,0 +1,487 @@
+"""
+Team Run 准入控制 (Admission Control)
+
+所有 /teams/{team_id}/runs 請求原本都直接在 uvicorn worker 裡執行；50 個使用者同時送出就會同時啟動
+50 條 LLM + tool pipeline，LiteLLM、Tavily、ComfyUI 一起逾時。
+
+AdmissionMiddleware 在 run 開始前取得執行名額：
+1. 全域同時執行上限（ADMISSION_MAX_CONCURRENT）與每個使用者的上限（ADMISSION_MAX_PER_USER）
+2. 沒有名額時進入依 user_id 分組的公平佇列，以加權輪詢（weighted round-robin）決定下一個執行者，
+   單一使用者連送多個請求不會擠掉其他人
+3. 佇列已滿 → 429 + Retry-After + 預估等待秒數
+4. 排入佇列的串流請求立即回應 SSE，每隔幾秒送出 `RunQueued` 事件（排隊位置、預估秒數），
+   取得名額後在同一個串流中接續 run 的事件；非串流請求則等待取得名額後才執行
+5. 預估時間以 run 執行時間的 EWMA 計算
+
+與 run_streams 併用時本 middleware 位於內層：背景執行中的 run 會一直佔用名額到真正結束為止。
+名額以 shared_state 的租約計算：多 worker 部署（SHARED_STATE_BACKEND=postgres / redis）時上限為所有 worker 合計，
+名額釋放時通知其他 worker 重新分配；佇列與公平排序仍在各 worker 內進行。
+
+環境變數：
+    ADMISSION_MAX_CONCURRENT      全域同時執行的 team run 上限（預設 8）
+    ADMISSION_MAX_PER_USER        每個使用者同時執行的上限（預設 2）
+    ADMISSION_MAX_QUEUE           佇列總長度上限（預設 50）
+    ADMISSION_MAX_QUEUE_PER_USER  每個使用者排隊數上限（預設 5）
+    ADMISSION_QUEUE_TIMEOUT       排隊逾時秒數（預設 180）
+    ADMISSION_USER_WEIGHTS        使用者權重，例如 "alice:2,batch-bot:1"（未列出者為 1）
+    ADMISSION_LEASE_TTL           名額租約秒數，執行中每 1/3 TTL 續期一次（預設 60）
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import re
+import time
+import uuid
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+from urllib.parse import parse_qs
+
+from starlette.requests import Request
+
+from metrics import ADMISSION_REJECTED, ADMISSION_WAIT
+from shared_state import WORKER_ID, SharedState, get_shared_state
+
+logger = logging.getLogger(__name__)
+
+_TEAM_RUN_PATH = re.compile(r"/teams/[^/]+/runs$")
+
+# 排隊中送出 RunQueued 的間隔；同時避免反向代理因閒置切斷連線
+HEARTBEAT_SECONDS = 5.0
+
+
+class QueueFull(Exception):
+    def __init__(self, reason: str, eta_seconds: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.eta_seconds = eta_seconds
+
+
+@dataclass
+class _Ticket:
+    user_id: str
+    seq: int
+    enqueued_at: float = field(default_factory=time.monotonic)
+    admitted: asyncio.Event = field(default_factory=asyncio.Event)
+    holder: str = ""
+
+
+def _parse_weights(raw: str) -> Dict[str, int]:
+    weights: Dict[str, int] = {}
+    for part in raw.split(","):
+        user, _, weight = part.strip().rpartition(":")
+        if user and weight.isdigit():
+            weights[user] = max(int(weight), 1)
+    return weights
+
+
+GLOBAL_LEASE = "admission:global"
+
+
+def _user_lease(user_id: str) -> str:
+    return f"admission:user:{user_id}"
+
+
+class AdmissionController:
+    """名額以 SharedState 的租約計算（多 worker 時為全域上限）；排隊與加權輪詢在各 worker 的 event loop 中進行。"""
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        max_per_user: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        max_queue_per_user: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        weights: Optional[Dict[str, int]] = None,
+        state: Optional[SharedState] = None,
+        lease_ttl: Optional[float] = None,
+    ):
+        self.max_concurrent = max_concurrent or int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))
+        self.max_per_user = max_per_user or int(os.getenv("ADMISSION_MAX_PER_USER", "2"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("ADMISSION_MAX_QUEUE", "50"))
+        self.max_queue_per_user = (
+            max_queue_per_user if max_queue_per_user is not None else int(os.getenv("ADMISSION_MAX_QUEUE_PER_USER", "5"))
+        )
+        self.queue_timeout = queue_timeout or float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "180"))
+        self.weights = weights if weights is not None else _parse_weights(os.getenv("ADMISSION_USER_WEIGHTS", ""))
+        self.state = state or get_shared_state()
+        self.lease_ttl = lease_ttl or float(os.getenv("ADMISSION_LEASE_TTL", "60"))
+
+        self.running: Dict[str, int] = defaultdict(int)
+        self.total_running = 0
+        self.held: Dict[str, str] = {}  # 本 worker 持有的租約：holder → user_id
+        self.queues: Dict[str, Deque[_Ticket]] = {}
+        self.ring: List[str] = []
+        self.cursor = 0
+        self.credits: Dict[str, int] = {}
+        self.avg_duration = 30.0
+        self._seq = itertools.count()
+        self.admitted_total = 0
+        self.queued_total = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._dispatch_lock: Optional[asyncio.Lock] = None
+        self._refresher: Optional[asyncio.Task] = None
+
+    async def _io(self, fn, *args):
+        # 共用後端是同步的網路呼叫，移到執行緒以免卡住 event loop；memory 後端直接呼叫
+        if self.state.distributed:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _bind_loop(self) -> None:
+        """第一次在 event loop 中使用時建立 lock、租約續期 task 與跨 worker 的釋放通知。"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._dispatch_lock = asyncio.Lock()
+        self._refresher = loop.create_task(self._refresh_leases())
+        if self.state.distributed:
+            def on_release(worker_id: str) -> None:
+                if worker_id != WORKER_ID:
+                    loop.call_soon_threadsafe(lambda: loop.create_task(self.dispatch()))
+
+            self.state.subscribe("admission", on_release)
+
+    async def _refresh_leases(self) -> None:
+        # 執行中的 run 定期續期；worker 當掉時租約在 lease_ttl 內過期，名額自動歸還
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            for holder, user_id in list(self.held.items()):
+                try:
+                    await self._io(self.state.refresh, GLOBAL_LEASE, holder, self.lease_ttl)
+                    await self._io(self.state.refresh, _user_lease(user_id), holder, self.lease_ttl)
+                except Exception as e:
+                    logger.warning(f"[admission] lease refresh failed: {e}")
+
+    # ------------------------------------------------------------------
+    # 名額
+    # ------------------------------------------------------------------
+    async def _acquire_slot(self, user_id: str, holder: str) -> Optional[str]:
+        """取得全域 + 使用者租約；失敗時回傳卡住的是 "global" 還是 "user"。"""
+        if not await self._io(self.state.acquire, GLOBAL_LEASE, holder, self.max_concurrent, self.lease_ttl):
+            return "global"
+        if await self._io(self.state.acquire, _user_lease(user_id), holder, self.max_per_user, self.lease_ttl):
+            return None
+        await self._io(self.state.release, GLOBAL_LEASE, holder)
+        return "user"
+
+    async def _release_slot(self, user_id: str, holder: str) -> None:
+        await self._io(self.state.release, _user_lease(user_id), holder)
+        await self._io(self.state.release, GLOBAL_LEASE, holder)
+
+    async def try_acquire(self, user_id: str) -> Optional[str]:
+        """立即取得名額時回傳租約 holder id，否則回傳 None。"""
+        self._bind_loop()
+        # 有排隊中的同使用者請求時不得插隊；本 worker 其他使用者的排隊請求此時必定都卡在各自的上限
+        if self.queues.get(user_id):
+            return None
+        holder = uuid.uuid4().hex
+        if await self._acquire_slot(user_id, holder) is None:
+            self._admit(user_id, holder)
+            return holder
+        return None
+
+    def _admit(self, user_id: str, holder: str) -> None:
+        self.held[holder] = user_id
+        self.running[user_id] += 1
+        self.total_running += 1
+        self.admitted_total += 1
+
+    async def release(self, user_id: str, holder: str, duration: Optional[float] = None) -> None:
+        if self.held.pop(holder, None) is not None:
+            self.running[user_id] -= 1
+            if self.running[user_id] <= 0:
+                del self.running[user_id]
+            self.total_running -= 1
+        if duration is not None:
+            self.avg_duration = 0.8 * self.avg_duration + 0.2 * duration
+        await self._release_slot(user_id, holder)
+        if self.state.distributed:
+            await self._io(self.state.publish, "admission", WORKER_ID)
+        await self.dispatch()
+
+    # ------------------------------------------------------------------
+    # 佇列
+    # ------------------------------------------------------------------
+    def queued_count(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def enqueue(self, user_id: str) -> _Ticket:
+        queue = self.queues.get(user_id)
+        if self.queued_count() >= self.max_queue:
+            ADMISSION_REJECTED.labels("queue_full").inc()
+            raise QueueFull("Server is busy: the run queue is full", self.eta_for(self.queued_count()))
+        if queue is not None and len(queue) >= self.max_queue_per_user:
+            ADMISSION_REJECTED.labels("user_queue_full").inc()
+            raise QueueFull("Too many queued runs for this user", self.eta_for(self.queued_count()))
+        if queue is None:
+            queue = self.queues[user_id] = deque()
+            self.ring.append(user_id)
+        ticket = _Ticket(user_id=user_id, seq=next(self._seq))
+        queue.append(ticket)
+        self.queued_total += 1
+        return ticket
+
+    def _remove_user(self, user_id: str) -> None:
+        index = self.ring.index(user_id)
+        self.ring.pop(index)
+        del self.queues[user_id]
+        self.credits.pop(user_id, None)
+        if index < self.cursor:
+            self.cursor -= 1
+        if self.ring:
+            self.cursor %= len(self.ring)
+        else:
+            self.cursor = 0
+
+    async def _next_ticket(self, holder: str) -> Optional[_Ticket]:
+        """加權輪詢：輪到的使用者連續取得 weight 個名額後才換下一位；已達個人上限者跳過。"""
+        attempts = 0
+        while self.ring and attempts < len(self.ring):
+            user_id = self.ring[self.cursor]
+            blocked = await self._acquire_slot(user_id, holder)
+            if blocked == "global":
+                return None
+            if not self.queues.get(user_id):
+                # 等待租約期間該使用者的請求全部放棄了：abandon 已把他移出 ring 並讓 cursor 指向下一位，
+                # 歸還名額後改試下一位，不能就此停止分配（其他使用者仍在排隊）
+                if blocked is None:
+                    await self._release_slot(user_id, holder)
+                if user_id in self.queues:
+                    self._remove_user(user_id)
+                continue
+            attempts += 1
+            if blocked is None:
+                if self.credits.get(user_id, 0) <= 0:
+                    self.credits[user_id] = self.weights.get(user_id, 1)
+                self.credits[user_id] -= 1
+                ticket = self.queues[user_id].popleft()
+                if not self.queues[user_id]:
+                    self._remove_user(user_id)
+                elif self.credits[user_id] <= 0:
+                    self.cursor = (self.cursor + 1) % len(self.ring)
+                return ticket
+            self.credits[user_id] = 0
+            self.cursor = (self.cursor + 1) % len(self.ring)
+        return None
+
+    async def dispatch(self) -> None:
+        """把空出的名額分給排隊中的請求；名額釋放、其他 worker 通知與排隊 heartbeat 時呼叫。"""
+        if not self.queues:
+            return
+        self._bind_loop()
+        async with self._dispatch_lock:
+            while self.queues:
+                holder = uuid.uuid4().hex
+                ticket = await self._next_ticket(holder)
+                if ticket is None:
+                    return
+                self._admit(ticket.user_id, holder)
+                ticket.holder = holder
+                ticket.admitted.set()
+
+    async def abandon(self, ticket: _Ticket) -> None:
+        """排隊中的請求放棄（逾時 / client 離開）；若恰好已取得名額則歸還。"""
+        if ticket.admitted.is_set():
+            await self.release(ticket.user_id, ticket.holder)
+            return
+        queue = self.queues.get(ticket.user_id)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                self._remove_user(ticket.user_id)
+
+    def position(self, ticket: _Ticket) -> int:
+        """排在此 ticket 之前（較早排入）的請求數 + 1；加權輪詢下為近似值，且只計算本 worker 的佇列。"""
+        return 1 + sum(1 for q in self.queues.values() for t in q if t.seq < ticket.seq)
+
+    def eta_for(self, position: int) -> int:
+        return int(math.ceil(position / self.max_concurrent) * self.avg_duration)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "running": await self._io(self.state.count, GLOBAL_LEASE),
+            "running_local": self.total_running,
+            "queued": self.queued_count(),
+            "max_concurrent": self.max_concurrent,
+            "max_per_user": self.max_per_user,
+            "avg_run_seconds": round(self.avg_duration, 1),
+            "running_by_user": dict(self.running),
+            "queued_by_user": {user: len(q) for user, q in self.queues.items()},
+            "admitted_total": self.admitted_total,
+            "queued_total": self.queued_total,
+            "shared_state": self.state.describe(),
+        }
+
+
+admission_controller = AdmissionController()
+
+
+def _sse(event: str, payload: Dict[str, Any]) -> bytes:
+    return f"event: {event}\ndata: {json.dumps({'event': event, **payload}, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+class AdmissionMiddleware:
+    """純 ASGI middleware：team run 先取得名額才執行，沒有名額時排隊或回傳 429。"""
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def _read_request(self, scope, receive):
+        body_messages: List[Dict[str, Any]] = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None, None, None
+            body_messages.append(message)
+            if not message.get("more_body", False):
+                break
+
+        replay = list(body_messages)
+
+        async def replay_receive():
+            return replay.pop(0) if replay else {"type": "http.disconnect"}
+
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        user_id = query.get("user_id", [""])[0]
+        stream = True
+        form = await Request(scope, replay_receive).form()
+        try:
+            user_id = user_id or str(form.get("user_id") or "")
+            stream = str(form.get("stream", "true")).lower() in ("true", "1")
+        finally:
+            await form.close()
+        if not user_id:
+            client = scope.get("client")
+            user_id = f"anonymous:{client[0]}" if client else "anonymous"
+        return body_messages, user_id, stream
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not _TEAM_RUN_PATH.search(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        body_messages, user_id, stream = await self._read_request(scope, receive)
+        if body_messages is None:
+            return
+
+        async def app_receive():
+            if body_messages:
+                return body_messages.pop(0)
+            return await receive()
+
+        controller = self.controller
+        holder = await controller.try_acquire(user_id)
+        if holder is not None:
+            await self._run(scope, app_receive, send, user_id, holder)
+            return
+
+        try:
+            ticket = controller.enqueue(user_id)
+        except QueueFull as e:
+            body = json.dumps({"detail": e.reason, "eta_seconds": e.eta_seconds}, ensure_ascii=False).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(max(e.eta_seconds, 1)).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        if controller.state.distributed:
+            await controller.dispatch()  # try_acquire 失敗後其他 worker 可能剛好釋放名額
+
+        if stream:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache")],
+            })
+
+        wait_start = time.monotonic()
+        try:
+            while not ticket.admitted.is_set():
+                waited = time.monotonic() - wait_start
+                if waited >= controller.queue_timeout:
+                    raise asyncio.TimeoutError
+                if stream:
+                    position = controller.position(ticket)
+                    await send({"type": "http.response.body", "more_body": True, "body": _sse("RunQueued", {
+                        "position": position,
+                        "eta_seconds": controller.eta_for(position),
+                        "queued_seconds": int(waited),
+                    })})
+                try:
+                    await asyncio.wait_for(
+                        ticket.admitted.wait(), min(HEARTBEAT_SECONDS, controller.queue_timeout - waited)
+                    )
+                except asyncio.TimeoutError:
+                    if controller.state.distributed:
+                        # 保底：其他 worker 的釋放通知遺失或租約過期時，由 heartbeat 重新分配
+                        await controller.dispatch()
+        except asyncio.TimeoutError:
+            await controller.abandon(ticket)
+            ADMISSION_REJECTED.labels("queue_timeout").inc()
+            if stream:
+                await send({"type": "http.response.body", "more_body": False, "body": _sse("TeamRunError", {
+                    "content": f"Run was queued for more than {controller.queue_timeout:g}s and was not started.",
+                })})
+            else:
+                await send({"type": "http.response.start", "status": 503, "headers": [(b"content-type", b"application/json")]})
+                await send({"type": "http.response.body", "body": b'{"detail":"Run queue timeout"}'})
+            return
+        except BaseException:
+            await asyncio.shield(controller.abandon(ticket))
+            raise
+        ADMISSION_WAIT.observe(time.monotonic() - wait_start)
+
+        await self._run(scope, app_receive, self._continue_stream(send) if stream else send, user_id, ticket.holder)
+
+    @staticmethod
+    def _continue_stream(send):
+        """排隊時已送出 SSE 回應開頭：略過 app 的 response.start；非 200 的錯誤內容轉成 TeamRunError 事件。"""
+        state: Dict[str, Any] = {"status": 200, "error": b""}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                return
+            if message["type"] == "http.response.body" and state["status"] != 200:
+                state["error"] += message.get("body", b"")
+                if not message.get("more_body", False):
+                    detail = state["error"].decode("utf-8", errors="replace")
+                    await send({"type": "http.response.body", "more_body": False, "body": _sse("TeamRunError", {
+                        "content": f"HTTP {state['status']}: {detail}",
+                    })})
+                return
+            await send(message)
+
+        return send_wrapper
+
+    async def _run(self, scope, receive, send, user_id: str, holder: str) -> None:
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # client 斷線取消 run 時仍要確實歸還名額
+            await asyncio.shield(self.controller.release(user_id, holder, time.monotonic() - start))
+
+
+def install_admission(app, controller: Optional[AdmissionController] = None) -> None:
+    """加上 AdmissionMiddleware 與 GET /admission/stats；需在 install_run_streams 之前呼叫（內層）。"""
+    controller = controller or admission_controller
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+
+    @app.get("/admission/stats", tags=["Admission"])
+    async def admission_stats():
+        """目前執行中 / 排隊中的 team run 數量與每個使用者的分布。"""
+        return await controller.stats()
@@ -0,0 +1,711 @@
+"""
+Artifact Store：圖片 / 圖表 / 下載檔的內容定址儲存
+
+原本三個目錄各自建立、從不清理，同樣內容也會重複存放：
+    outputs/images   image.py 從 ComfyUI 下載的圖片
+    charts           research agent 以 Plotly 寫出的 HTML
+    downloads        research agent 產生的 pptx / xlsx / csv / pdf ...
+
+改為由 ArtifactStore 統一管理：
+    blobs/<aa>/<sha256>            內容定址，相同內容只存一份
+    refs/<kind>/<name>.json        對外名稱 → digest（URL 不變：/images/<name>、/charts/<name>、/download/<name>）
+    manifests/<session>.json       每個 session 產生過的 artifact，GC 以 session 為單位回收
+                                   （檔名同 scratch 目錄，經 _session_dir_name 處理；原始 session_id 記在內容中）
+
+寫入路徑：
+    image.py         直接 put_bytes("images", filename, ...)，不再寫 outputs/images
+    research agent   Python 程式寫到 CHARTS_DIR / DOWNLOADS_DIR，即該 session 專屬的 scratch 目錄
+                     data/scratch/<session_id>/{charts,downloads}；每次執行 Python 後與 run 結束時
+                     呼叫 ingest_session_scratch() 收進 store，只掃這個 session 的目錄，不會收到其他 session 的檔案
+    其他寫到共用 charts/、downloads/ 的檔案（shell、skills 腳本）不屬於任何 session，讀取時才收進 store
+    讀取時 scratch 檔比 ref 新（檔案被改寫）→ 當場重新收進 store
+
+GC：blob 總量超過 ARTIFACT_QUOTA_MB 時，從最久沒更新的 session 開始移除 manifest 與它擁有的 ref /
+scratch 檔，直到低於配額的 90%；沒有任何 ref 指向、且超過寬限期的 blob 才真正刪除（避免與進行中的寫入競爭）。
+設定 ARTIFACT_SCRATCH_TTL_HOURS 時，已收進 store 且超過該時間未再修改的 scratch 檔也會被清掉，之後一律由 store 提供
+（預設 0 = 保留，agent 之後的 run 仍可讀取自己先前產生的檔案）。
+
+後端由 ARTIFACT_BACKEND 選擇：
+    local   本機目錄 ARTIFACT_DIR（預設 backend/data/artifacts；main.py 與 image_agent.py 需共用同一個目錄）
+    s3      MinIO / S3 相容物件儲存（需 `pip install boto3`）：
+            ARTIFACT_S3_ENDPOINT、ARTIFACT_S3_BUCKET、ARTIFACT_S3_PREFIX、AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY
+
+對外只有一個 handler（serve_artifact），掛在 /artifacts/{kind}/{name} 與原本的 /images、/charts、/download(s) 路徑，
+回應帶 ETag（= digest）與依 kind 設定的 Cache-Control，支援 If-None-Match → 304。
+/charts 與原本的 StaticFiles(html=True) 一樣可帶子路徑，以 / 結尾時提供該目錄的 index.html。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import HTTPException, Request
+from starlette.responses import FileResponse, Response, StreamingResponse
+
+from shared_state import WORKER_ID, get_shared_state
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# kind → scratch 目錄（相對於 backend/，也是 agent 程式碼使用的相對路徑）
+SCRATCH_DIRS = {
+    "images": os.path.join("outputs", "images"),
+    "charts": "charts",
+    "downloads": "downloads",
+}
+
+# 每個 session 專屬的 scratch 目錄：data/scratch/<session_id>/<kind>（相對於 backend/）
+SESSION_SCRATCH_ROOT = os.path.join("data", "scratch")
+SESSION_SCRATCH_KINDS = ("charts", "downloads")
+
+# ComfyUI 的檔名不會重複，圖片可永久快取；圖表 / 下載檔可能以同名重新產生，每次以 ETag 驗證
+CACHE_CONTROL = {
+    "images": "public, max-age=31536000, immutable",
+    "charts": "public, no-cache",
+    "downloads": "private, no-cache",
+}
+
+UNASSIGNED_SESSION = "_unassigned"
+GC_LEASE = "artifacts:gc"
+_CHUNK = 1024 * 1024
+
+
+def _safe_name(name: str) -> bool:
+    """相對名稱，可含子目錄（charts/<dir>/index.html）；不允許空段、. / ..、反斜線與 NUL。"""
+    return bool(name) and "\\" not in name and "\x00" not in name and all(
+        part not in ("", ".", "..") for part in name.split("/")
+    )
+
+
+def _session_dir_name(session_id: str) -> str:
+    """session_id 直接當目錄名；含路徑字元等不安全內容時改用雜湊。"""
+    if re.fullmatch(r"[A-Za-z0-9_.-]{1,128}", session_id) and session_id not in (".", ".."):
+        return session_id
+    return hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:32]
+
+
+def _manifest_key(session_id: str) -> str:
+    # session_id 來自用戶端的 run 請求，不能直接拼進路徑
+    return f"manifests/{_session_dir_name(session_id)}"
+
+
+def _iter_files(directory: str) -> Iterator[Tuple[str, str]]:
+    """逐一回傳 (完整路徑, 以 / 分隔的相對名稱)；略過 . 開頭的檔案與目錄。"""
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        rel_dir = os.path.relpath(dirpath, directory)
+        for filename in filenames:
+            if filename.startswith("."):
+                continue
+            name = filename if rel_dir == "." else f"{rel_dir.replace(os.sep, '/')}/{filename}"
+            yield os.path.join(dirpath, filename), name
+
+
+class ArtifactBackend:
+    """blob 與 JSON 中繼資料的存放位置；同步 API，async 程式碼以 asyncio.to_thread 呼叫。"""
+
+    name = "base"
+
+    # Blobs ------------------------------------------------------------
+    def has_blob(self, digest: str) -> bool:
+        raise NotImplementedError
+
+    def put_blob(self, digest: str, src_path: str) -> None:
+        """把本機檔案 src_path 存成 blob（呼叫端保證內容的 sha256 為 digest）。"""
+        raise NotImplementedError
+
+    def touch_blob(self, digest: str) -> None:
+        """重複寫入時更新時間，讓 GC 的寬限期重新計算。"""
+
+    def delete_blob(self, digest: str) -> None:
+        raise NotImplementedError
+
+    def iter_blobs(self) -> Iterator[Tuple[str, int, float]]:
+        """逐一回傳 (digest, size, mtime)。"""
+        raise NotImplementedError
+
+    def local_path(self, digest: str) -> Optional[str]:
+        """blob 在本機的路徑（可直接 FileResponse）；物件儲存回傳 None。"""
+        return None
+
+    def open_blob(self, digest: str) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    # JSON 中繼資料 -----------------------------------------------------
+    def read_json(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def write_json(self, key: str, value: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def delete_json(self, key: str) -> None:
+        raise NotImplementedError
+
+    def list_json(self, prefix: str) -> List[str]:
+        """prefix 底下所有 key（不含 .json 副檔名）。"""
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        return self.name
+
+
+class LocalArtifactBackend(ArtifactBackend):
+    name = "local"
+
+    def __init__(self, root: str) -> None:
+        self.root = os.path.abspath(root)
+        os.makedirs(os.path.join(self.root, "blobs"), exist_ok=True)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "blobs", digest[:2], digest)
+
+    def _json_path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/")) + ".json"
+
+    def has_blob(self, digest: str) -> bool:
+        return os.path.exists(self._blob_path(digest))
+
+    def put_blob(self, digest: str, src_path: str) -> None:
+        path = self._blob_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先複製到同目錄的暫存檔再 rename，讀取端不會看到寫到一半的 blob
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as dst, open(src_path, "rb") as src:
+                while chunk := src.read(_CHUNK):
+                    dst.write(chunk)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def touch_blob(self, digest: str) -> None:
+        try:
+            os.utime(self._blob_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def delete_blob(self, digest: str) -> None:
+        try:
+            os.unlink(self._blob_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def iter_blobs(self) -> Iterator[Tuple[str, int, float]]:
+        blobs_dir = os.path.join(self.root, "blobs")
+        for shard in os.scandir(blobs_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith(".tmp-"):
+                    continue
+                st = entry.stat()
+                yield entry.name, st.st_size, st.st_mtime
+
+    def local_path(self, digest: str) -> Optional[str]:
+        path = self._blob_path(digest)
+        return path if os.path.exists(path) else None
+
+    def open_blob(self, digest: str) -> Iterator[bytes]:
+        with open(self._blob_path(digest), "rb") as f:
+            while chunk := f.read(_CHUNK):
+                yield chunk
+
+    def read_json(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._json_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def write_json(self, key: str, value: Dict[str, Any]) -> None:
+        path = self._json_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def delete_json(self, key: str) -> None:
+        try:
+            os.unlink(self._json_path(key))
+        except FileNotFoundError:
+            pass
+
+    def list_json(self, prefix: str) -> List[str]:
+        base = os.path.join(self.root, *prefix.strip("/").split("/"))
+        keys = []
+        for dirpath, _, filenames in os.walk(base):
+            rel = os.path.relpath(dirpath, self.root).replace(os.sep, "/")
+            keys.extend(f"{rel}/{name[:-5]}" for name in filenames if name.endswith(".json") and not name.startswith(".tmp-"))
+        return keys
+
+    def describe(self) -> str:
+        return f"local:{self.root}"
+
+
+class S3ArtifactBackend(ArtifactBackend):
+    """MinIO / S3 相容物件儲存；blob 以 StreamingResponse 提供。"""
+
+    name = "s3"
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, prefix: str = "agentos-artifacts") -> None:
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError("ARTIFACT_BACKEND=s3 requires the boto3 package: pip install boto3") from e
+        self._s3 = boto3.client("s3", endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}"
+
+    def _blob_key(self, digest: str) -> str:
+        return self._key(f"blobs/{digest[:2]}/{digest}")
+
+    def has_blob(self, digest: str) -> bool:
+        try:
+            self._s3.head_object(Bucket=self.bucket, Key=self._blob_key(digest))
+            return True
+        except self._s3.exceptions.ClientError:
+            return False
+
+    def put_blob(self, digest: str, src_path: str) -> None:
+        self._s3.upload_file(src_path, self.bucket, self._blob_key(digest))
+
+    def touch_blob(self, digest: str) -> None:
+        # S3 無法只更新 mtime；以原地 copy（REPLACE metadata）更新 LastModified
+        key = self._blob_key(digest)
+        self._s3.copy_object(Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": key},
+                             MetadataDirective="REPLACE")
+
+    def delete_blob(self, digest: str) -> None:
+        self._s3.delete_object(Bucket=self.bucket, Key=self._blob_key(digest))
+
+    def iter_blobs(self) -> Iterator[Tuple[str, int, float]]:
+        paginator = self._s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key("blobs/")):
+            for obj in page.get("Contents", []):
+                yield obj["Key"].rsplit("/", 1)[-1], obj["Size"], obj["LastModified"].timestamp()
+
+    def open_blob(self, digest: str) -> Iterator[bytes]:
+        body = self._s3.get_object(Bucket=self.bucket, Key=self._blob_key(digest))["Body"]
+        try:
+            yield from body.iter_chunks(_CHUNK)
+        finally:
+            body.close()
+
+    def read_json(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            body = self._s3.get_object(Bucket=self.bucket, Key=self._key(key) + ".json")["Body"]
+        except self._s3.exceptions.NoSuchKey:
+            return None
+        return json.loads(body.read())
+
+    def write_json(self, key: str, value: Dict[str, Any]) -> None:
+        self._s3.put_object(Bucket=self.bucket, Key=self._key(key) + ".json",
+                            Body=json.dumps(value, ensure_ascii=False).encode("utf-8"),
+                            ContentType="application/json")
+
+    def delete_json(self, key: str) -> None:
+        self._s3.delete_object(Bucket=self.bucket, Key=self._key(key) + ".json")
+
+    def list_json(self, prefix: str) -> List[str]:
+        keys = []
+        paginator = self._s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix.strip("/") + "/")):
+            for obj in page.get("Contents", []):
+                if obj["Key"].endswith(".json"):
+                    keys.append(obj["Key"][len(self.prefix) + 1:-5])
+        return keys
+
+    def describe(self) -> str:
+        return f"s3://{self.bucket}/{self.prefix}"
+
+
+def _sha256_file(path: str) -> Tuple[str, int]:
+    h = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(_CHUNK):
+            h.update(chunk)
+            size += len(chunk)
+    return h.hexdigest(), size
+
+
+class ArtifactStore:
+    """內容定址的 artifact 儲存；所有方法皆為同步、thread-safe。"""
+
+    def __init__(
+        self,
+        backend: ArtifactBackend,
+        scratch_root: str = BACKEND_DIR,
+        quota_bytes: int = 2048 * 1024 * 1024,
+        gc_grace_seconds: float = 600.0,
+        scratch_ttl_seconds: float = 0.0,
+    ) -> None:
+        self.backend = backend
+        self.scratch_root = scratch_root
+        self.quota_bytes = quota_bytes
+        self.gc_grace_seconds = gc_grace_seconds
+        self.scratch_ttl_seconds = scratch_ttl_seconds
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None  # blob 總量（本行程的估計值，GC 時重新計算）
+        self._counters = {"puts": 0, "dedup_hits": 0, "bytes_deduped": 0, "gc_runs": 0,
+                          "sessions_evicted": 0, "blobs_deleted": 0, "scratch_deleted": 0}
+
+    # 路徑 ---------------------------------------------------------------
+    def scratch_dir(self, kind: str) -> str:
+        """kind 對應的共用 scratch 目錄（不存在則建立）。"""
+        path = os.path.join(self.scratch_root, SCRATCH_DIRS[kind])
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def session_scratch_dir(self, session_id: Optional[str], kind: str, create: bool = True) -> str:
+        """session 專屬的 scratch 目錄；agent 程式碼經由 CHARTS_DIR / DOWNLOADS_DIR 寫到這裡。"""
+        path = os.path.join(self.scratch_root, SESSION_SCRATCH_ROOT,
+                            _session_dir_name(session_id or UNASSIGNED_SESSION), SCRATCH_DIRS[kind])
+        if create:
+            os.makedirs(path, exist_ok=True)
+        return path
+
+    def _scratch_path(self, kind: str, name: str) -> str:
+        return os.path.join(self.scratch_root, SCRATCH_DIRS[kind], *name.split("/"))
+
+    def _scratch_matches(self, ref: Optional[Dict[str, Any]], path: str, st: os.stat_result) -> bool:
+        """ref 記錄的 scratch 檔是否就是 path 目前的內容（同一路徑、大小與修改時間）。"""
+        return (bool(ref) and ref.get("scratch") == [st.st_size, st.st_mtime]
+                and ref.get("scratch_path") == os.path.relpath(path, self.scratch_root))
+
+    # 寫入 ---------------------------------------------------------------
+    def put_file(self, kind: str, name: str, path: str, session_id: Optional[str] = None,
+                 scratch_stat: Optional[os.stat_result] = None) -> Dict[str, Any]:
+        """把本機檔案收進 store，更新 ref 與 session manifest，回傳 ref。"""
+        if kind not in SCRATCH_DIRS or not _safe_name(name):
+            raise ValueError(f"invalid artifact {kind}/{name}")
+        # 雜湊與複製不持鎖：blob 以 digest 命名並以 rename 落地，同一內容並行寫入結果相同
+        digest, size = _sha256_file(path)
+        deduped = self.backend.has_blob(digest)
+        if deduped:
+            self.backend.touch_blob(digest)
+        else:
+            self.backend.put_blob(digest, path)
+        session_id = session_id or UNASSIGNED_SESSION
+        ref = {
+            "digest": digest,
+            "size": size,
+            "content_type": mimetypes.guess_type(name)[0] or "application/octet-stream",
+            "session_id": session_id,
+            "updated_at": time.time(),
+        }
+        if scratch_stat is not None:
+            ref["scratch"] = [scratch_stat.st_size, scratch_stat.st_mtime]
+            ref["scratch_path"] = os.path.relpath(path, self.scratch_root)
+        with self._lock:
+            self._counters["puts"] += 1
+            if deduped:
+                self._counters["dedup_hits"] += 1
+                self._counters["bytes_deduped"] += size
+            elif self._total_bytes is not None:
+                self._total_bytes += size
+            self.backend.write_json(f"refs/{kind}/{name}", ref)
+            self._add_to_manifest(session_id, kind, name, digest)
+        self._maybe_gc()
+        return ref
+
+    def put_bytes(self, kind: str, name: str, data: bytes, session_id: Optional[str] = None) -> Dict[str, Any]:
+        fd, tmp = tempfile.mkstemp(prefix="artifact-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            return self.put_file(kind, name, tmp, session_id=session_id)
+        finally:
+            os.unlink(tmp)
+
+    def _add_to_manifest(self, session_id: str, kind: str, name: str, digest: str) -> None:
+        """呼叫端須持有 self._lock（manifest 為讀取-修改-寫回）。"""
+        key = _manifest_key(session_id)
+        manifest = self.backend.read_json(key) or {"session_id": session_id, "artifacts": {}}
+        manifest["artifacts"][f"{kind}/{name}"] = digest
+        manifest["updated_at"] = time.time()
+        self.backend.write_json(key, manifest)
+
+    def _ingest_if_changed(self, kind: str, name: str, path: str, session_id: Optional[str],
+                           ref: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if ref is None:
+            ref = self.backend.read_json(f"refs/{kind}/{name}")
+        if self._scratch_matches(ref, path, st):
+            return ref
+        # 沿用原本的 session（讀取觸發的收錄沒有 session 資訊）
+        if session_id is None and ref:
+            session_id = ref.get("session_id")
+        return self.put_file(kind, name, path, session_id=session_id, scratch_stat=st)
+
+    def ingest_session_scratch(self, session_id: Optional[str]) -> List[str]:
+        """把該 session 的 scratch 目錄中新增或修改過的檔案收進 store；順便清掉過期的 scratch 檔。"""
+        ingested = []
+        now = time.time()
+        for kind in SESSION_SCRATCH_KINDS:
+            directory = self.session_scratch_dir(session_id, kind, create=False)
+            if not os.path.isdir(directory):
+                continue
+            for path, name in _iter_files(directory):
+                st = os.stat(path)
+                ref = self.backend.read_json(f"refs/{kind}/{name}")
+                if not self._scratch_matches(ref, path, st):
+                    try:
+                        self._ingest_if_changed(kind, name, path, session_id, ref=ref)
+                        ingested.append(f"{kind}/{name}")
+                    except Exception as e:
+                        logger.warning(f"[artifacts] failed to ingest {kind}/{name}: {e}")
+                elif self.scratch_ttl_seconds and now - st.st_mtime > self.scratch_ttl_seconds:
+                    os.unlink(path)
+                    self._counters["scratch_deleted"] += 1
+        return ingested
+
+    # 讀取 ---------------------------------------------------------------
+    def resolve(self, kind: str, name: str) -> Optional[Dict[str, Any]]:
+        """名稱 → ref；ref 記錄的 scratch 檔（沒有 ref 時為共用 scratch 目錄的同名檔）較新時先收進 store。"""
+        if kind not in SCRATCH_DIRS or not _safe_name(name):
+            return None
+        ref = self.backend.read_json(f"refs/{kind}/{name}")
+        if ref and ref.get("scratch_path"):
+            path = os.path.join(self.scratch_root, ref["scratch_path"])
+        else:
+            path = self._scratch_path(kind, name)
+        return self._ingest_if_changed(kind, name, path, None, ref=ref) or ref
+
+    def session_manifest(self, session_id: str) -> Optional[Dict[str, Any]]:
+        manifest = self.backend.read_json(_manifest_key(session_id))
+        # 雜湊後的檔名可能對應到不同的原始 session_id
+        return manifest if manifest and manifest.get("session_id") == session_id else None
+
+    # GC -----------------------------------------------------------------
+    def _maybe_gc(self) -> None:
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self.backend.iter_blobs())
+        if self._total_bytes > self.quota_bytes:
+            self.gc()
+
+    def gc(self) -> Dict[str, Any]:
+        """依配額回收最舊的 session，再刪除沒有 ref 指向的 blob；多 worker 以共用租約確保同時只有一個在跑。"""
+        state = get_shared_state()
+        if not state.acquire(GC_LEASE, WORKER_ID, 1, 300):
+            return {"skipped": "gc running on another worker"}
+        try:
+            return self._gc()
+        finally:
+            state.release(GC_LEASE, WORKER_ID)
+
+    def _gc(self) -> Dict[str, Any]:
+        blobs = {digest: (size, mtime) for digest, size, mtime in self.backend.iter_blobs()}
+        total = sum(size for size, _ in blobs.values())
+
+        refs: Dict[str, Dict[str, Any]] = {}
+        for key in self.backend.list_json("refs"):
+            ref = self.backend.read_json(key)
+            if ref:
+                refs[key[len("refs/"):]] = ref
+        refcount: Dict[str, int] = {}
+        for ref in refs.values():
+            refcount[ref["digest"]] = refcount.get(ref["digest"], 0) + 1
+
+        manifests = []
+        for key in self.backend.list_json("manifests"):
+            manifest = self.backend.read_json(key)
+            if manifest:
+                manifests.append(manifest)
+        manifests.sort(key=lambda m: m.get("updated_at", 0))
+
+        # 先在記憶體中推算要回收哪些 session，live 量降到低水位才停
+        low_water = int(self.quota_bytes * 0.9)
+        live = sum(blobs.get(digest, (0, 0))[0] for digest in refcount)
+        evicted = 0
+        for manifest in manifests:
+            if live <= low_water:
+                break
+            session_id = manifest["session_id"]
+            for name, digest in manifest.get("artifacts", {}).items():
+                ref = refs.get(name)
+                if not ref or ref["digest"] != digest or ref.get("session_id") != session_id:
+                    continue  # 同名 artifact 已被其他 session 覆寫，歸新的 session 所有
+                self.backend.delete_json(f"refs/{name}")
+                if ref.get("scratch_path"):
+                    scratch = os.path.join(self.scratch_root, ref["scratch_path"])
+                    try:
+                        if self._scratch_matches(ref, scratch, os.stat(scratch)):
+                            os.unlink(scratch)
+                            self._counters["scratch_deleted"] += 1
+                    except FileNotFoundError:
+                        pass
+                del refs[name]
+                refcount[digest] -= 1
+                if refcount[digest] == 0:
+                    del refcount[digest]
+                    live -= blobs.get(digest, (0, 0))[0]
+            self.backend.delete_json(_manifest_key(session_id))
+            evicted += 1
+
+        # 沒有 ref 指向的 blob；剛寫入的（寬限期內）可能還沒寫 ref，先保留
+        cutoff = time.time() - self.gc_grace_seconds
+        deleted = freed = 0
+        for digest, (size, mtime) in blobs.items():
+            if digest not in refcount and mtime < cutoff:
+                self.backend.delete_blob(digest)
+                deleted += 1
+                freed += size
+        with self._lock:
+            self._total_bytes = total - freed
+            self._counters["gc_runs"] += 1
+            self._counters["sessions_evicted"] += evicted
+            self._counters["blobs_deleted"] += deleted
+        logger.info(f"[artifacts] gc: evicted {evicted} sessions, deleted {deleted} blobs ({freed} bytes)")
+        return {"sessions_evicted": evicted, "blobs_deleted": deleted, "bytes_freed": freed,
+                "total_bytes": total - freed, "quota_bytes": self.quota_bytes}
+
+    def stats(self) -> Dict[str, Any]:
+        blob_count = total = 0
+        for _, size, _ in self.backend.iter_blobs():
+            blob_count += 1
+            total += size
+        with self._lock:
+            self._total_bytes = total
+            counters = dict(self._counters)
+        return {
+            "backend": self.backend.describe(),
+            "blobs": blob_count,
+            "total_bytes": total,
+            "quota_bytes": self.quota_bytes,
+            "sessions": len(self.backend.list_json("manifests")),
+            **counters,
+        }
+
+
+def create_artifact_store() -> ArtifactStore:
+    backend_name = os.getenv("ARTIFACT_BACKEND", "local").lower()
+    if backend_name == "local":
+        backend: ArtifactBackend = LocalArtifactBackend(
+            os.getenv("ARTIFACT_DIR", os.path.join(BACKEND_DIR, "data", "artifacts")))
+    elif backend_name == "s3":
+        bucket = os.getenv("ARTIFACT_S3_BUCKET")
+        if not bucket:
+            raise RuntimeError("ARTIFACT_BACKEND=s3 requires ARTIFACT_S3_BUCKET")
+        backend = S3ArtifactBackend(bucket, endpoint_url=os.getenv("ARTIFACT_S3_ENDPOINT"),
+                                    prefix=os.getenv("ARTIFACT_S3_PREFIX", "agentos-artifacts"))
+    else:
+        raise RuntimeError(f"Unknown ARTIFACT_BACKEND: {backend_name} (expected local or s3)")
+    return ArtifactStore(
+        backend,
+        quota_bytes=int(float(os.getenv("ARTIFACT_QUOTA_MB", "2048")) * 1024 * 1024),
+        gc_grace_seconds=float(os.getenv("ARTIFACT_GC_GRACE_SECONDS", "600")),
+        scratch_ttl_seconds=float(os.getenv("ARTIFACT_SCRATCH_TTL_HOURS", "0")) * 3600,
+    )
+
+
+_artifact_store: Optional[ArtifactStore] = None
+_artifact_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """本行程共用的 ArtifactStore；第一次呼叫時依環境變數建立。"""
+    global _artifact_store
+    with _artifact_store_lock:
+        if _artifact_store is None:
+            _artifact_store = create_artifact_store()
+            logger.info(f"[artifacts] backend={_artifact_store.backend.describe()}")
+        return _artifact_store
+
+
+def ingest_session_artifacts(session_id: Optional[str]) -> None:
+    """把該 session scratch 目錄中的圖表 / 下載檔收進 store；失敗只記 log，不影響 run。"""
+    try:
+        get_artifact_store().ingest_session_scratch(session_id)
+    except Exception as e:
+        logger.warning(f"[artifacts] ingest of session scratch failed: {e}")
+
+
+def ingest_run_artifacts(run_output, run_context) -> None:
+    """agno post hook：run 結束時再收一次（涵蓋不經 CapturedPythonTools 寫進 session 目錄的檔案）。"""
+    ingest_session_artifacts(run_context.session_id if run_context else None)
+
+
+# ============================================================================
+# HTTP
+# ============================================================================
+
+def _content_disposition(kind: str, name: str) -> str:
+    disposition = "attachment" if kind == "downloads" else "inline"
+    if name.isascii():
+        return f'{disposition}; filename="{name}"'
+    return f"{disposition}; filename*=utf-8''{quote(name)}"
+
+
+async def serve_artifact(request: Request, kind: str, name: str):
+    if kind == "charts" and (not name or name.endswith("/")):
+        name += "index.html"  # 與原本 StaticFiles(html=True) 相同：目錄提供 index.html
+    store = get_artifact_store()
+    ref = await asyncio.to_thread(store.resolve, kind, name)
+    if ref is None:
+        raise HTTPException(status_code=404, detail=f"File '{name}' not found")
+    etag = f'"{ref["digest"]}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": CACHE_CONTROL[kind],
+        "Content-Disposition": _content_disposition(kind, name),
+    }
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    media_type = "application/octet-stream" if kind == "downloads" else ref["content_type"]
+    path = store.backend.local_path(ref["digest"])
+    if path is not None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+    headers["Content-Length"] = str(ref["size"])
+    if request.method == "HEAD":
+        return Response(status_code=200, media_type=media_type, headers=headers)
+    return StreamingResponse(store.backend.open_blob(ref["digest"]), media_type=media_type, headers=headers)
+
+
+def install_artifacts(app) -> None:
+    """GET/HEAD /artifacts/{kind}/{name}（並保留 /images、/charts、/download(s) 舊路徑）與統計端點。"""
+
+    @app.get("/artifacts/stats", tags=["Artifacts"])
+    async def artifact_stats():
+        """blob 數量、總量 / 配額、去重命中與 GC 次數。"""
+        return await asyncio.to_thread(get_artifact_store().stats)
+
+    # session_id 可能含 /；session_manifest 會轉成安全的檔名，不會被當成路徑
+    @app.get("/artifacts/sessions/{session_id:path}", tags=["Artifacts"])
+    async def artifact_session(session_id: str):
+        """某個 session 產生過的 artifact（名稱 → digest）。"""
+        manifest = await asyncio.to_thread(get_artifact_store().session_manifest, session_id)
+        return manifest or {"session_id": session_id, "artifacts": {}}
+
+    # AgentOS 不會自動為 GET 路由啟用 HEAD，前端下載前會先送 HEAD
+    @app.api_route("/artifacts/{kind}/{name:path}", methods=["GET", "HEAD"], tags=["Artifacts"])
+    async def artifact(request: Request, kind: str, name: str):
+        """依名稱取得 artifact（kind: images / charts / downloads）。"""
+        return await serve_artifact(request, kind, name)
+
+    # /charts 與原本的 StaticFiles 掛載一樣接受子路徑（圖表目錄、index.html、相對引用的資源）
+    for prefix, kind, param in (("/images", "images", "name"), ("/charts", "charts", "name:path"),
+                                ("/download", "downloads", "name"), ("/downloads", "downloads", "name")):
+        async def legacy(request: Request, name: str, _kind: str = kind):
+            return await serve_artifact(request, _kind, name)
+
+        app.add_api_route(f"{prefix}/{{{param}}}", legacy, methods=["GET", "HEAD"], include_in_schema=False)
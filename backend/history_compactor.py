@@ -0,0 +1,124 @@
+"""
+長 Session 的歷史壓縮 (History Compaction)
+
+num_history_runs=5 會把前 5 次 run 的所有訊息重播進每一次 prompt，
+其中包含大型 tool 輸出（完整搜尋結果、CapturedPythonTools 印出的 CSV、SQL 結果集），
+讓 prompt 大小與延遲隨 session 長度快速膨脹。
+
+HistoryCompactor 只處理「送往模型」的訊息：
+- 歷史 run 中的 tool 結果依每個 run 的 token 預算截斷（保留開頭與結尾，中間以標記取代）
+- 本次 run 的訊息、使用者 / assistant 文字一律不動
+- DB 中的 session 仍保有完整內容（不修改 agno 傳入的 Message 物件）
+- 壓縮結果以 message id 快取（LRU），同一則歷史訊息只會計算一次
+
+環境變數：
+    HISTORY_TOOL_BUDGET_TOKENS  每個歷史 run 的 tool 結果 token 預算（預設 2000）
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from agno.models.message import Message
+
+TRUNCATION_MARKER = "\n\n...[已截斷 {omitted} 字元；完整內容保存在 session 紀錄中]...\n\n"
+
+# 單一 tool 結果至少保留的 token 數，避免同一 run 內 tool 呼叫很多時每個都只剩標記
+MIN_TOKENS_PER_RESULT = 100
+
+
+def estimate_tokens(text: str) -> int:
+    """粗估 token 數：ASCII 約 4 字元 1 token，CJK 等非 ASCII 字元約 1 字元 1 token。"""
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return (len(text) - non_ascii) // 4 + non_ascii
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """保留開頭 2/3 與結尾 1/3，使估計 token 數不超過 max_tokens。"""
+    total = estimate_tokens(text)
+    if total <= max_tokens:
+        return text
+    keep_chars = max(int(len(text) * max_tokens / total), 1)
+    head = keep_chars * 2 // 3
+    tail = keep_chars - head
+    omitted = len(text) - head - tail
+    return text[:head] + TRUNCATION_MARKER.format(omitted=omitted) + (text[-tail:] if tail else "")
+
+
+def _split_history_runs(messages: List[Message]) -> List[List[int]]:
+    """依歷史 user message 切分 run，回傳每個 run 中 tool 訊息的索引。"""
+    runs: List[List[int]] = []
+    for i, message in enumerate(messages):
+        if not message.from_history:
+            continue
+        if message.role == "user" or not runs:
+            runs.append([])
+        if message.role == "tool" and isinstance(message.content, str):
+            runs[-1].append(i)
+    return runs
+
+
+class HistoryCompactor:
+    """依每個歷史 run 的 token 預算截斷 tool 結果，並以 LRU 快取壓縮結果。"""
+
+    def __init__(self, budget_tokens_per_run: Optional[int] = None, max_cached: int = 4096):
+        if budget_tokens_per_run is None:
+            budget_tokens_per_run = int(os.getenv("HISTORY_TOOL_BUDGET_TOKENS", "2000"))
+        self.budget_tokens_per_run = budget_tokens_per_run
+        self.max_cached = max_cached
+        self._cache: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.saved_tokens = 0
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "HistoryCompactor":
+        # 跟 ResponseCache 一樣：model 被 deepcopy 時共用同一份快取
+        return self
+
+    def _compact_content(self, message: Message, max_tokens: int) -> str:
+        key = (message.id, max_tokens)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        content = message.content
+        compacted = truncate_to_tokens(content, max_tokens)
+        with self._lock:
+            self.saved_tokens += estimate_tokens(content) - estimate_tokens(compacted)
+            self._cache[key] = compacted
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return compacted
+
+    def compact(self, messages: List[Message]) -> List[Message]:
+        """回傳新的訊息列表；沒有需要壓縮的內容時原樣回傳。"""
+        result: Optional[List[Message]] = None
+        for tool_indexes in _split_history_runs(messages):
+            if not tool_indexes:
+                continue
+            sizes = [estimate_tokens(messages[i].content) for i in tool_indexes]
+            if sum(sizes) <= self.budget_tokens_per_run:
+                continue
+            # 平均分配預算；小於平均份額的結果保持完整，省下的預算再平均分給大的結果
+            share = self.budget_tokens_per_run // len(tool_indexes)
+            large = [size for size in sizes if size > share]
+            leftover = self.budget_tokens_per_run - (sum(sizes) - sum(large))
+            share = max(leftover // len(large), MIN_TOKENS_PER_RESULT)
+            for i, size in zip(tool_indexes, sizes):
+                if size <= share:
+                    continue
+                if result is None:
+                    result = list(messages)
+                compacted = self._compact_content(messages[i], share)
+                result[i] = messages[i].model_copy(update={"content": compacted})
+        return result if result is not None else messages
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget_tokens_per_run": self.budget_tokens_per_run,
+                "cached_messages": len(self._cache),
+                "saved_tokens": self.saved_tokens,
+            }
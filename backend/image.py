@@ -4,30 +4,73 @@ import logging
 import random
 import uuid
 import asyncio
-import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-COMFYUI_URL = "http://192.168.37.71:30631"
-logger = logging.getLogger(__name__)
+from artifacts import get_artifact_store
+from metrics import COMFYUI_QUEUE_WAIT, COMFYUI_RENDER
+from shared_state import WORKER_ID, get_shared_state
 
 import os
 
-# 全域 Semaphore：同時只跑一張圖，避免 ComfyUI 並發 timeout
-# 使用 threading.Semaphore（非 asyncio），避免「bound to a different event loop」錯誤
-# 因為每次 asyncio.run() 在獨立 thread 執行，asyncio.Semaphore 會綁死初始 loop
-_image_semaphore = threading.Semaphore(1)
+COMFYUI_URL = os.getenv("COMFYUI_URL", "http://192.168.37.71:30631")
+logger = logging.getLogger(__name__)
 
-async def generate_image(prompt: str, width: int = 1024, height: int = 1024) -> str:
-    """
-    使用 ComfyUI 生成圖片並返回檔案名稱/URL。
-    
-    Args:
-        prompt: 圖片生成提示詞
-        width: 圖片寬度（建議範圍 512-2048，預設 1024）
-        height: 圖片高度（建議範圍 512-2048，預設 1024）
-    
-    Returns:
-        生成圖片的本地路徑，若失敗則返回 None
-    """
+
+# ComfyUI 名額：同時只跑 COMFYUI_MAX_CONCURRENT 張圖（預設 1），避免 ComfyUI 並發 timeout
+# 以 shared_state 的租約實作，不綁定 event loop；多個 image_agent worker / 節點共用同一個 ComfyUI 時，名額也是全體共用
+COMFYUI_MAX_CONCURRENT = int(os.getenv("COMFYUI_MAX_CONCURRENT", "1"))
+COMFYUI_LEASE = "image:comfyui"
+# 租約需涵蓋單張圖最長的處理時間（HTTP timeout 300s + 下載）；持有者當掉時到期自動歸還
+RENDER_LEASE_TTL = 600.0
+IMAGE_JOB_TTL = 3600.0
+
+
+def _update_job(job_id: str, **fields: Any) -> None:
+    """更新圖片工作狀態（queued → rendering → done / timeout / error），供 GET /image-jobs 查詢。"""
+    state = get_shared_state()
+    key = f"image-job:{job_id}"
+    try:
+        job = state.get(key) or {"job_id": job_id}
+        job.update(fields, updated_at=time.time())
+        state.set(key, job, ttl=IMAGE_JOB_TTL)
+    except Exception as e:
+        logger.warning(f"Failed to update image job {job_id}: {e}")
+
+
+def _discard_job(job_id: str) -> None:
+    """移除尚未開始生成就被放棄的工作，並歸還可能已取得的 ComfyUI 名額。"""
+    state = get_shared_state()
+    try:
+        state.release(COMFYUI_LEASE, job_id)
+        state.delete(f"image-job:{job_id}")
+    except Exception as e:
+        logger.warning(f"Failed to discard image job {job_id}: {e}")
+
+
+def list_image_jobs() -> List[Dict[str, Any]]:
+    """所有 worker 最近一小時的圖片工作，依排入時間排序。"""
+    jobs = list(get_shared_state().scan("image-job:").values())
+    jobs.sort(key=lambda job: job.get("queued_at", 0))
+    return jobs
+
+
+def _queue_position(job_id: str) -> int:
+    """排在此工作之前、仍在等待名額的工作數 + 1（所有 worker 合計）。"""
+    jobs = list_image_jobs()
+    mine = next((job for job in jobs if job.get("job_id") == job_id), None)
+    if mine is None:
+        return 1
+    return 1 + sum(
+        1 for job in jobs
+        if job.get("status") == "queued" and job.get("queued_at", 0) < mine.get("queued_at", 0)
+    )
+
+
+# 排隊 / 生成中至少每隔幾秒送出一次進度，讓上游串流不會因閒置被切斷
+PROGRESS_HEARTBEAT_SECONDS = 5.0
+
+def _build_workflow(prompt: str, width: int, height: int) -> Optional[Dict[str, Any]]:
     # Load the workflow template
     workflow_path = os.path.join(os.path.dirname(__file__), "workflow_image2.json")
     
@@ -57,15 +100,60 @@ async def generate_image(prompt: str, width: int = 1024, height: int = 1024) ->
     # 設定圖片尺寸 (Node 4: EmptySD3LatentImage)
     size_node_id = "4"
     if size_node_id in workflow:
-        # 限制尺寸在合理範圍內 (512-2048)
-        width = max(512, min(2048, width))
-        height = max(512, min(2048, height))
         workflow[size_node_id]["inputs"]["width"] = width
         workflow[size_node_id]["inputs"]["height"] = height
         logger.info(f"Image size set to {width}x{height}")
     else:
         logger.warning(f"Size node {size_node_id} not found in workflow, using default size")
-    
+    return workflow
+
+
+async def _watch_comfyui(client_id: str, progress: "asyncio.Queue[Dict[str, Any]]") -> None:
+    """訂閱 ComfyUI 的 /ws，把 KSampler 的 step 進度轉成 sampling 事件；沒有安裝 websockets 時直接結束。"""
+    try:
+        import websockets
+    except ImportError:
+        return
+    ws_url = COMFYUI_URL.replace("http", "ws", 1) + f"/ws?clientId={client_id}"
+    try:
+        async with websockets.connect(ws_url, max_size=None) as ws:
+            async for raw in ws:
+                if isinstance(raw, bytes):
+                    continue  # 預覽圖
+                message = json.loads(raw)
+                data = message.get("data") or {}
+                if message.get("type") == "progress":
+                    progress.put_nowait({"stage": "sampling", "step": data.get("value"), "steps": data.get("max")})
+                elif message.get("type") == "status":
+                    remaining = ((data.get("status") or {}).get("exec_info") or {}).get("queue_remaining")
+                    if remaining is not None:
+                        progress.put_nowait({"stage": "submitted", "comfyui_queue_remaining": remaining})
+    except Exception as e:
+        # 進度只是輔助資訊，連不上 /ws 時仍以輪詢 /history 完成生成
+        logger.info(f"ComfyUI progress websocket unavailable: {e}")
+
+
+async def generate_image_events(
+    prompt: str, width: int = 1024, height: int = 1024, session_id: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    使用 ComfyUI 生成圖片，過程中產生進度事件；圖片存進 artifact store 並記到 session_id 的 manifest。
+
+    依序產生：
+        {"stage": "queued", "position": N}              等待 ComfyUI 名額（所有 worker 合計的排隊位置）
+        {"stage": "submitted", ...}                      已送入 ComfyUI
+        {"stage": "sampling", "step": k, "steps": n}     KSampler 進度（需 websockets 套件）
+        {"stage": "rendering", "elapsed_seconds": s}     沒有 step 進度時的 heartbeat
+    最後一個事件為 {"stage": "done", "path": ...}、{"stage": "timeout"} 或 {"stage": "error", "error": ...}
+    """
+    # 限制尺寸在合理範圍內 (512-2048)
+    width = max(512, min(2048, width))
+    height = max(512, min(2048, height))
+    workflow = _build_workflow(prompt, width, height)
+    if workflow is None:
+        yield {"stage": "error", "error": "workflow file not found"}
+        return
+
     # Send to ComfyUI
     client_id = str(uuid.uuid4())
     prompt_payload = {
@@ -73,13 +161,43 @@ async def generate_image(prompt: str, width: int = 1024, height: int = 1024) ->
         "client_id": client_id
     }
 
-    # 每張圖需 ~30s；Semaphore 序列化後可能需等前張完成，給 5 分鐘緩衝
+    # 每張圖需 ~30s；名額序列化後可能需等前張完成，給 5 分鐘緩衝
     timeout = httpx.Timeout(300.0, connect=10.0)
 
-    # 全域序列鎖：一次只跑一張，避免多張並行全部 timeout
-    # threading.Semaphore.acquire() 為阻塞式，在 ThreadPoolExecutor 子執行緒中可安全呼叫
+    # 共用名額：一次只跑 COMFYUI_MAX_CONCURRENT 張，避免多張並行全部 timeout
+    # 以輪詢取得租約（不保證 FIFO）；shared_state 為同步 API，移到執行緒呼叫以免卡住 event loop
+    job_id = client_id
+    state = get_shared_state()
+    await asyncio.to_thread(_update_job, job_id, status="queued", prompt=prompt[:200], width=width, height=height,
+                            queued_at=time.time(), worker=WORKER_ID)
     logger.info("Waiting for image slot (serialized queue)...")
-    _image_semaphore.acquire()
+    wait_start = time.perf_counter()
+    last_position, last_sent = None, 0.0
+    acquired = False
+    try:
+        while not await asyncio.to_thread(state.acquire, COMFYUI_LEASE, job_id, COMFYUI_MAX_CONCURRENT, RENDER_LEASE_TTL):
+            now = time.perf_counter()
+            if now - last_sent >= 2.0:
+                position = await asyncio.to_thread(_queue_position, job_id)
+                if position != last_position or now - last_sent >= PROGRESS_HEARTBEAT_SECONDS:
+                    yield {"stage": "queued", "position": position, "waited_seconds": int(now - wait_start)}
+                    last_position, last_sent = position, now
+            await asyncio.sleep(0.5)
+        acquired = True
+    finally:
+        if not acquired:
+            # 排隊期間被取消（client 離開、上游 aclose）：移除 queued 紀錄，否則它會留在 /image-jobs
+            # 並墊高其他工作的排隊位置；acquire 可能已在執行緒中成功，一併歸還名額
+            await asyncio.to_thread(_discard_job, job_id)
+    COMFYUI_QUEUE_WAIT.observe(time.perf_counter() - wait_start)
+    await asyncio.to_thread(_update_job, job_id, status="rendering", started_at=time.time())
+    render_start = time.perf_counter()
+    render_status = "error"
+    result = None
+    progress: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+    # 先連上 /ws 再送出 prompt，才不會漏掉開頭的進度訊息
+    watcher = asyncio.create_task(_watch_comfyui(client_id, progress))
+    await asyncio.sleep(0)
     try:
         async with httpx.AsyncClient(timeout=timeout) as client:
             # 1. Queue Prompt
@@ -87,6 +205,9 @@ async def generate_image(prompt: str, width: int = 1024, height: int = 1024) ->
             resp = await client.post(f"{COMFYUI_URL}/prompt", json=prompt_payload)
             resp.raise_for_status()
             prompt_id = resp.json()["prompt_id"]
+            await asyncio.to_thread(_update_job, job_id, prompt_id=prompt_id)
+            yield {"stage": "submitted", "prompt_id": prompt_id}
+            last_sent = time.perf_counter()
 
             # 2. Poll /history 直到完成；180 次 × 1s = 最多等 3 分鐘
             completed = False
@@ -94,7 +215,19 @@ async def generate_image(prompt: str, width: int = 1024, height: int = 1024) ->
             retries = 180
 
             while not completed and retries > 0:
-                await asyncio.sleep(1)
+                # 每秒輪詢一次 /history，期間轉送 /ws 收到的進度
+                deadline = time.perf_counter() + 1.0
+                while (remaining := deadline - time.perf_counter()) > 0:
+                    try:
+                        event = await asyncio.wait_for(progress.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    yield event
+                    last_sent = time.perf_counter()
+                if time.perf_counter() - last_sent >= PROGRESS_HEARTBEAT_SECONDS:
+                    yield {"stage": "rendering", "elapsed_seconds": int(time.perf_counter() - render_start)}
+                    last_sent = time.perf_counter()
+
                 hist_resp = await client.get(f"{COMFYUI_URL}/history/{prompt_id}")
                 if hist_resp.status_code == 200:
                     history = hist_resp.json()
@@ -116,27 +249,53 @@ async def generate_image(prompt: str, width: int = 1024, height: int = 1024) ->
                 retries -= 1
 
             if completed and filename:
-                # Download image from ComfyUI to local storage
+                # Download image from ComfyUI into the artifact store
                 view_url = f"{COMFYUI_URL}/view?filename={filename}&type=output"
 
-                local_dir = "outputs/images"
-                os.makedirs(local_dir, exist_ok=True)
-                local_path = os.path.join(local_dir, filename)
-
                 img_resp = await client.get(view_url)
                 if img_resp.status_code == 200:
-                    with open(local_path, "wb") as f:
-                        f.write(img_resp.content)
-                    logger.info(f"Saved image to {local_path}")
-                    return local_path
+                    # 回傳的路徑維持 outputs/images/<filename>：agent 指示與前端都以此格式辨識圖片，
+                    # 實際內容由 artifact store 經 /images/<filename> 提供
+                    await asyncio.to_thread(get_artifact_store().put_bytes, "images", filename, img_resp.content, session_id)
+                    local_path = f"outputs/images/{filename}"
+                    logger.info(f"Saved image to artifact store: {local_path}")
+                    render_status = "ok"
+                    result = local_path
+                    yield {"stage": "done", "path": result, "width": width, "height": height}
                 else:
-                    logger.error("Failed to download image from ComfyUI")
-                    return view_url
+                    logger.error(f"Failed to download image from ComfyUI: HTTP {img_resp.status_code}")
+                    yield {"stage": "error", "error": f"Failed to download image from ComfyUI (HTTP {img_resp.status_code})"}
+            elif completed:
+                yield {"stage": "error", "error": "ComfyUI finished without an image output"}
             else:
                 logger.warning("Image generation timed out after 3 minutes")
-                return None
+                render_status = "timeout"
+                yield {"stage": "timeout"}
     except Exception as e:
         logger.error(f"ComfyUI Error: {e}")
-        return None
+        yield {"stage": "error", "error": str(e)}
     finally:
-        _image_semaphore.release()
+        watcher.cancel()
+        COMFYUI_RENDER.labels(render_status).observe(time.perf_counter() - render_start)
+        await asyncio.to_thread(state.release, COMFYUI_LEASE, job_id)
+        await asyncio.to_thread(_update_job, job_id, status={"ok": "done"}.get(render_status, render_status),
+                                result=result, finished_at=time.time())
+
+
+async def generate_image(prompt: str, width: int = 1024, height: int = 1024) -> str:
+    """
+    使用 ComfyUI 生成圖片並返回檔案名稱/URL。
+    
+    Args:
+        prompt: 圖片生成提示詞
+        width: 圖片寬度（建議範圍 512-2048，預設 1024）
+        height: 圖片高度（建議範圍 512-2048，預設 1024）
+    
+    Returns:
+        生成圖片的本地路徑，若失敗則返回 None
+    """
+    result = None
+    async for event in generate_image_events(prompt, width=width, height=height):
+        if event["stage"] == "done":
+            result = event["path"]
+    return result
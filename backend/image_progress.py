@@ -0,0 +1,96 @@
+"""
+圖片生成進度事件：image_agent 的 tool 串流產生，經 RemoteAgent 轉送到主 AgentOS 的 team SSE。
+
+    image_agent.py  generate_image_with_comfyui（async generator tool）
+        └─ yield ImageProgressEvent(stage="queued" / "submitted" / "sampling" / "rendering" / "done" ...)
+    ↓ AgentOS SSE（/agents/image-generator/runs，stream_events=true）
+    agents_remote.py  ProgressRemoteAgent
+        └─ 把收到的 CustomEvent 還原成 ImageProgressEvent，team 重新序列化時欄位才不會遺失
+    ↓ team SSE：{"event": "CustomEvent", "kind": "image_progress", "stage": ..., "position": ..., "step": ...}
+    前端 ChatInterface 顯示排隊位置 / 生成進度
+
+遠端走 AgentOS 協定而非 A2A JSON-RPC：agno 的 A2A server 會丟棄 CustomEvent，進度無法送達。
+連線使用 agno 全域共用的 httpx.AsyncClient（keep-alive 連線池），每次委派不必重新建立 TCP / TLS。
+"""
+
+import os
+from dataclasses import dataclass, fields
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+from agno.agent import RemoteAgent
+from agno.run.agent import CustomEvent
+from agno.utils.http import set_default_async_client
+
+IMAGE_PROGRESS_KIND = "image_progress"
+
+
+@dataclass
+class ImageProgressEvent(CustomEvent):
+    """單一進度更新；stage 之外的欄位依階段填入，其餘為 None（序列化時省略）。"""
+
+    kind: str = IMAGE_PROGRESS_KIND
+    stage: str = ""
+    position: Optional[int] = None
+    waited_seconds: Optional[int] = None
+    comfyui_queue_remaining: Optional[int] = None
+    step: Optional[int] = None
+    steps: Optional[int] = None
+    elapsed_seconds: Optional[int] = None
+    path: Optional[str] = None
+    error: Optional[str] = None
+
+    def __str__(self) -> str:
+        # agno 會把 generator tool 產生的每個 CustomEvent 以 str() 串進 tool 結果；
+        # 進度只給前端看，不進入模型 context
+        return ""
+
+    @classmethod
+    def from_progress(cls, progress: Dict[str, Any]) -> "ImageProgressEvent":
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in progress.items() if k in names})
+
+
+_EVENT_FIELDS = {f.name for f in fields(ImageProgressEvent)}
+
+
+def _restore(event: Any) -> Any:
+    # 遠端事件經 run_output_event_from_dict 還原成一般 CustomEvent，自訂欄位只掛在屬性上，
+    # to_dict() 時會被丟掉；轉回 ImageProgressEvent 才能原樣出現在 team SSE
+    if type(event) is CustomEvent and getattr(event, "kind", None) == IMAGE_PROGRESS_KIND:
+        return ImageProgressEvent(**{k: v for k, v in vars(event).items() if k in _EVENT_FIELDS})
+    return event
+
+
+class ProgressRemoteAgent(RemoteAgent):
+    """串流時把遠端的圖片進度事件轉回 ImageProgressEvent，其餘行為與 RemoteAgent 相同。"""
+
+    def arun(self, input, *, stream: Optional[bool] = None, **kwargs):  # type: ignore[override]
+        # team 委派時會帶 yield_run_output=True，RemoteAgent 原樣轉成表單欄位送到遠端，
+        # 遠端串流最後改送 RunOutput 而無法序列化成 SSE（RunError）；遠端不需要這個旗標
+        kwargs.pop("yield_run_output", None)
+        result = super().arun(input, stream=stream, **kwargs)
+        if not stream:
+            return result
+        return self._relay_progress(result)
+
+    @staticmethod
+    async def _relay_progress(events: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        async for event in events:
+            yield _restore(event)
+
+
+def configure_remote_pool() -> None:
+    """
+    取代 agno 預設的全域 httpx.AsyncClient：上限相同，但 keep-alive 保留較久，
+    兩次委派之間（使用者閱讀回覆的空檔）連線不會被關閉，下一次委派直接沿用。
+    """
+    set_default_async_client(httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=1000,
+            max_keepalive_connections=200,
+            keepalive_expiry=float(os.getenv("REMOTE_AGENT_KEEPALIVE_SECONDS", "120")),
+        ),
+        timeout=httpx.Timeout(60.0),
+        follow_redirects=True,
+    ))
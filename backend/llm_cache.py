@@ -0,0 +1,483 @@
+"""
+LLM 回應快取與請求合併 (Request Coalescing)
+
+每個 agent 模組都會建立 `LiteLLMOpenAI(id=MODEL_ID, base_url=LITELLM_BASE_URL)`，
+而相同 prompt 的請求相當頻繁（例如 Team 的委派決策、Image Agent 對同一需求的 prompt 改寫）。
+
+CachedLiteLLMOpenAI 是 LiteLLMOpenAI 的直接替代品：
+1. 只快取「確定性」請求（temperature == 0），key 為 messages / tools / 請求參數的 sha256
+2. 兩層快取：記憶體 LRU（有上限）+ 選用的磁碟層（JSON 檔，跨行程 / 重啟保留）；
+   多 worker 部署（shared_state 為 postgres / redis）時再加上共用層，各 worker / 節點互相命中
+3. 同時進行中的相同請求會合併成一次上游呼叫，其餘請求等待 leader 完成後直接取用結果
+
+環境變數：
+    LLM_CACHE_MAX_ENTRIES  記憶體 LRU 上限（預設 512）
+    LLM_CACHE_DIR          磁碟層目錄（未設定則只用記憶體）
+    LLM_CACHE_TTL          快取存活秒數（未設定則不過期）
+    LLM_CACHE_SHARED_TTL   共用層存活秒數（預設同 LLM_CACHE_TTL，兩者皆未設定為 86400）
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from agno.models.litellm import LiteLLMOpenAI
+from agno.models.message import Message
+from agno.models.response import ModelResponse
+
+from history_compactor import HistoryCompactor
+from metrics import record_llm_usage
+from prompt_prefix import (
+    cached_prompt_tokens,
+    coarsen_datetime,
+    prefix_cache_stats,
+    stabilize_messages,
+    stabilize_tools,
+)
+from shared_state import SharedState, get_shared_state
+
+logger = logging.getLogger(__name__)
+
+# 共用層沒有 LRU 上限，LLM_CACHE_TTL 未設定時仍以此存活時間寫入，避免共用資料表無限成長
+DEFAULT_SHARED_TTL = 24 * 3600
+
+# follower 等待 leader 的上限；超過就自行呼叫上游，避免 leader 卡住時全部一起卡住
+COALESCE_WAIT_SECONDS = 300.0
+
+
+class _InFlight:
+    """一個進行中的上游請求；follower 透過 event 等待 leader 的結果。"""
+
+    __slots__ = ("event", "result")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Optional[List[Dict[str, Any]]] = None
+
+
+class ResponseCache:
+    """記憶體 LRU + 選用磁碟層的回應快取，並負責追蹤進行中的請求以便合併。
+
+    值為序列化後的 ModelResponse 列表：非串流請求只有一個元素，串流請求則是完整的 delta 序列。
+    使用 threading.Lock（而非 asyncio.Lock），因為 image_agent 會在不同執行緒中以 asyncio.run 呼叫模型。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        disk_dir: Optional[str] = None,
+        ttl: Optional[int] = None,
+        shared: Optional[SharedState] = None,
+        shared_ttl: Optional[int] = None,
+    ):
+        self.max_entries = max_entries
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.ttl = ttl
+        self.shared = shared
+        if shared_ttl is None:
+            shared_ttl = ttl if ttl is not None else DEFAULT_SHARED_TTL
+        self.shared_ttl = shared_ttl
+        self._entries: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._inflight: Dict[str, _InFlight] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "ResponseCache":
+        # Agent / Team 會 deepcopy model；快取必須共用同一份（且 Lock 無法被複製）
+        return self
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        value = self._read_disk(key) or self._read_shared(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._put_memory(key, value[0], value[1])
+        return value[1]
+
+    def set(self, key: str, responses: List[Dict[str, Any]]) -> None:
+        stored_at = time.time()
+        with self._lock:
+            self._put_memory(key, stored_at, responses)
+        self._write_disk(key, stored_at, responses)
+        self._write_shared(key, stored_at, responses)
+
+    def _put_memory(self, key: str, stored_at: float, responses: List[Dict[str, Any]]) -> None:
+        self._entries[key] = (stored_at, responses)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, List[Dict[str, Any]]]]:
+        if self.disk_dir is None:
+            return None
+        path = self.disk_dir / f"{key}.json"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self._expired(data["stored_at"]):
+            return None
+        return data["stored_at"], data["responses"]
+
+    def _write_disk(self, key: str, stored_at: float, responses: List[Dict[str, Any]]) -> None:
+        if self.disk_dir is None:
+            return
+        path = self.disk_dir / f"{key}.json"
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"stored_at": stored_at, "responses": responses}, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)  # 原子替換，避免其他行程讀到寫一半的檔案
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"[llm-cache] 無法寫入磁碟快取 {path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _read_shared(self, key: str) -> Optional[Tuple[float, List[Dict[str, Any]]]]:
+        if self.shared is None:
+            return None
+        try:
+            data = self.shared.get(f"llm-cache:{key}")
+        except Exception as e:
+            logger.warning(f"[llm-cache] 無法讀取共用快取: {e}")
+            return None
+        if data is None or self._expired(data["stored_at"]):
+            return None
+        return data["stored_at"], data["responses"]
+
+    def _write_shared(self, key: str, stored_at: float, responses: List[Dict[str, Any]]) -> None:
+        if self.shared is None:
+            return
+        try:
+            self.shared.set(f"llm-cache:{key}", {"stored_at": stored_at, "responses": responses}, ttl=self.shared_ttl)
+        except Exception as e:
+            logger.warning(f"[llm-cache] 無法寫入共用快取: {e}")
+
+    def join(self, key: str) -> Tuple[_InFlight, bool]:
+        """登記一個進行中的請求，回傳 (entry, 是否為 leader)。"""
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is not None:
+                self.coalesced += 1
+                return entry, False
+            entry = _InFlight()
+            self._inflight[key] = entry
+            return entry, True
+
+    def release(self, key: str, entry: _InFlight, result: Optional[List[Dict[str, Any]]]) -> None:
+        """leader 完成（或失敗，result=None）後喚醒所有 follower。"""
+        entry.result = result
+        with self._lock:
+            if self._inflight.get(key) is entry:
+                del self._inflight[key]
+        entry.event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._inflight),
+                "disk_dir": str(self.disk_dir) if self.disk_dir else None,
+                "shared": self.shared.name if self.shared is not None else None,
+            }
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> ResponseCache:
+    """所有 CachedLiteLLMOpenAI 預設共用同一份快取，讓 team 與各 agent 之間也能互相命中。"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            ttl = os.getenv("LLM_CACHE_TTL")
+            shared_ttl = os.getenv("LLM_CACHE_SHARED_TTL")
+            shared = get_shared_state()
+            _default_cache = ResponseCache(
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512")),
+                disk_dir=os.getenv("LLM_CACHE_DIR") or None,
+                ttl=int(ttl) if ttl else None,
+                # memory 後端與記憶體 LRU 重複，只有跨行程的後端才需要第三層
+                shared=shared if shared.distributed else None,
+                shared_ttl=int(shared_ttl) if shared_ttl else None,
+            )
+        return _default_cache
+
+
+def _message_fingerprint(message: Message) -> Dict[str, Any]:
+    """只取會影響模型輸出的欄位；id / created_at / metrics 等每次都不同的欄位必須排除。
+
+    add_datetime_to_context 寫入的目前時間精確到微秒，每次呼叫都不同；
+    system message 中的時間只以日期計入 key，同一天內相同的請求才能命中。
+    """
+    content = message.content
+    if message.role == "system" and isinstance(content, str):
+        content = coarsen_datetime(content)
+    return {
+        "role": message.role,
+        "content": content,
+        "name": message.name,
+        "tool_call_id": message.tool_call_id,
+        "tool_calls": message.tool_calls,
+    }
+
+
+def _has_media(messages: List[Message]) -> bool:
+    return any(m.images or m.audio or m.videos or m.files for m in messages)
+
+
+def _restore(responses: List[Dict[str, Any]]) -> List[ModelResponse]:
+    """從快取還原 ModelResponse；每次都 deepcopy，避免呼叫端修改到快取內容。
+
+    命中快取不會產生上游成本，因此清掉 token 用量，避免 metrics 重複計算。
+    """
+    restored = []
+    for data in copy.deepcopy(responses):
+        response = ModelResponse.from_dict(data)
+        response.response_usage = None
+        response.input_tokens = response.output_tokens = response.total_tokens = None
+        restored.append(response)
+    return restored
+
+
+@dataclass
+class CachedLiteLLMOpenAI(LiteLLMOpenAI):
+    """帶回應快取與請求合併的 LiteLLMOpenAI。
+
+    只有 temperature == 0 的請求會進入快取 / 合併流程，其餘請求行為與 LiteLLMOpenAI 完全相同。
+    帶有圖片 / 音訊 / 檔案的訊息不快取。
+
+    stable_prefix=True 時改用 prompt_prefix 的組裝方式（固定內容在前、易變內容在後），
+    讓 provider 端的 prompt cache 能命中；prefix_label 用於前綴命中率統計的分組。
+
+    history_compactor 設定時，歷史 run 中的大型 tool 結果會依 token 預算截斷後才送出。
+    """
+
+    name: str = "CachedLiteLLMOpenAI"
+
+    # None 表示使用 get_default_cache() 的共用快取
+    response_cache: Optional[ResponseCache] = None
+
+    stable_prefix: bool = False
+    prefix_label: Optional[str] = None
+
+    history_compactor: Optional[HistoryCompactor] = None
+
+    def _get_response_cache(self) -> ResponseCache:
+        if self.response_cache is None:
+            self.response_cache = get_default_cache()
+        return self.response_cache
+
+    def _prepare(self, messages: List[Message], tools: Optional[List[Dict[str, Any]]]):
+        if self.history_compactor is not None:
+            messages = self.history_compactor.compact(messages)
+        if not self.stable_prefix:
+            return messages, tools
+        return stabilize_messages(messages), stabilize_tools(tools)
+
+    def _get_metrics(self, response_usage):
+        metrics = super()._get_metrics(response_usage)
+        cached = cached_prompt_tokens(response_usage)
+        if cached and not metrics.cache_read_tokens:
+            metrics.cache_read_tokens = cached
+        label = self.prefix_label or self.id
+        prefix_cache_stats.record(label, metrics.input_tokens or 0, cached)
+        record_llm_usage(label, metrics.input_tokens or 0, metrics.output_tokens or 0, cached)
+        return metrics
+
+    def _cache_key(
+        self,
+        messages: List[Message],
+        stream: bool,
+        response_format: Any = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: Any = None,
+    ) -> Optional[str]:
+        """回傳快取 key；不可快取的請求回傳 None。"""
+        if self.temperature != 0 or _has_media(messages):
+            return None
+        payload = {
+            "model": self.id,
+            "base_url": self.base_url,
+            "stream": stream,
+            "messages": [_message_fingerprint(m) for m in messages],
+            "tools": tools,
+            "tool_choice": tool_choice,
+            "params": self.get_request_params(response_format=response_format),
+        }
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # ------------------------------------------------------------------
+    # 非串流
+    # ------------------------------------------------------------------
+    def invoke(self, messages, assistant_message, response_format=None, tools=None, tool_choice=None, **kwargs):
+        messages, tools = self._prepare(messages, tools)
+        key = self._cache_key(messages, False, response_format, tools, tool_choice)
+        if key is None:
+            return super().invoke(messages, assistant_message, response_format, tools, tool_choice, **kwargs)
+
+        cache = self._get_response_cache()
+        cached = cache.get(key)
+        if cached is not None:
+            return _restore(cached)[0]
+
+        entry, is_leader = cache.join(key)
+        if not is_leader:
+            entry.event.wait(COALESCE_WAIT_SECONDS)
+            if entry.result is not None:
+                return _restore(entry.result)[0]
+
+        result = None
+        try:
+            response = super().invoke(messages, assistant_message, response_format, tools, tool_choice, **kwargs)
+            result = [response.to_dict()]
+            cache.set(key, result)
+            return response
+        finally:
+            if is_leader:
+                cache.release(key, entry, result)
+
+    async def ainvoke(self, messages, assistant_message, response_format=None, tools=None, tool_choice=None, **kwargs):
+        messages, tools = self._prepare(messages, tools)
+        key = self._cache_key(messages, False, response_format, tools, tool_choice)
+        if key is None:
+            return await super().ainvoke(messages, assistant_message, response_format, tools, tool_choice, **kwargs)
+
+        cache = self._get_response_cache()
+        cached = cache.get(key)
+        if cached is not None:
+            return _restore(cached)[0]
+
+        entry, is_leader = cache.join(key)
+        if not is_leader:
+            # leader 可能在另一個 event loop（另一條執行緒）上，只能透過 threading.Event 等待
+            await asyncio.to_thread(entry.event.wait, COALESCE_WAIT_SECONDS)
+            if entry.result is not None:
+                return _restore(entry.result)[0]
+
+        result = None
+        try:
+            response = await super().ainvoke(messages, assistant_message, response_format, tools, tool_choice, **kwargs)
+            result = [response.to_dict()]
+            cache.set(key, result)
+            return response
+        finally:
+            if is_leader:
+                cache.release(key, entry, result)
+
+    # ------------------------------------------------------------------
+    # 串流：快取完整的 delta 序列，命中時直接重播
+    # ------------------------------------------------------------------
+    def invoke_stream(
+        self, messages, assistant_message, response_format=None, tools=None, tool_choice=None, **kwargs
+    ) -> Iterator[ModelResponse]:
+        messages, tools = self._prepare(messages, tools)
+        key = self._cache_key(messages, True, response_format, tools, tool_choice)
+        if key is None:
+            yield from super().invoke_stream(messages, assistant_message, response_format, tools, tool_choice, **kwargs)
+            return
+
+        cache = self._get_response_cache()
+        cached = cache.get(key)
+        if cached is not None:
+            yield from _restore(cached)
+            return
+
+        entry, is_leader = cache.join(key)
+        if not is_leader:
+            entry.event.wait(COALESCE_WAIT_SECONDS)
+            if entry.result is not None:
+                yield from _restore(entry.result)
+                return
+
+        result = None
+        try:
+            collected = []
+            for delta in super().invoke_stream(
+                messages, assistant_message, response_format, tools, tool_choice, **kwargs
+            ):
+                collected.append(delta.to_dict())
+                yield delta
+            # 只有完整跑完的串流才寫入快取；中途斷線的部分結果不能重播
+            result = collected
+            cache.set(key, result)
+        finally:
+            if is_leader:
+                cache.release(key, entry, result)
+
+    async def ainvoke_stream(
+        self, messages, assistant_message, response_format=None, tools=None, tool_choice=None, **kwargs
+    ) -> AsyncIterator[ModelResponse]:
+        messages, tools = self._prepare(messages, tools)
+        key = self._cache_key(messages, True, response_format, tools, tool_choice)
+        if key is None:
+            async for delta in super().ainvoke_stream(
+                messages, assistant_message, response_format, tools, tool_choice, **kwargs
+            ):
+                yield delta
+            return
+
+        cache = self._get_response_cache()
+        cached = cache.get(key)
+        if cached is not None:
+            for delta in _restore(cached):
+                yield delta
+            return
+
+        entry, is_leader = cache.join(key)
+        if not is_leader:
+            await asyncio.to_thread(entry.event.wait, COALESCE_WAIT_SECONDS)
+            if entry.result is not None:
+                for delta in _restore(entry.result):
+                    yield delta
+                return
+
+        result = None
+        try:
+            collected = []
+            async for delta in super().ainvoke_stream(
+                messages, assistant_message, response_format, tools, tool_choice, **kwargs
+            ):
+                collected.append(delta.to_dict())
+                yield delta
+            result = collected
+            cache.set(key, result)
+        finally:
+            if is_leader:
+                cache.release(key, entry, result)
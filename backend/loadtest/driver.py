@@ -0,0 +1,235 @@
+"""
+Load driver：以固定併發數（closed loop）對 AgentOS 送出 SSE run，統計延遲與錯誤率。
+
+每個 run 量測：
+- ttft       送出請求到第一個有內容的 RunContent / TeamRunContent 事件
+             （coalesced 模式下同名事件只送出變動欄位，但第一個 content 事件一定包含 content）
+- latency    送出請求到串流結束
+- 成功條件   HTTP 200、沒有 *Error 事件、收到 RunCompleted / TeamRunCompleted
+
+可單獨對已啟動的服務使用：
+
+    python -m loadtest.driver --base-url http://localhost:8013 --target teams/creative-team \\
+        --concurrency 8 --requests 100 --mix chat:1,image:1
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import time
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+CONTENT_EVENTS = {"RunContent", "TeamRunContent"}
+COMPLETED_EVENTS = {"RunCompleted", "TeamRunCompleted"}
+
+
+@dataclass
+class RunResult:
+    kind: str
+    ok: bool
+    latency: float
+    ttft: Optional[float] = None
+    events: int = 0
+    error: str = ""
+
+
+@dataclass
+class LoadReport:
+    target: str
+    concurrency: int
+    requests: int
+    errors: int
+    error_rate: float
+    duration_s: float
+    throughput_rps: float
+    ttft_ms: Dict[str, float] = field(default_factory=dict)
+    latency_ms: Dict[str, float] = field(default_factory=dict)
+    by_kind: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    error_samples: Dict[str, int] = field(default_factory=dict)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """nearest-rank 百分位數；空列表回傳 0。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(values, 50) * 1000, 1),
+        "p90": round(percentile(values, 90) * 1000, 1),
+        "p99": round(percentile(values, 99) * 1000, 1),
+        "max": round(max(values) * 1000, 1) if values else 0.0,
+    }
+
+
+def parse_mix(mix: str) -> List[str]:
+    """'chat:3,image:1' → 依權重展開的 kind 列表，driver 依序循環取用。"""
+    kinds: List[str] = []
+    for part in mix.split(","):
+        name, _, weight = part.strip().partition(":")
+        kinds.extend([name] * int(weight or 1))
+    if not kinds:
+        raise ValueError(f"empty mix: {mix!r}")
+    return kinds
+
+
+async def run_once(client: httpx.AsyncClient, url: str, kind: str, index: int) -> RunResult:
+    message = f"#{kind} load test request {index} ({uuid.uuid4().hex[:8]})"
+    data = {
+        "message": message,
+        "stream": "true",
+        "session_id": f"loadtest-{uuid.uuid4()}",
+        "user_id": f"loadtest-user-{index % 50}",
+    }
+    start = time.perf_counter()
+    result = RunResult(kind=kind, ok=False, latency=0.0)
+    completed = False
+    try:
+        async with client.stream("POST", url, data=data) as response:
+            if response.status_code != 200:
+                await response.aread()
+                result.error = f"HTTP {response.status_code}"
+                return result
+            event_name = ""
+            data_lines: List[str] = []
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event_name = line[6:].strip()
+                elif line.startswith("data:"):
+                    data_lines.append(line[5:].strip())
+                elif not line and (event_name or data_lines):
+                    result.events += 1
+                    payload = "\n".join(data_lines)
+                    if event_name in CONTENT_EVENTS and result.ttft is None and '"content"' in payload:
+                        try:
+                            if json.loads(payload).get("content"):
+                                result.ttft = time.perf_counter() - start
+                        except ValueError:
+                            pass
+                    elif event_name in COMPLETED_EVENTS:
+                        completed = True
+                    elif event_name.endswith("Error"):
+                        result.error = f"{event_name}: {payload[:120]}"
+                    event_name, data_lines = "", []
+        if not result.error and not completed:
+            result.error = "stream ended without RunCompleted"
+        result.ok = not result.error
+    except httpx.HTTPError as e:
+        result.error = f"{type(e).__name__}: {e}"[:160]
+    finally:
+        result.latency = time.perf_counter() - start
+    return result
+
+
+async def run_load(
+    base_url: str,
+    target: str,
+    concurrency: int,
+    requests: int,
+    mix: str = "chat:1",
+    timeout: float = 300.0,
+    stream_mode: str = "",
+) -> LoadReport:
+    url = f"{base_url.rstrip('/')}/{target.strip('/')}/runs"
+    if stream_mode:
+        url += f"?stream_mode={stream_mode}"
+    kinds = itertools.cycle(parse_mix(mix))
+    counter = itertools.count()
+    results: List[RunResult] = []
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(timeout, connect=10.0), limits=limits) as client:
+
+        async def worker():
+            while True:
+                index = next(counter)
+                if index >= requests:
+                    return
+                results.append(await run_once(client, url, next(kinds), index))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        duration = time.perf_counter() - start
+
+    errors = [r for r in results if not r.ok]
+    report = LoadReport(
+        target=target,
+        concurrency=concurrency,
+        requests=len(results),
+        errors=len(errors),
+        error_rate=round(len(errors) / len(results), 4) if results else 0.0,
+        duration_s=round(duration, 2),
+        throughput_rps=round(len(results) / duration, 3) if duration else 0.0,
+        ttft_ms=summarize([r.ttft for r in results if r.ttft is not None]),
+        latency_ms=summarize([r.latency for r in results if r.ok]),
+        error_samples=dict(Counter(r.error for r in errors).most_common(5)),
+    )
+    for kind in sorted({r.kind for r in results}):
+        group = [r for r in results if r.kind == kind]
+        report.by_kind[kind] = {
+            "requests": len(group),
+            "errors": sum(1 for r in group if not r.ok),
+            "ttft_p50_ms": summarize([r.ttft for r in group if r.ttft is not None])["p50"],
+            "latency_p99_ms": summarize([r.latency for r in group if r.ok])["p99"],
+        }
+    return report
+
+
+def print_report(report: LoadReport) -> None:
+    print("=" * 60)
+    print(f"Target: {report.target}  concurrency={report.concurrency}  requests={report.requests}")
+    print("=" * 60)
+    print(f"Duration:    {report.duration_s:.2f}s")
+    print(f"Throughput:  {report.throughput_rps:.3f} runs/s")
+    print(f"Error rate:  {report.error_rate:.2%} ({report.errors}/{report.requests})")
+    for name, stats in (("TTFT", report.ttft_ms), ("Latency", report.latency_ms)):
+        print(f"{name + ':':<12} p50={stats['p50']}ms  p90={stats['p90']}ms  p99={stats['p99']}ms  max={stats['max']}ms")
+    for kind, stats in report.by_kind.items():
+        print(f"  [{kind}] {stats}")
+    for error, count in report.error_samples.items():
+        print(f"  ✗ {count}× {error}")
+
+
+def add_load_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--target", default="teams/creative-team", help="例如 teams/creative-team 或 agents/research-agent")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--mix", default="chat:1", help="流量組成，例如 chat:3,research:1,image:1")
+    parser.add_argument("--timeout", type=float, default=300.0, help="單一 run 的逾時秒數")
+    parser.add_argument("--stream-mode", default="", help="例如 coalesced（見 sse_coalescing.py）")
+    parser.add_argument("--json-out", help="將報告寫成 JSON，方便比較不同版本")
+
+
+def write_report(report: LoadReport, path: Optional[str]) -> None:
+    print_report(report)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(asdict(report), f, indent=2, ensure_ascii=False)
+        print(f"Report saved to {path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Drive concurrent SSE runs against a running AgentOS")
+    parser.add_argument("--base-url", default="http://localhost:8013")
+    add_load_arguments(parser)
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(
+        args.base_url, args.target, args.concurrency, args.requests, args.mix, args.timeout, args.stream_mode
+    ))
+    write_report(report, args.json_out)
+
+
+if __name__ == "__main__":
+    main()
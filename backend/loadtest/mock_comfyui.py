@@ -0,0 +1,126 @@
+"""
+模擬 ComfyUI：實作 image.py 用到的 /prompt、/history/{prompt_id}、/view，以及推送進度的 /ws。
+
+真實 ComfyUI 只有一張 GPU，prompt 依序執行；這裡以「前一張完成時間 + render_seconds」
+計算每個 prompt 的完成時間，因此併發送入時排隊行為與正式環境一致。
+
+    python -m loadtest.mock_comfyui --port 18002 --render-seconds 2
+"""
+
+import argparse
+import asyncio
+import base64
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response
+
+# 1x1 透明 PNG
+_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+
+@dataclass
+class MockComfyUIConfig:
+    render_seconds: float = 2.0
+    steps: int = 20
+
+
+config = MockComfyUIConfig()
+app = FastAPI(title="Mock ComfyUI")
+
+_lock = threading.Lock()
+_done_at: Dict[str, float] = {}
+_client_prompts: Dict[str, Dict[str, Tuple[float, float]]] = {}  # client_id → {prompt_id: (start, done_at)}
+_gpu_free_at = 0.0
+
+
+@app.get("/health")
+async def health():
+    now = time.monotonic()
+    return {"status": "ok", "prompts": len(_done_at), "pending": sum(1 for t in _done_at.values() if t > now)}
+
+
+@app.post("/prompt")
+async def queue_prompt(payload: dict):
+    global _gpu_free_at
+    if "prompt" not in payload:
+        raise HTTPException(status_code=400, detail="missing prompt")
+    prompt_id = str(uuid.uuid4())
+    with _lock:
+        start = max(time.monotonic(), _gpu_free_at)
+        _gpu_free_at = start + config.render_seconds
+        _done_at[prompt_id] = _gpu_free_at
+        number = len(_done_at)
+        if payload.get("client_id"):
+            _client_prompts.setdefault(payload["client_id"], {})[prompt_id] = (start, _gpu_free_at)
+    return {"prompt_id": prompt_id, "number": number, "node_errors": {}}
+
+
+@app.get("/history/{prompt_id}")
+async def history(prompt_id: str):
+    done_at = _done_at.get(prompt_id)
+    if done_at is None or time.monotonic() < done_at:
+        return {}
+    filename = f"loadtest_{prompt_id[:8]}_.png"
+    return {
+        prompt_id: {
+            "outputs": {"9": {"images": [{"filename": filename, "subfolder": "", "type": "output"}]}},
+            "status": {"status_str": "success", "completed": True},
+        }
+    }
+
+
+@app.get("/view")
+async def view(filename: str, type: str = "output"):
+    return Response(content=_PNG, media_type="image/png")
+
+
+@app.websocket("/ws")
+async def progress_ws(websocket: WebSocket, clientId: str = ""):
+    """與 ComfyUI 相同的訊息格式：progress {value, max, prompt_id}，完成時 executing {node: None}。"""
+    await websocket.accept()
+    sent: Dict[str, int] = {}
+    try:
+        while True:
+            now = time.monotonic()
+            for prompt_id, (start, done_at) in list(_client_prompts.get(clientId, {}).items()):
+                if now < start:
+                    continue
+                if now >= done_at:
+                    await websocket.send_json({"type": "executing", "data": {"node": None, "prompt_id": prompt_id}})
+                    _client_prompts[clientId].pop(prompt_id, None)
+                    continue
+                step = int((now - start) / config.render_seconds * config.steps) + 1
+                if sent.get(prompt_id) != step:
+                    sent[prompt_id] = step
+                    await websocket.send_json({
+                        "type": "progress",
+                        "data": {"value": step, "max": config.steps, "prompt_id": prompt_id, "node": "6"},
+                    })
+            await asyncio.sleep(config.render_seconds / config.steps / 2)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _client_prompts.pop(clientId, None)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake ComfyUI with a single-GPU queue for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18002)
+    parser.add_argument("--render-seconds", type=float, default=config.render_seconds)
+    args = parser.parse_args()
+
+    config.render_seconds = args.render_seconds
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
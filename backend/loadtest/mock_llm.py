@@ -0,0 +1,209 @@
+"""
+可腳本化的 OpenAI 相容 LLM stub（POST /v1/chat/completions，支援 stream 與 non-stream）。
+
+每個請求依「最後一則 user 訊息中的標記」決定行為，driver 透過標記控制流量組成：
+    #chat      直接回答文字
+    #research  team 委派給 research-agent，research-agent 回答文字
+    #image     team 委派給 image-generator，image agent 呼叫 generate_image_with_comfyui
+
+規則（依序判斷）：
+1. 最後一則 user 訊息之後已有 tool 結果 → 回答文字（tool loop 結束）
+2. 提供了 generate_image_with_comfyui → 呼叫它（只有 image agent 會有這個 tool）
+3. 提供了 delegate_task_to_member 且標記為 research / image → 委派給對應成員
+4. 其他 → 回答文字
+
+延遲模型：第一個 token 前等待 ttft_ms，之後每個 token 等待 token_ms。
+
+    python -m loadtest.mock_llm --port 18001 --ttft-ms 300 --token-ms 15 --answer-tokens 80
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MEMBER_BY_KIND = {"research": "research-agent", "image": "image-generator"}
+KINDS = ("chat", "research", "image")
+
+
+@dataclass
+class MockLLMConfig:
+    ttft_ms: float = 300.0
+    token_ms: float = 15.0
+    answer_tokens: int = 80
+    fail_rate: float = 0.0
+    default_kind: str = "chat"
+
+
+config = MockLLMConfig()
+app = FastAPI(title="Mock LLM")
+
+_stats = {"requests": 0, "streamed": 0, "tool_calls": 0, "failed": 0}
+
+
+def _text_of(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return ""
+
+
+def _kind_of(text: str) -> str:
+    for kind in KINDS:
+        if f"#{kind}" in text:
+            return kind
+    return config.default_kind
+
+
+def plan_response(body: Dict[str, Any]) -> Tuple[Optional[Tuple[str, Dict[str, Any]]], str]:
+    """回傳 (tool_call, kind)；tool_call 為 None 表示回答文字。"""
+    messages: List[Dict[str, Any]] = body.get("messages") or []
+    last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+    user_text = _text_of(messages[last_user].get("content")) if last_user >= 0 else ""
+    kind = _kind_of(user_text)
+
+    if any(m.get("role") == "tool" for m in messages[last_user + 1:]):
+        return None, kind
+
+    tools = {t.get("function", {}).get("name") for t in body.get("tools") or []}
+    if "generate_image_with_comfyui" in tools:
+        return ("generate_image_with_comfyui", {"image_prompt": "a lighthouse at dusk, load test", "width": 512, "height": 512}), kind
+    if "delegate_task_to_member" in tools and kind in MEMBER_BY_KIND:
+        return ("delegate_task_to_member", {"member_id": MEMBER_BY_KIND[kind], "task": f"#{kind} {user_text[:200]}"}), kind
+    return None, kind
+
+
+def _answer_tokens(kind: str) -> List[str]:
+    words = ["Load", "test", "answer", f"({kind})", "with", "deterministic", "filler", "text."]
+    return [f"{words[i % len(words)]} " for i in range(config.answer_tokens)]
+
+
+def _usage(body: Dict[str, Any], completion_tokens: int) -> Dict[str, int]:
+    prompt_chars = sum(len(_text_of(m.get("content"))) for m in body.get("messages") or [])
+    prompt_tokens = max(prompt_chars // 4, 1)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _tool_call_payload(name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": f"call_{uuid.uuid4().hex[:16]}",
+        "type": "function",
+        "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)},
+    }
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", **_stats}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    _stats["requests"] += 1
+    model = body.get("model", "mock")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+
+    if config.fail_rate and random.random() < config.fail_rate:
+        _stats["failed"] += 1
+        await asyncio.sleep(config.ttft_ms / 1000)
+        return JSONResponse({"error": {"message": "mock upstream failure", "type": "server_error"}}, status_code=500)
+
+    tool_call, kind = plan_response(body)
+    if tool_call:
+        _stats["tool_calls"] += 1
+
+    if not body.get("stream"):
+        tokens = [] if tool_call else _answer_tokens(kind)
+        await asyncio.sleep((config.ttft_ms + config.token_ms * len(tokens)) / 1000)
+        message: Dict[str, Any] = {"role": "assistant", "content": "".join(tokens) or None}
+        if tool_call:
+            message["tool_calls"] = [_tool_call_payload(*tool_call)]
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_call else "stop"}],
+            "usage": _usage(body, len(tokens) or 20),
+        }
+
+    _stats["streamed"] += 1
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    async def stream():
+        await asyncio.sleep(config.ttft_ms / 1000)
+        yield chunk({"role": "assistant", "content": ""})
+        if tool_call:
+            call = _tool_call_payload(*tool_call)
+            yield chunk({"tool_calls": [{"index": 0, **call}]})
+            completion_tokens = 20
+            finish_reason = "tool_calls"
+        else:
+            tokens = _answer_tokens(kind)
+            for token in tokens:
+                yield chunk({"content": token})
+                await asyncio.sleep(config.token_ms / 1000)
+            completion_tokens = len(tokens)
+            finish_reason = "stop"
+        yield chunk({}, finish_reason)
+        if include_usage:
+            usage_chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [],
+                "usage": _usage(body, completion_tokens),
+            }
+            yield f"data: {json.dumps(usage_chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Scripted OpenAI-compatible LLM stub for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18001)
+    parser.add_argument("--ttft-ms", type=float, default=config.ttft_ms)
+    parser.add_argument("--token-ms", type=float, default=config.token_ms)
+    parser.add_argument("--answer-tokens", type=int, default=config.answer_tokens)
+    parser.add_argument("--fail-rate", type=float, default=config.fail_rate, help="比例 0~1，回傳 HTTP 500")
+    parser.add_argument("--default-kind", choices=KINDS, default=config.default_kind)
+    args = parser.parse_args()
+
+    config.ttft_ms = args.ttft_ms
+    config.token_ms = args.token_ms
+    config.answer_tokens = args.answer_tokens
+    config.fail_rate = args.fail_rate
+    config.default_kind = args.default_kind
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
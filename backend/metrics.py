@@ -0,0 +1,304 @@
+"""
+Prometheus Metrics
+
+主 AgentOS (8013) 與 Image AgentOS (9999) 共用的 metrics 定義，透過 install_metrics(app) 掛上 /metrics。
+
+收集的指標：
+- agentos_run_duration_seconds        每個 agent / team run 的完整延遲（含 SSE 串流，直到最後一個 byte）
+- agentos_http_request_duration_seconds 其他路由（proxy、extract-text、下載等）的延遲
+- agentos_tool_call_duration_seconds  每個 tool 呼叫的延遲（透過 agno tool_hooks）
+- agentos_llm_tokens_total            LLM token 用量（input / output / cached）
+- agentos_llm_response_cache_*        llm_cache 命中 / 未命中 / 合併次數
+- comfyui_queue_wait_seconds / comfyui_render_seconds  ComfyUI 排隊等待 vs 實際生成時間
+- agentos_db_pool_*                   SQLAlchemy connection pool 使用狀況
+- agentos_extract_text_*              /extract-text 的處理量
+- agentos_admission_*                 team run 准入控制的排隊時間與拒絕次數
+- agentos_sse_frames_total / agentos_sse_bytes_total  coalesced 串流合併前後的 frame 數與 bytes
+
+所有統計都在行程內聚合（prometheus_client），請求路徑上只有一次 dict 查找與一次 observe。
+
+多 worker 部署時由 enable_multiprocess_metrics() 設定 PROMETHEUS_MULTIPROC_DIR，
+各 worker 的 Counter / Histogram 寫入共用目錄，/metrics 匯總所有 worker；
+scrape 時才讀取的 DB pool 與 llm_cache 狀態則只反映回應這次 scrape 的 worker。
+"""
+
+import glob
+import os
+import re
+import tempfile
+import time
+from inspect import isasyncgen, isawaitable, isgenerator
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.responses import Response
+
+# LLM run 與 ComfyUI 的延遲範圍遠大於一般 HTTP 請求，bucket 需要延伸到數分鐘
+RUN_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 90, 120, 180, 300, 600)
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+RUN_DURATION = Histogram(
+    "agentos_run_duration_seconds",
+    "Agent / team run latency including the full streamed response",
+    ["kind", "id", "status"],
+    buckets=RUN_BUCKETS,
+)
+HTTP_DURATION = Histogram(
+    "agentos_http_request_duration_seconds",
+    "Latency of non-run HTTP routes (proxies, extraction, downloads, ...)",
+    ["route", "method", "status"],
+    buckets=FAST_BUCKETS,
+)
+TOOL_DURATION = Histogram(
+    "agentos_tool_call_duration_seconds",
+    "Tool call latency per tool",
+    ["tool", "status"],
+    buckets=RUN_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "agentos_llm_tokens_total",
+    "LLM tokens reported by the provider",
+    ["label", "type"],
+)
+COMFYUI_QUEUE_WAIT = Histogram(
+    "comfyui_queue_wait_seconds",
+    "Time an image request waits for the serialized ComfyUI slot",
+    buckets=RUN_BUCKETS,
+)
+COMFYUI_RENDER = Histogram(
+    "comfyui_render_seconds",
+    "Time from submitting the ComfyUI prompt until the image is downloaded",
+    ["status"],
+    buckets=RUN_BUCKETS,
+)
+EXTRACT_DURATION = Histogram(
+    "agentos_extract_text_duration_seconds",
+    "Per-file text extraction latency",
+    ["type"],
+    buckets=FAST_BUCKETS,
+)
+EXTRACT_BYTES = Counter("agentos_extract_text_bytes_total", "Bytes of uploaded documents processed", ["type"])
+EXTRACT_CHARS = Counter("agentos_extract_text_chars_total", "Characters of text extracted", ["type"])
+SSE_FRAMES = Counter("agentos_sse_frames_total", "SSE frames before (upstream) and after (sent) coalescing", ["stage"])
+ADMISSION_WAIT = Histogram(
+    "agentos_admission_queue_wait_seconds",
+    "Time a team run waited in the admission queue before starting",
+    buckets=RUN_BUCKETS,
+)
+ADMISSION_REJECTED = Counter(
+    "agentos_admission_rejected_total", "Team runs rejected by admission control", ["reason"]
+)
+SSE_BYTES = Counter("agentos_sse_bytes_total", "SSE bytes before (upstream) and after (sent) coalescing", ["stage"])
+
+_RUN_PATH = re.compile(r"/(agents|teams)/([^/]+)/runs$")
+
+# 依路徑前綴分組，避免把 session_id / filename 當成 label 造成 cardinality 爆炸
+_ROUTE_PREFIXES = [
+    ("/image-agent/sessions", "image-agent-proxy"),
+    ("/extract-text", "extract-text"),
+    ("/download", "download"),
+    ("/images/", "images"),
+    ("/charts/", "charts"),
+    ("/artifacts/", "artifacts"),
+    ("/sessions", "sessions"),
+    ("/a2a/", "a2a"),
+    ("/run-streams/", "run-streams"),
+    ("/admission/", "admission"),
+]
+
+
+# /extract-text 支援的檔案類型；其餘副檔名（使用者可任意命名）一律記為 other
+EXTRACT_FILE_TYPES = frozenset({"pdf", "docx", "csv", "txt", "json"})
+
+
+def _classify_route(path: str) -> str:
+    for prefix, route in _ROUTE_PREFIXES:
+        if prefix in path:
+            return route
+    return "other"
+
+
+class MetricsMiddleware:
+    """純 ASGI middleware：計時到 response 最後一個 body chunk 送出為止，因此 SSE run 會計入完整串流時間。"""
+
+    def __init__(self, app, skip_paths: Iterable[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = tuple(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].endswith(self.skip_paths):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            path = scope["path"]
+            run_match = _RUN_PATH.search(path)
+            if run_match and scope["method"] == "POST":
+                kind = "agent" if run_match.group(1) == "agents" else "team"
+                RUN_DURATION.labels(kind, run_match.group(2), str(status["code"])).observe(elapsed)
+            else:
+                HTTP_DURATION.labels(_classify_route(path), scope["method"], str(status["code"])).observe(elapsed)
+
+
+async def metrics_tool_hook(function_name: str, function_call: Callable, arguments: Dict[str, Any]):
+    """agno tool hook：記錄每個 tool 呼叫的延遲與成功 / 失敗。"""
+    start = time.perf_counter()
+    status: Optional[str] = "ok"
+    try:
+        result = function_call(**arguments)
+        # generator tool（例如串流進度的圖片生成）：延遲要算到 generator 結束為止
+        if isasyncgen(result):
+            status = None
+            return _timed_generator(function_name, result, start)
+        if isgenerator(result):
+            status = None
+            return _timed_sync_generator(function_name, result, start)
+        if isawaitable(result):
+            result = await result
+        return result
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        if status is not None:
+            TOOL_DURATION.labels(function_name, status).observe(time.perf_counter() - start)
+
+
+async def _timed_generator(function_name: str, gen: AsyncIterator[Any], start: float) -> AsyncIterator[Any]:
+    status = "ok"
+    try:
+        async for item in gen:
+            yield item
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        TOOL_DURATION.labels(function_name, status).observe(time.perf_counter() - start)
+
+
+def _timed_sync_generator(function_name: str, gen: Iterator[Any], start: float) -> Iterator[Any]:
+    status = "ok"
+    try:
+        yield from gen
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        TOOL_DURATION.labels(function_name, status).observe(time.perf_counter() - start)
+
+
+def record_llm_usage(label: str, input_tokens: int, output_tokens: int, cached_tokens: int) -> None:
+    LLM_TOKENS.labels(label, "input").inc(input_tokens)
+    LLM_TOKENS.labels(label, "output").inc(output_tokens)
+    LLM_TOKENS.labels(label, "cached").inc(cached_tokens)
+
+
+class _RuntimeCollector:
+    """在 scrape 時才讀取 DB pool 與 llm_cache 狀態，請求路徑上零成本。"""
+
+    def __init__(self) -> None:
+        self.engines: Dict[str, Any] = {}
+
+    def describe(self):
+        # 回傳空列表，避免 REGISTRY.register() 在 import 時就呼叫 collect()（llm_cache 尚未載入完成）
+        return []
+
+    def collect(self):
+        checked_out = GaugeMetricFamily("agentos_db_pool_checked_out", "Connections currently checked out", labels=["db"])
+        size = GaugeMetricFamily("agentos_db_pool_size", "Configured pool size", labels=["db"])
+        overflow = GaugeMetricFamily("agentos_db_pool_overflow", "Connections opened beyond pool size", labels=["db"])
+        saturation = GaugeMetricFamily(
+            "agentos_db_pool_saturation", "checked_out / (pool size + max_overflow)", labels=["db"]
+        )
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            if not hasattr(pool, "checkedout"):
+                continue
+            capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+            checked_out.add_metric([name], pool.checkedout())
+            size.add_metric([name], pool.size())
+            overflow.add_metric([name], max(pool.overflow(), 0))
+            saturation.add_metric([name], pool.checkedout() / capacity if capacity else 0.0)
+        yield from (checked_out, size, overflow, saturation)
+
+        from llm_cache import get_default_cache
+
+        stats = get_default_cache().stats()
+        for key in ("hits", "misses", "coalesced"):
+            counter = CounterMetricFamily(f"agentos_llm_response_cache_{key}", f"llm_cache {key}")
+            counter.add_metric([], stats[key])
+            yield counter
+        entries = GaugeMetricFamily("agentos_llm_response_cache_entries", "Entries in the in-memory LLM cache")
+        entries.add_metric([], stats["entries"])
+        yield entries
+
+
+_runtime_collector = _RuntimeCollector()
+REGISTRY.register(_runtime_collector)
+
+
+def register_db_engine(name: str, engine: Any) -> None:
+    """登記要回報 pool 使用狀況的 SQLAlchemy engine（同一個 name 重複登記會覆蓋）。"""
+    _runtime_collector.engines[name] = engine
+
+
+def enable_multiprocess_metrics(prefix: str) -> str:
+    """多 worker 啟動前（serve 之前、由主行程）呼叫，回傳各 worker 共用的 metrics 目錄。
+
+    prometheus_client 在 import 時依 PROMETHEUS_MULTIPROC_DIR 決定是否寫檔，
+    worker 是重新 import app 的子行程，因此只要在 serve 之前設定環境變數即可。
+    未指定目錄時為每次啟動建立新的暫存目錄；指定時清掉上次執行留下的檔案。
+    """
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for name in glob.glob(os.path.join(path, "*.db")):
+            os.remove(name)
+    else:
+        path = tempfile.mkdtemp(prefix=f"{prefix}-metrics-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+
+def _scrape_registry():
+    """單一行程直接用 REGISTRY；多 worker 時匯總 PROMETHEUS_MULTIPROC_DIR 中所有 worker 的數值。"""
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(_runtime_collector)
+    return registry
+
+
+def install_metrics(app, db_engines: Optional[Dict[str, Any]] = None) -> None:
+    """為 FastAPI app 加上 MetricsMiddleware 與 GET /metrics。"""
+    for name, engine in (db_engines or {}).items():
+        register_db_engine(name, engine)
+
+    app.add_middleware(MetricsMiddleware)
+    registry = _scrape_registry()
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint():
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def observe_extraction(file_type: str, elapsed: float, size_bytes: int, chars: int) -> None:
+    if file_type not in EXTRACT_FILE_TYPES:
+        file_type = "other"
+    EXTRACT_DURATION.labels(file_type).observe(elapsed)
+    EXTRACT_BYTES.labels(file_type).inc(size_bytes)
+    EXTRACT_CHARS.labels(file_type).inc(chars)
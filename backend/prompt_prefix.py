@@ -0,0 +1,143 @@
+"""
+Prompt 前綴穩定化 (Prompt-Prefix Stabilization)
+
+DeepSeek / LiteLLM 的 provider 端 prompt cache 只對「完全相同的前綴」生效。
+agno 預設把 datetime（add_datetime_to_context=True）、使用者記憶與 session 摘要
+都寫在 system message 裡，導致 system message 每次呼叫都不同，之後的 instructions、
+tool schemas、skills 摘要全部無法命中快取。
+
+stabilize_messages() 重新組裝送往模型的訊息：
+1. system message 只保留固定內容（instructions / tool 說明 / skills 摘要），逐 byte 相同且永遠在最前面
+2. 易變內容（目前時間、記憶、摘要）抽出成獨立的 system message，放在本次 run 的 user message 之前
+   → 前綴 = 固定 system + 歷史訊息（只會往後追加），同一 run 內的 tool 迴圈也不會破壞前綴
+3. tool schemas 依名稱排序，確保每次序列化結果相同
+
+PrefixCacheStats 從 usage 欄位（cached_tokens / DeepSeek 的 prompt_cache_hit_tokens）統計前綴命中率。
+"""
+
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from agno.models.message import Message
+
+# 目前時間：agno 寫在 <additional_information> 中的一行
+_DATETIME_LINE = re.compile(r"\n- The current time is [^\n]*")
+# 只取日期部分，作為回應快取 key 的粗粒度時間 bucket（agno 預設格式為 str(datetime)）
+_DATETIME_VALUE = re.compile(r"(\n- The current time is )(\d{4}-\d{2}-\d{2})[^\n]*")
+_EMPTY_ADDITIONAL_INFO = re.compile(r"<additional_information>\n</additional_information>\n\n")
+
+# 使用者記憶與 session 摘要區塊（含 agno 附加在後的 Note 說明）
+_VOLATILE_BLOCKS = [
+    re.compile(
+        r"You have access to user info and preferences from previous interactions.*?"
+        r"</memories_from_previous_interactions>\n\n(?:Note: [^\n]*\n\n?)?",
+        re.DOTALL,
+    ),
+    re.compile(
+        r"Here is a brief summary of your previous interactions:.*?"
+        r"</summary_of_previous_interactions>\n\n(?:Note: [^\n]*\n\n?)?",
+        re.DOTALL,
+    ),
+]
+
+
+def split_volatile(system_content: str) -> Tuple[str, str]:
+    """把 system message 拆成 (固定部分, 易變部分)。"""
+    volatile_parts: List[str] = []
+
+    datetime_lines = _DATETIME_LINE.findall(system_content)
+    if datetime_lines:
+        system_content = _DATETIME_LINE.sub("", system_content)
+        system_content = _EMPTY_ADDITIONAL_INFO.sub("", system_content)
+        volatile_parts.append("<additional_information>" + "".join(datetime_lines) + "\n</additional_information>")
+
+    for pattern in _VOLATILE_BLOCKS:
+        for block in pattern.findall(system_content):
+            volatile_parts.append(block.strip())
+        system_content = pattern.sub("", system_content)
+
+    return system_content, "\n\n".join(volatile_parts)
+
+
+def coarsen_datetime(content: str) -> str:
+    """把目前時間截到日期，供回應快取計算 key；送往模型的內容不變。"""
+    return _DATETIME_VALUE.sub(r"\1\2", content)
+
+
+def _last_user_index(messages: List[Message]) -> Optional[int]:
+    """本次 run 的 user message（非歷史訊息）位置。"""
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i].role == "user" and not messages[i].from_history:
+            return i
+    return None
+
+
+def stabilize_messages(messages: List[Message]) -> List[Message]:
+    """回傳重新排列後的新訊息列表；不修改原本的 messages（agno 會把它存回 session）。"""
+    if not messages or messages[0].role != "system" or not isinstance(messages[0].content, str):
+        return messages
+
+    stable, volatile = split_volatile(messages[0].content)
+    if not volatile:
+        return messages
+
+    result = [messages[0].model_copy(update={"content": stable})] + list(messages[1:])
+    insert_at = _last_user_index(result)
+    volatile_message = Message(role="system", content=volatile)
+    if insert_at is None:
+        result.append(volatile_message)
+    else:
+        result.insert(insert_at, volatile_message)
+    return result
+
+
+def stabilize_tools(tools: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+    """依 function 名稱排序 tool schemas。"""
+    if not tools:
+        return tools
+    return sorted(tools, key=lambda t: (t.get("function") or {}).get("name") or "")
+
+
+class PrefixCacheStats:
+    """依 label（通常是 agent / team id）累計 prompt tokens 與命中 provider 快取的 tokens。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def record(self, label: str, prompt_tokens: int, cached_tokens: int) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(label, {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "hits": 0})
+            stats["requests"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["cached_tokens"] += cached_tokens
+            if cached_tokens > 0:
+                stats["hits"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result: Dict[str, Dict[str, Any]] = {}
+            for label, stats in self._stats.items():
+                prompt_tokens = stats["prompt_tokens"]
+                result[label] = {
+                    **stats,
+                    "cached_token_ratio": round(stats["cached_tokens"] / prompt_tokens, 4) if prompt_tokens else 0.0,
+                }
+            return result
+
+
+prefix_cache_stats = PrefixCacheStats()
+
+
+def cached_prompt_tokens(usage: Any) -> int:
+    """從 OpenAI 相容的 usage 物件取出命中快取的 prompt tokens。
+
+    LiteLLM 會把 DeepSeek 的 prompt_cache_hit_tokens 轉成 prompt_tokens_details.cached_tokens，
+    但直連 DeepSeek 時只有原始欄位，兩者都要看。
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    if cached:
+        return int(cached)
+    return int(getattr(usage, "prompt_cache_hit_tokens", None) or 0)
@@ -0,0 +1,446 @@
+"""
+可續傳的 SSE Run 串流 (Resumable Run Streams)
+
+網路不穩或反向代理重置連線時，前端的串流 run 會中斷，使用者只能重送訊息，
+整個 LLM + tool 流程重新執行一次。
+
+請求帶上 `?resumable=1` 時，ResumableRunMiddleware 把 run 與 HTTP 連線解耦：
+1. run 在獨立的 asyncio task 中執行，client 斷線不會取消 run
+2. 每個 SSE frame 加上遞增的 `id:`，寫入該 run 的 ring buffer（RUN_STREAM_MAX_EVENTS）
+3. 串流開頭送出註解行 `: stream-id <id>`；斷線後以
+   `GET /run-streams/{stream_id}`（帶 `Last-Event-ID` header 或 `?last_event_id=`）從斷點續傳，
+   run 尚未結束時續傳後繼續即時轉送
+4. 使用者主動停止（逾時 / 換題）時呼叫 `DELETE /run-streams/{stream_id}` 取消 run
+5. run 結束後 buffer 保留 RUN_STREAM_TTL 秒供續傳，之後清除
+
+與 sse_coalescing 併用時本 middleware 位於外層，buffer 存的是合併後的 frame，
+續傳內容與 client 原本收到的完全一致。
+
+多 worker 部署（shared_state 為 postgres / redis）時，frame 另外批次寫入共用 log 並發出通知：
+續傳請求落在其他 worker 時從共用 log 讀取並持續跟隨，DELETE 則透過 pub/sub 通知執行中的 worker 取消。
+
+環境變數：
+    RUN_STREAM_MAX_EVENTS  每個 run 保留的 frame 數上限（預設 10000）
+    RUN_STREAM_TTL         run 結束後 buffer 保留秒數（預設 300）
+"""
+
+import asyncio
+import codecs
+import itertools
+import logging
+import os
+import re
+import time
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs
+
+from fastapi import Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from shared_state import WORKER_ID, SharedState, get_shared_state
+
+logger = logging.getLogger(__name__)
+
+_RUN_PATH = re.compile(r"/(agents|teams)/[^/]+/runs$")
+
+# 跟隨其他 worker 的 run 時，通知遺失的保底輪詢間隔
+REMOTE_POLL_SECONDS = 2.0
+# run 執行中時共用 log / meta 的存活秒數（每次寫入都會延長）；結束後改用 RUN_STREAM_TTL
+RUNNING_TTL = 3600.0
+CANCEL_CHANNEL = "run-stream-cancel"
+
+
+def _meta_key(stream_id: str) -> str:
+    return f"run-stream:{stream_id}"
+
+
+class StreamGap(Exception):
+    """要求的 Last-Event-ID 已被 ring buffer 淘汰，無法無損續傳。"""
+
+
+class RunStream:
+    """單一 run 的 SSE frame ring buffer；frame id 從 1 開始連續遞增。"""
+
+    def __init__(self, stream_id: str, max_events: int):
+        self.stream_id = stream_id
+        self.events: Deque[Tuple[int, bytes]] = deque(maxlen=max_events)
+        self.next_id = 1
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self.cancelled = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.mirror: Optional["_StreamMirror"] = None
+        self._cond = asyncio.Condition()
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+
+    @property
+    def last_event_id(self) -> int:
+        return self.next_id - 1
+
+    async def append(self, chunk: bytes, more_body: bool) -> None:
+        self._buffer += self._decoder.decode(chunk, final=not more_body)
+        *frames, self._buffer = self._buffer.split("\n\n")
+        if not more_body and self._buffer.strip():
+            frames.append(self._buffer)
+            self._buffer = ""
+        async with self._cond:
+            added = []
+            for frame in frames:
+                if frame.strip():
+                    added.append((self.next_id, f"id: {self.next_id}\n{frame}\n\n".encode("utf-8")))
+                    self.next_id += 1
+            self.events.extend(added)
+            if not more_body:
+                self._finish()
+            self._cond.notify_all()
+        if self.mirror is not None:
+            self.mirror.push(added, self.done)
+
+    async def close(self) -> None:
+        """run task 結束（含例外）時呼叫，喚醒所有等待中的 reader。"""
+        async with self._cond:
+            if not self.done:
+                self._finish()
+            self._cond.notify_all()
+        if self.mirror is not None:
+            self.mirror.push([], True)
+
+    def _finish(self) -> None:
+        self.done = True
+        self.finished_at = time.monotonic()
+
+    def has_gap(self, last_id: int) -> bool:
+        first = self.events[0][0] if self.events else self.next_id
+        return last_id + 1 < first
+
+    async def iter_from(self, last_id: int = 0) -> AsyncIterator[bytes]:
+        while True:
+            async with self._cond:
+                while True:
+                    if self.has_gap(last_id):
+                        raise StreamGap(f"event {last_id + 1} is no longer buffered")
+                    first = self.events[0][0] if self.events else self.next_id
+                    batch = list(itertools.islice(self.events, last_id + 1 - first, None))
+                    if batch or self.done:
+                        break
+                    await self._cond.wait()
+            if not batch:
+                return
+            for event_id, frame in batch:
+                yield frame
+                last_id = event_id
+
+
+class _StreamMirror:
+    """把 RunStream 的 frame 批次寫入共用 log，再更新 meta 並通知跟隨中的 worker。"""
+
+    def __init__(self, state: SharedState, stream_id: str, maxlen: int, ttl: float):
+        self.state = state
+        self.stream_id = stream_id
+        self.maxlen = maxlen
+        self.ttl = ttl
+        self.pending: List[Tuple[int, bytes]] = []
+        self.done = False
+        self.last_id = 0
+        self.wakeup = asyncio.Event()
+        self.wakeup.set()  # 先寫入 meta，讓其他 worker 立即找得到這個 stream
+        self.task = asyncio.create_task(self._run())
+
+    def push(self, frames: List[Tuple[int, bytes]], done: bool) -> None:
+        self.pending.extend(frames)
+        self.done = self.done or done
+        self.wakeup.set()
+
+    async def _run(self) -> None:
+        # 寫入共用後端期間累積的 frame 會在下一輪一起寫入，高頻 delta 自然被批次化
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            batch, self.pending = self.pending, []
+            done = self.done
+            ttl = self.ttl if done else max(self.ttl, RUNNING_TTL)
+            try:
+                if batch:
+                    await asyncio.to_thread(self.state.append, self.stream_id, batch, self.maxlen, ttl)
+                    self.last_id = batch[-1][0]
+                await asyncio.to_thread(self.state.set, _meta_key(self.stream_id), {
+                    "owner": WORKER_ID,
+                    "done": done,
+                    "last_event_id": self.last_id,
+                    "first_event_id": max(1, self.last_id - self.maxlen + 1),
+                }, ttl)
+                await asyncio.to_thread(self.state.publish, _meta_key(self.stream_id), str(self.last_id))
+            except Exception as e:
+                logger.warning(f"[run-streams] failed to mirror stream {self.stream_id}: {e}")
+            if done and not self.pending:
+                return
+
+
+class RemoteRunStream:
+    """在其他 worker 上執行（或已結束）的 run；frame 從共用 log 讀取，介面與 RunStream 相同。"""
+
+    def __init__(self, state: SharedState, stream_id: str, meta: Dict[str, Any]):
+        self.state = state
+        self.stream_id = stream_id
+        self.meta = meta
+
+    @property
+    def last_event_id(self) -> int:
+        return int(self.meta.get("last_event_id", 0))
+
+    @property
+    def done(self) -> bool:
+        return bool(self.meta.get("done"))
+
+    def has_gap(self, last_id: int) -> bool:
+        return last_id + 1 < int(self.meta.get("first_event_id", 1))
+
+    async def iter_from(self, last_id: int = 0) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        notified = asyncio.Event()
+        unsubscribe = self.state.subscribe(
+            _meta_key(self.stream_id), lambda _: loop.call_soon_threadsafe(notified.set)
+        )
+        try:
+            retried = False
+            while True:
+                notified.clear()
+                batch = await asyncio.to_thread(self.state.read, self.stream_id, last_id)
+                if batch:
+                    if batch[0][0] > last_id + 1:
+                        raise StreamGap(f"event {last_id + 1} is no longer buffered")
+                    for event_id, frame in batch:
+                        yield frame
+                        last_id = event_id
+                    retried = False
+                    continue
+                meta = await asyncio.to_thread(self.state.get, _meta_key(self.stream_id))
+                if meta is None:
+                    return
+                self.meta = meta
+                if meta["last_event_id"] > last_id:
+                    # log 先於 meta 寫入：讀 log 與讀 meta 之間剛好有新 frame 時重讀一次，仍讀不到才是被淘汰
+                    if retried:
+                        raise StreamGap(f"event {last_id + 1} is no longer buffered")
+                    retried = True
+                    continue
+                if meta["done"]:
+                    return
+                try:
+                    await asyncio.wait_for(notified.wait(), REMOTE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            unsubscribe()
+
+
+class RunStreamRegistry:
+    def __init__(
+        self, max_events: Optional[int] = None, ttl: Optional[float] = None, state: Optional[SharedState] = None
+    ):
+        self.max_events = max_events if max_events is not None else int(os.getenv("RUN_STREAM_MAX_EVENTS", "10000"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("RUN_STREAM_TTL", "300"))
+        self.state = state or get_shared_state()
+        self._streams: Dict[str, RunStream] = {}
+        self._cancel_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        expired = [sid for sid, s in self._streams.items() if s.finished_at is not None and now - s.finished_at > self.ttl]
+        for sid in expired:
+            del self._streams[sid]
+
+    def _listen_cancel(self) -> None:
+        """其他 worker 收到 DELETE 時經 pub/sub 通知；本 worker 持有該 run 就取消。"""
+        loop = asyncio.get_running_loop()
+        if self._cancel_loop is loop:
+            return
+        self._cancel_loop = loop
+
+        def on_cancel(stream_id: str) -> None:
+            stream = self._streams.get(stream_id)
+            if stream is not None:
+                loop.call_soon_threadsafe(stream.cancelled.set)
+
+        self.state.subscribe(CANCEL_CHANNEL, on_cancel)
+
+    def create(self) -> RunStream:
+        self._sweep()
+        stream = RunStream(uuid.uuid4().hex, self.max_events)
+        if self.state.distributed:
+            self._listen_cancel()
+            stream.mirror = _StreamMirror(self.state, stream.stream_id, self.max_events, self.ttl)
+        self._streams[stream.stream_id] = stream
+        return stream
+
+    def get(self, stream_id: str) -> Optional[RunStream]:
+        self._sweep()
+        return self._streams.get(stream_id)
+
+    async def find(self, stream_id: str) -> Optional[Union[RunStream, RemoteRunStream]]:
+        """先找本 worker 的 stream；多 worker 部署時再到共用後端找其他 worker 的 run。"""
+        stream = self.get(stream_id)
+        if stream is not None or not self.state.distributed:
+            return stream
+        meta = await asyncio.to_thread(self.state.get, _meta_key(stream_id))
+        return RemoteRunStream(self.state, stream_id, meta) if meta is not None else None
+
+    async def cancel(self, stream: Union[RunStream, RemoteRunStream]) -> None:
+        if isinstance(stream, RunStream):
+            stream.cancelled.set()
+        else:
+            await asyncio.to_thread(self.state.publish, CANCEL_CHANNEL, stream.stream_id)
+
+    def stats(self) -> Dict[str, int]:
+        active = sum(1 for s in self._streams.values() if not s.done)
+        return {"streams": len(self._streams), "active": active}
+
+
+run_streams = RunStreamRegistry()
+
+
+def _wants_resumable(scope) -> bool:
+    if scope["type"] != "http" or scope["method"] != "POST" or not _RUN_PATH.search(scope["path"]):
+        return False
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("resumable", [""])[0] in ("1", "true", "True")
+
+
+async def _wait_disconnect(receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+class ResumableRunMiddleware:
+    """純 ASGI middleware：`?resumable=1` 的 run 在背景執行，SSE frame 經 RunStream buffer 轉送給 client。"""
+
+    def __init__(self, app, registry: Optional[RunStreamRegistry] = None):
+        self.app = app
+        self.registry = registry or run_streams
+
+    async def __call__(self, scope, receive, send):
+        if not _wants_resumable(scope):
+            await self.app(scope, receive, send)
+            return
+
+        # 先讀完 request body，背景 task 才不需要原本的 receive
+        body_messages: List[Dict[str, Any]] = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body_messages.append(message)
+            if not message.get("more_body", False):
+                break
+
+        stream = self.registry.create()
+        started = asyncio.Event()
+        mode: Dict[str, Any] = {"sse": False}
+
+        async def app_receive():
+            if body_messages:
+                return body_messages.pop(0)
+            await stream.cancelled.wait()
+            return {"type": "http.disconnect"}
+
+        async def app_send(message):
+            if stream.cancelled.is_set():
+                raise OSError("run stream cancelled")
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                content_type = next((v for k, v in headers if k.lower() == b"content-type"), b"")
+                mode["sse"] = content_type.startswith(b"text/event-stream")
+                if mode["sse"]:
+                    headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+                    headers.append((b"x-stream-id", stream.stream_id.encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+                started.set()
+            elif mode["sse"] and message["type"] == "http.response.body":
+                await stream.append(message.get("body", b""), message.get("more_body", False))
+            else:
+                await send(message)
+
+        async def run_app():
+            try:
+                await self.app(scope, app_receive, app_send)
+            finally:
+                await stream.close()
+
+        stream.task = asyncio.create_task(run_app())
+        # client 斷線後沒有人 await 這個 task，先取走例外避免 "exception was never retrieved"
+        stream.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        started_wait = asyncio.create_task(started.wait())
+        await asyncio.wait({stream.task, started_wait}, return_when=asyncio.FIRST_COMPLETED)
+        started_wait.cancel()
+        if not started.is_set():
+            await stream.task  # 回應開始前就失敗：把例外交給外層處理
+            return
+        if not mode["sse"]:
+            # 非串流回應已由 app_send 直接送出
+            await asyncio.shield(stream.task)
+            return
+
+        async def forward():
+            await send({"type": "http.response.body", "body": f": stream-id {stream.stream_id}\n\n".encode(), "more_body": True})
+            try:
+                async for frame in stream.iter_from(0):
+                    await send({"type": "http.response.body", "body": frame, "more_body": True})
+            except StreamGap:
+                pass  # client 消化太慢被 buffer 淘汰：結束本次回應，由 client 續傳（會得到 410）
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+        forward_task = asyncio.create_task(forward())
+        watch_task = asyncio.create_task(_wait_disconnect(receive))
+        await asyncio.wait({forward_task, watch_task}, return_when=asyncio.FIRST_COMPLETED)
+        watch_task.cancel()
+        if not forward_task.done():
+            forward_task.cancel()  # client 斷線：run 繼續在背景執行，等待續傳
+
+
+def install_run_streams(app, registry: Optional[RunStreamRegistry] = None) -> None:
+    """加上 ResumableRunMiddleware 與 GET / DELETE /run-streams/{stream_id}。
+
+    需在 SSECoalescingMiddleware 之後呼叫（外層），buffer 才會存放合併後的 frame。
+    """
+    registry = registry or run_streams
+    app.add_middleware(ResumableRunMiddleware, registry=registry)
+
+    @app.get("/run-streams/{stream_id}", tags=["Run Streams"])
+    async def resume_run_stream(
+        stream_id: str,
+        last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+        last_event_id: Optional[int] = Query(None, description="Header Last-Event-ID 的替代參數"),
+    ):
+        """從 Last-Event-ID 之後續傳 run 的 SSE 串流；run 仍在執行時續傳後繼續即時轉送。"""
+        stream = await registry.find(stream_id)
+        if stream is None:
+            raise HTTPException(status_code=404, detail="Run stream not found or expired")
+        last_id = last_event_id
+        if last_id is None:
+            last_id = int(last_event_id_header) if last_event_id_header and last_event_id_header.isdigit() else 0
+        if stream.has_gap(last_id):
+            raise HTTPException(status_code=410, detail=f"Events after {last_id} are no longer buffered")
+
+        async def replay():
+            try:
+                async for frame in stream.iter_from(last_id):
+                    yield frame
+            except StreamGap:
+                return
+
+        return StreamingResponse(
+            replay(), media_type="text/event-stream", headers={"X-Stream-Id": stream_id, "Cache-Control": "no-cache"}
+        )
+
+    @app.delete("/run-streams/{stream_id}", tags=["Run Streams"])
+    async def cancel_run_stream(stream_id: str):
+        """取消背景執行中的 run（使用者主動停止時呼叫）。"""
+        stream = await registry.find(stream_id)
+        if stream is None:
+            raise HTTPException(status_code=404, detail="Run stream not found or expired")
+        await registry.cancel(stream)
+        return {"stream_id": stream_id, "cancelled": not stream.done, "last_event_id": stream.last_event_id}
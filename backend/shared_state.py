@@ -0,0 +1,574 @@
+"""
+跨 worker 共用狀態 (Shared State Backend)
+
+main.py 以多個 uvicorn worker 執行時，原本放在行程記憶體中的狀態必須改放到共用後端：
+    - llm_cache 的回應快取（第三層，記憶體 / 磁碟之後）
+    - run_streams 的 SSE frame buffer 與取消通知（續傳可以落在任何一個 worker）
+    - admission 的全域 / 每使用者執行名額
+    - image.py 的 ComfyUI 名額與圖片工作狀態
+agno 的 agent / team session 存在 session DB，不經過這裡；多 worker 時不可開啟 cache_session。
+
+SharedState 提供四種同步、thread-safe 的原語（async 程式碼以 asyncio.to_thread 呼叫）：
+    KV       get / set / delete / scan，值為 JSON，可設 TTL
+    Lease    acquire / refresh / release / count：有上限、會過期的分散式號誌，持有者當掉時名額自動歸還
+    Log      append / read：以遞增 id 存放的有上限 frame 紀錄
+    Pub/Sub  publish / subscribe：callback 在背景執行緒中被呼叫
+
+後端由 SHARED_STATE_BACKEND 選擇：
+    memory    單一 worker（預設），行為與原本的行程內狀態相同
+    postgres  共用 PostgreSQL（預設沿用 AGENTOS_DB_URL），通知使用 LISTEN/NOTIFY
+    redis     本機或遠端 Redis（需 `pip install redis`），通知使用 Pub/Sub
+
+環境變數：
+    SHARED_STATE_BACKEND  memory | postgres | redis（預設 memory）
+    SHARED_STATE_URL      postgres / redis 連線字串（postgres 預設 AGENTOS_DB_URL，redis 預設 redis://localhost:6379/0）
+    SHARED_STATE_SCHEMA   postgres 資料表所在 schema（預設 ai）
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 每個 worker 的識別字串，寫入共用狀態以便追查是哪個行程持有 run / 名額
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+Callback = Callable[[str], None]
+
+
+class SharedState:
+    """共用狀態介面；distributed=False 表示狀態只存在本行程（不適用多 worker）。"""
+
+    distributed = False
+    name = "base"
+
+    def __init__(self) -> None:
+        self._subscribers: Dict[str, List[Callback]] = defaultdict(list)
+        self._sub_lock = threading.Lock()
+
+    # KV ---------------------------------------------------------------
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def scan(self, prefix: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    # Lease ------------------------------------------------------------
+    def acquire(self, name: str, holder: str, limit: int, ttl: float) -> bool:
+        """name 下未過期的持有者少於 limit 時登記 holder 並回傳 True；holder 已持有時視為 refresh。"""
+        raise NotImplementedError
+
+    def refresh(self, name: str, holder: str, ttl: float) -> None:
+        raise NotImplementedError
+
+    def release(self, name: str, holder: str) -> None:
+        raise NotImplementedError
+
+    def count(self, name: str) -> int:
+        raise NotImplementedError
+
+    # Log --------------------------------------------------------------
+    def append(self, key: str, entries: List[Tuple[int, bytes]], maxlen: int, ttl: float) -> None:
+        """entries 的 id 由呼叫端決定且必須遞增；只保留最新的 maxlen 筆。"""
+        raise NotImplementedError
+
+    def read(self, key: str, after_id: int) -> List[Tuple[int, bytes]]:
+        raise NotImplementedError
+
+    # Pub/Sub ----------------------------------------------------------
+    def publish(self, channel: str, message: str) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, channel: str, callback: Callback) -> Callable[[], None]:
+        """登記 callback，回傳取消登記的函式。callback 可能在任何執行緒被呼叫，必須自行轉回 event loop。"""
+        with self._sub_lock:
+            self._subscribers[channel].append(callback)
+        self._ensure_listener()
+
+        def unsubscribe() -> None:
+            with self._sub_lock:
+                callbacks = self._subscribers.get(channel)
+                if callbacks and callback in callbacks:
+                    callbacks.remove(callback)
+                    if not callbacks:
+                        del self._subscribers[channel]
+
+        return unsubscribe
+
+    def _ensure_listener(self) -> None:
+        pass
+
+    def _deliver(self, channel: str, message: str) -> None:
+        with self._sub_lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception as e:
+                logger.warning(f"[shared-state] subscriber of {channel} failed: {e}")
+
+    def describe(self) -> Dict[str, Any]:
+        return {"backend": self.name, "distributed": self.distributed, "worker_id": WORKER_ID}
+
+
+# ============================================================================
+# memory：單一行程
+# ============================================================================
+class MemorySharedState(SharedState):
+    name = "memory"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._lock = threading.Lock()
+        self._kv: Dict[str, Tuple[Optional[float], Any]] = {}
+        self._leases: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._logs: Dict[str, Tuple[float, List[Tuple[int, bytes]]]] = {}
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._kv.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] < time.monotonic():
+                del self._kv[key]
+                return None
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._kv[key] = (time.monotonic() + ttl if ttl is not None else None, value)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._kv.pop(key, None)
+
+    def scan(self, prefix: str) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                k: v for k, (expires, v) in self._kv.items()
+                if k.startswith(prefix) and (expires is None or expires >= now)
+            }
+
+    def _live(self, name: str) -> Dict[str, float]:
+        now = time.monotonic()
+        holders = self._leases[name]
+        for holder in [h for h, expires in holders.items() if expires < now]:
+            del holders[holder]
+        return holders
+
+    def acquire(self, name: str, holder: str, limit: int, ttl: float) -> bool:
+        with self._lock:
+            holders = self._live(name)
+            if holder not in holders and len(holders) >= limit:
+                return False
+            holders[holder] = time.monotonic() + ttl
+            return True
+
+    def refresh(self, name: str, holder: str, ttl: float) -> None:
+        with self._lock:
+            holders = self._leases.get(name)
+            if holders is not None and holder in holders:
+                holders[holder] = time.monotonic() + ttl
+
+    def release(self, name: str, holder: str) -> None:
+        with self._lock:
+            holders = self._leases.get(name)
+            if holders is not None:
+                holders.pop(holder, None)
+                if not holders:
+                    del self._leases[name]
+
+    def count(self, name: str) -> int:
+        with self._lock:
+            return len(self._live(name)) if name in self._leases else 0
+
+    def append(self, key: str, entries: List[Tuple[int, bytes]], maxlen: int, ttl: float) -> None:
+        with self._lock:
+            _, log = self._logs.get(key, (0.0, []))
+            log = (log + list(entries))[-maxlen:]
+            self._logs[key] = (time.monotonic() + ttl, log)
+            now = time.monotonic()
+            for k in [k for k, (expires, _) in self._logs.items() if expires < now]:
+                del self._logs[k]
+
+    def read(self, key: str, after_id: int) -> List[Tuple[int, bytes]]:
+        with self._lock:
+            entry = self._logs.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return []
+            return [(i, data) for i, data in entry[1] if i > after_id]
+
+    def publish(self, channel: str, message: str) -> None:
+        self._deliver(channel, message)
+
+
+# ============================================================================
+# postgres：共用資料庫 + LISTEN/NOTIFY
+# ============================================================================
+class PostgresSharedState(SharedState):
+    distributed = True
+    name = "postgres"
+    # NOTIFY channel 必須是識別字；所有邏輯 channel 共用一個，payload 內再帶 channel 名稱
+    NOTIFY_CHANNEL = "agentos_shared_state"
+
+    def __init__(self, url: str, schema: str = "ai") -> None:
+        super().__init__()
+        from sqlalchemy import create_engine
+        from sqlalchemy.engine import make_url
+
+        parsed = make_url(url)
+        self._engine = create_engine(parsed.set(drivername="postgresql+psycopg"), pool_pre_ping=True)
+        self._dsn = parsed.set(drivername="postgresql").render_as_string(hide_password=False)
+        self._schema = schema
+        self._kv_table = f"{schema}.agentos_shared_kv"
+        self._lease_table = f"{schema}.agentos_shared_leases"
+        self._log_table = f"{schema}.agentos_shared_log"
+        self._listener: Optional[threading.Thread] = None
+        self._last_sweep = 0.0
+        self._create_tables()
+
+    def _exec(self, sql: str, params: Optional[Dict[str, Any]] = None):
+        from sqlalchemy import text
+
+        with self._engine.begin() as conn:
+            result = conn.execute(text(sql), params or {})
+            # INSERT / UPDATE / DELETE 沒有結果集：對它們呼叫 fetchall() 會丟 ResourceClosedError 並讓整個交易 rollback
+            return result.fetchall() if result.returns_rows else []
+
+    def _create_tables(self) -> None:
+        from sqlalchemy import text
+
+        with self._engine.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {self._schema}"))
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {self._kv_table} ("
+                "key TEXT PRIMARY KEY, value JSONB NOT NULL, expires_at TIMESTAMPTZ)"
+            ))
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {self._lease_table} ("
+                "name TEXT NOT NULL, holder TEXT NOT NULL, expires_at TIMESTAMPTZ NOT NULL, "
+                "PRIMARY KEY (name, holder))"
+            ))
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {self._log_table} ("
+                "key TEXT NOT NULL, id BIGINT NOT NULL, data BYTEA NOT NULL, expires_at TIMESTAMPTZ NOT NULL, "
+                "PRIMARY KEY (key, id))"
+            ))
+
+    def _maybe_sweep(self) -> None:
+        # 過期資料在讀取時已被過濾，這裡只是定期清掉，避免資料表無限成長
+        now = time.monotonic()
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        self._exec(f"DELETE FROM {self._kv_table} WHERE expires_at < now()")
+        self._exec(f"DELETE FROM {self._log_table} WHERE expires_at < now()")
+
+    def get(self, key: str) -> Optional[Any]:
+        rows = self._exec(
+            f"SELECT value FROM {self._kv_table} WHERE key = :key AND (expires_at IS NULL OR expires_at > now())",
+            {"key": key},
+        )
+        return rows[0][0] if rows else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._exec(
+            f"INSERT INTO {self._kv_table} (key, value, expires_at) "
+            "VALUES (:key, CAST(:value AS JSONB), now() + make_interval(secs => CAST(:ttl AS DOUBLE PRECISION))) "
+            "ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, expires_at = EXCLUDED.expires_at",
+            {"key": key, "value": json.dumps(value, ensure_ascii=False, default=str), "ttl": ttl},
+        )
+        self._maybe_sweep()
+
+    def delete(self, key: str) -> None:
+        self._exec(f"DELETE FROM {self._kv_table} WHERE key = :key", {"key": key})
+
+    def scan(self, prefix: str) -> Dict[str, Any]:
+        rows = self._exec(
+            f"SELECT key, value FROM {self._kv_table} "
+            "WHERE starts_with(key, :prefix) AND (expires_at IS NULL OR expires_at > now())",
+            {"prefix": prefix},
+        )
+        return {key: value for key, value in rows}
+
+    def acquire(self, name: str, holder: str, limit: int, ttl: float) -> bool:
+        from sqlalchemy import text
+
+        params = {"name": name, "holder": holder, "limit": limit, "ttl": float(ttl)}
+        with self._engine.begin() as conn:
+            # advisory lock 讓同一個 name 的「計數 + 登記」在所有 worker 之間序列化；
+            # READ COMMITTED 下之後的每個 statement 都會看到其他 worker 已提交的租約
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), params)
+            conn.execute(text(f"DELETE FROM {self._lease_table} WHERE name = :name AND expires_at < now()"), params)
+            rows = conn.execute(text(
+                f"INSERT INTO {self._lease_table} (name, holder, expires_at) "
+                "SELECT :name, :holder, now() + make_interval(secs => :ttl) "
+                f"WHERE EXISTS (SELECT 1 FROM {self._lease_table} WHERE name = :name AND holder = :holder) "
+                f"OR (SELECT count(*) FROM {self._lease_table} WHERE name = :name) < :limit "
+                "ON CONFLICT (name, holder) DO UPDATE SET expires_at = EXCLUDED.expires_at RETURNING 1"
+            ), params).fetchall()
+        return bool(rows)
+
+    def refresh(self, name: str, holder: str, ttl: float) -> None:
+        self._exec(
+            f"UPDATE {self._lease_table} SET expires_at = now() + make_interval(secs => :ttl) "
+            "WHERE name = :name AND holder = :holder",
+            {"name": name, "holder": holder, "ttl": float(ttl)},
+        )
+
+    def release(self, name: str, holder: str) -> None:
+        self._exec(f"DELETE FROM {self._lease_table} WHERE name = :name AND holder = :holder", {"name": name, "holder": holder})
+
+    def count(self, name: str) -> int:
+        rows = self._exec(
+            f"SELECT count(*) FROM {self._lease_table} WHERE name = :name AND expires_at >= now()", {"name": name}
+        )
+        return int(rows[0][0])
+
+    def append(self, key: str, entries: List[Tuple[int, bytes]], maxlen: int, ttl: float) -> None:
+        if not entries:
+            return
+        from sqlalchemy import text
+
+        params = [
+            {"key": key, "id": event_id, "data": data, "ttl": float(ttl)} for event_id, data in entries
+        ]
+        with self._engine.begin() as conn:
+            conn.execute(text(
+                f"INSERT INTO {self._log_table} (key, id, data, expires_at) "
+                "VALUES (:key, :id, :data, now() + make_interval(secs => :ttl)) ON CONFLICT (key, id) DO NOTHING"
+            ), params)
+            conn.execute(text(
+                f"UPDATE {self._log_table} SET expires_at = now() + make_interval(secs => :ttl) WHERE key = :key"
+            ), {"key": key, "ttl": float(ttl)})
+            conn.execute(text(f"DELETE FROM {self._log_table} WHERE key = :key AND id <= :cutoff"),
+                         {"key": key, "cutoff": entries[-1][0] - maxlen})
+        self._maybe_sweep()
+
+    def read(self, key: str, after_id: int) -> List[Tuple[int, bytes]]:
+        rows = self._exec(
+            f"SELECT id, data FROM {self._log_table} WHERE key = :key AND id > :after AND expires_at > now() ORDER BY id",
+            {"key": key, "after": after_id},
+        )
+        return [(int(event_id), bytes(data)) for event_id, data in rows]
+
+    def publish(self, channel: str, message: str) -> None:
+        self._exec("SELECT pg_notify(:channel, :payload)", {
+            "channel": self.NOTIFY_CHANNEL, "payload": json.dumps({"c": channel, "m": message}),
+        })
+
+    def _ensure_listener(self) -> None:
+        with self._sub_lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, name="shared-state-listen", daemon=True)
+        self._listener.start()
+
+    def _listen(self) -> None:
+        import psycopg
+
+        while True:
+            try:
+                with psycopg.connect(self._dsn, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {self.NOTIFY_CHANNEL}")
+                    for notify in conn.notifies():
+                        try:
+                            payload = json.loads(notify.payload)
+                        except ValueError:
+                            continue
+                        self._deliver(payload.get("c", ""), payload.get("m", ""))
+            except Exception as e:
+                # 斷線期間的通知會遺失；使用端都另有輪詢作為保底
+                logger.warning(f"[shared-state] LISTEN connection lost, reconnecting: {e}")
+                time.sleep(1.0)
+
+
+# ============================================================================
+# redis
+# ============================================================================
+_REDIS_ACQUIRE = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZSCORE', KEYS[1], ARGV[3]) or redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], ARGV[4], ARGV[3])
+    redis.call('EXPIRE', KEYS[1], ARGV[5])
+    return 1
+end
+return 0
+"""
+
+
+class RedisSharedState(SharedState):
+    distributed = True
+    name = "redis"
+    PREFIX = "agentos:"
+    PUBSUB_CHANNEL = "agentos:shared-state"
+
+    def __init__(self, url: str) -> None:
+        super().__init__()
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("SHARED_STATE_BACKEND=redis requires the redis package: pip install redis") from e
+        self._redis = redis.Redis.from_url(url)
+        self._acquire_script = self._redis.register_script(_REDIS_ACQUIRE)
+        self._listener: Optional[threading.Thread] = None
+
+    def _key(self, key: str) -> str:
+        return self.PREFIX + key
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self._redis.get(self._key(key))
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raw = json.dumps(value, ensure_ascii=False, default=str)
+        self._redis.set(self._key(key), raw, px=int(ttl * 1000) if ttl is not None else None)
+
+    def delete(self, key: str) -> None:
+        self._redis.delete(self._key(key))
+
+    def scan(self, prefix: str) -> Dict[str, Any]:
+        keys = list(self._redis.scan_iter(match=self._key(prefix) + "*", count=500))
+        if not keys:
+            return {}
+        result = {}
+        for key, raw in zip(keys, self._redis.mget(keys)):
+            if raw is not None:
+                result[key.decode()[len(self.PREFIX):]] = json.loads(raw)
+        return result
+
+    def _lease_key(self, name: str) -> str:
+        return self._key(f"lease:{name}")
+
+    def acquire(self, name: str, holder: str, limit: int, ttl: float) -> bool:
+        now = time.time()
+        return bool(self._acquire_script(
+            keys=[self._lease_key(name)], args=[now, limit, holder, now + ttl, int(ttl) + 1],
+        ))
+
+    def refresh(self, name: str, holder: str, ttl: float) -> None:
+        self._redis.zadd(self._lease_key(name), {holder: time.time() + ttl}, xx=True)
+        self._redis.expire(self._lease_key(name), int(ttl) + 1)
+
+    def release(self, name: str, holder: str) -> None:
+        self._redis.zrem(self._lease_key(name), holder)
+
+    def count(self, name: str) -> int:
+        return int(self._redis.zcount(self._lease_key(name), time.time(), "+inf"))
+
+    def append(self, key: str, entries: List[Tuple[int, bytes]], maxlen: int, ttl: float) -> None:
+        if not entries:
+            return
+        log_key = self._key(f"log:{key}")
+        pipe = self._redis.pipeline()
+        pipe.zadd(log_key, {data: event_id for event_id, data in entries})
+        pipe.zremrangebyscore(log_key, "-inf", entries[-1][0] - maxlen)
+        pipe.expire(log_key, int(ttl) + 1)
+        pipe.execute()
+
+    def read(self, key: str, after_id: int) -> List[Tuple[int, bytes]]:
+        rows = self._redis.zrangebyscore(self._key(f"log:{key}"), f"({after_id}", "+inf", withscores=True)
+        return [(int(score), bytes(data)) for data, score in rows]
+
+    def publish(self, channel: str, message: str) -> None:
+        self._redis.publish(self.PUBSUB_CHANNEL, json.dumps({"c": channel, "m": message}))
+
+    def _ensure_listener(self) -> None:
+        with self._sub_lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, name="shared-state-listen", daemon=True)
+        self._listener.start()
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.PUBSUB_CHANNEL)
+                for message in pubsub.listen():
+                    try:
+                        payload = json.loads(message["data"])
+                    except (TypeError, ValueError):
+                        continue
+                    self._deliver(payload.get("c", ""), payload.get("m", ""))
+            except Exception as e:
+                logger.warning(f"[shared-state] Redis pub/sub connection lost, reconnecting: {e}")
+                time.sleep(1.0)
+
+
+# ============================================================================
+# 預設實例
+# ============================================================================
+_shared_state: Optional[SharedState] = None
+_shared_state_lock = threading.Lock()
+
+
+def create_shared_state(backend: Optional[str] = None, url: Optional[str] = None) -> SharedState:
+    backend = (backend or os.getenv("SHARED_STATE_BACKEND", "memory")).lower()
+    url = url or os.getenv("SHARED_STATE_URL")
+    if backend == "memory":
+        return MemorySharedState()
+    if backend == "postgres":
+        url = url or os.getenv("AGENTOS_DB_URL")
+        if not url:
+            raise RuntimeError("SHARED_STATE_BACKEND=postgres requires SHARED_STATE_URL or AGENTOS_DB_URL")
+        return PostgresSharedState(url, schema=os.getenv("SHARED_STATE_SCHEMA", "ai"))
+    if backend == "redis":
+        return RedisSharedState(url or "redis://localhost:6379/0")
+    raise RuntimeError(f"Unknown SHARED_STATE_BACKEND: {backend} (expected memory, postgres or redis)")
+
+
+def get_shared_state() -> SharedState:
+    """本行程共用的 SharedState；第一次呼叫時依環境變數建立。"""
+    global _shared_state
+    with _shared_state_lock:
+        if _shared_state is None:
+            _shared_state = create_shared_state()
+            logger.info(f"[shared-state] backend={_shared_state.name} worker={WORKER_ID}")
+        return _shared_state
+
+
+def _session_cached(components: Iterable[Any]) -> List[str]:
+    """開啟 cache_session 的 agent / team（含 team 成員）名稱。"""
+    names = []
+    for component in components:
+        if getattr(component, "cache_session", False):
+            names.append(getattr(component, "name", None) or getattr(component, "id", None) or repr(component))
+        names.extend(_session_cached(getattr(component, "members", None) or []))
+    return names
+
+
+def require_shared_state_for_workers(workers: int, components: Iterable[Any] = ()) -> None:
+    """多 worker 啟動前確認共用後端；memory 後端下各 worker 的狀態互不可見，直接拒絕啟動。
+
+    agno 的 session 每次 run 都由 session DB 讀寫，本來就跨 worker 共用；
+    但 cache_session=True 會把 session 快取在行程內，同一 session 的下一輪落在別的 worker 時
+    會讀到過期的歷史，因此 components（agent / team）開啟時同樣拒絕啟動。
+    """
+    if workers <= 1:
+        return
+    state = get_shared_state()
+    if not state.distributed:
+        raise SystemExit(
+            f"workers={workers} requires SHARED_STATE_BACKEND=postgres or redis "
+            f"(current: {state.name}); run streams, admission slots and image jobs would not be shared"
+        )
+    cached = _session_cached(components)
+    if cached:
+        raise SystemExit(
+            f"workers={workers} cannot serve agents with cache_session=True ({', '.join(cached)}); "
+            "each worker would keep its own copy of the session"
+        )
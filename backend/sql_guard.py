@@ -0,0 +1,292 @@
+"""
+SQL 查詢防護 (Read-only Query Planner Guard)
+
+research agent 透過 SQLTools 直接查詢正式環境的 meeting_records DB，
+一個不小心的 `SELECT *` 大表 join（例如 session / tracing span 表）就可能拖垮整個 Postgres。
+
+GuardedSQLTools 在執行前先做檢查：
+1. 只允許單一唯讀語句（SELECT / WITH / EXPLAIN / SHOW / VALUES / TABLE），並在 READ ONLY transaction 中執行；
+   以 tokenizer 切分語句，字串、引號識別字、dollar quote 與註解中的 ; 不算，結尾的 ; 會被移除
+2. 先跑 `EXPLAIN (FORMAT JSON)` 取得估計成本：
+   - 超過上限且沒有 LIMIT → 自動包一層 LIMIT 後重新估算，通過就執行改寫後的查詢
+   - 仍超過上限 → 拒絕並回傳成本與建議
+   - EXPLAIN ANALYZE 會真的執行內層查詢，因此對內層查詢做同樣的成本檢查（不自動加 LIMIT）
+3. 每個查詢都設定 `SET LOCAL statement_timeout`
+4. 設定 SQL_READONLY_URL 時改連唯讀 replica / 唯讀角色
+5. list_tables / describe_table 結果依 TTL 快取
+
+EXPLAIN / READ ONLY / statement_timeout 只在 PostgreSQL 上啟用，其他 dialect 只做語句類型檢查。
+
+環境變數：
+    SQL_READONLY_URL          唯讀 replica 或唯讀角色的連線字串（未設定則使用主 DB）
+    SQL_MAX_COST              EXPLAIN 估計成本上限（預設 100000）
+    SQL_STATEMENT_TIMEOUT_MS  單一查詢逾時毫秒數（預設 15000）
+    SQL_GUARD_LIMIT           自動注入的 LIMIT 列數（預設 1000）
+    SQL_SCHEMA_CACHE_TTL      list_tables / describe_table 快取秒數（預設 300）
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.sql.expression import text
+
+from tool_governor import GovernedSQLTools
+
+READ_ONLY_KEYWORDS = {"select", "with", "explain", "show", "values", "table"}
+# EXPLAIN 內層允許的語句
+EXPLAINABLE_KEYWORDS = {"select", "with", "values", "table"}
+
+_HAS_LIMIT = re.compile(r"\blimit\s+\d+\s*(?:offset\s+\d+\s*)?$", re.IGNORECASE)
+_DOLLAR_TAG = re.compile(r"\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$")
+_EXPLAIN_OPTIONS = re.compile(r"explain\s*\(([^)]*)\)\s*", re.IGNORECASE)
+_EXPLAIN_KEYWORDS = re.compile(r"explain((?:\s+(?:analy[sz]e|verbose)\b)*)\s*", re.IGNORECASE)
+
+
+def _split_statements(query: str) -> List[str]:
+    """依最外層的 ; 切開語句並去掉註解；字串、引號識別字與 dollar quote 中的 ; 與 -- 不算。"""
+    statements: List[str] = []
+    current: List[str] = []
+    i, n = 0, len(query)
+    while i < n:
+        ch = query[i]
+        if query.startswith("--", i):
+            end = query.find("\n", i)
+            i = n if end < 0 else end
+            current.append(" ")
+        elif query.startswith("/*", i):
+            # PostgreSQL 的區塊註解可以巢狀
+            depth, i = 1, i + 2
+            while i < n and depth:
+                if query.startswith("/*", i):
+                    depth, i = depth + 1, i + 2
+                elif query.startswith("*/", i):
+                    depth, i = depth - 1, i + 2
+                else:
+                    i += 1
+            current.append(" ")
+        elif ch in ("'", '"'):
+            # E'...' 字串允許反斜線跳脫；其他字串與識別字以連續兩個引號跳脫
+            backslash = ch == "'" and query[i - 1:i] in ("e", "E") and not query[i - 2:i - 1].isalnum()
+            j = i + 1
+            while j < n:
+                if backslash and query[j] == "\\":
+                    j += 2
+                elif query[j] == ch:
+                    if query[j + 1:j + 2] != ch:
+                        break
+                    j += 2
+                else:
+                    j += 1
+            current.append(query[i:j + 1])
+            i = j + 1
+        elif ch == "$" and (match := _DOLLAR_TAG.match(query, i)) and not query[i - 1:i].isalnum():
+            end = query.find(match.group(0), match.end())
+            end = n if end < 0 else end + len(match.group(0))
+            current.append(query[i:end])
+            i = end
+        elif ch == ";":
+            statements.append("".join(current))
+            current = []
+            i += 1
+        else:
+            current.append(ch)
+            i += 1
+    statements.append("".join(current))
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def _parse_explain(sql: str) -> Tuple[bool, str]:
+    """EXPLAIN 語句 → (是否 ANALYZE, 內層語句)。"""
+    match = _EXPLAIN_OPTIONS.match(sql)
+    if match:
+        analyze = False
+        for option in match.group(1).split(","):
+            name, _, value = option.strip().partition(" ")
+            if name.lower() in ("analyze", "analyse"):
+                analyze = value.strip().lower() not in ("false", "off", "0")
+        return analyze, sql[match.end():]
+    match = _EXPLAIN_KEYWORDS.match(sql)
+    analyze = bool(re.search(r"analy[sz]e", match.group(1), re.IGNORECASE))
+    return analyze, sql[match.end():]
+
+
+def _first_keyword(query: str) -> str:
+    match = re.match(r"\(*\s*(\w+)", query)
+    return match.group(1).lower() if match else ""
+
+
+class GuardedSQLTools(GovernedSQLTools):
+    """以 EXPLAIN 成本上限、唯讀 transaction 與 statement_timeout 保護資料庫的 SQLTools。"""
+
+    def __init__(
+        self,
+        max_cost: Optional[float] = None,
+        statement_timeout_ms: Optional[int] = None,
+        guard_limit: Optional[int] = None,
+        schema_cache_ttl: Optional[int] = None,
+        **kwargs,
+    ):
+        self.max_cost = max_cost if max_cost is not None else float(os.getenv("SQL_MAX_COST", "100000"))
+        self.statement_timeout_ms = (
+            statement_timeout_ms if statement_timeout_ms is not None
+            else int(os.getenv("SQL_STATEMENT_TIMEOUT_MS", "15000"))
+        )
+        self.guard_limit = guard_limit if guard_limit is not None else int(os.getenv("SQL_GUARD_LIMIT", "1000"))
+        self.schema_cache_ttl = (
+            schema_cache_ttl if schema_cache_ttl is not None else int(os.getenv("SQL_SCHEMA_CACHE_TTL", "300"))
+        )
+        self._schema_cache: Dict[Tuple[str, ...], Tuple[float, str]] = {}
+        self._schema_cache_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    @property
+    def _is_postgres(self) -> bool:
+        return self.db_engine.dialect.name == "postgresql"
+
+    # ------------------------------------------------------------------
+    # Schema 快取
+    # ------------------------------------------------------------------
+    def _cached(self, key: Tuple[str, ...], compute) -> str:
+        now = time.monotonic()
+        with self._schema_cache_lock:
+            entry = self._schema_cache.get(key)
+            if entry is not None and now - entry[0] < self.schema_cache_ttl:
+                return entry[1]
+        value = compute()
+        # 錯誤訊息不快取，下次重新嘗試
+        if not value.startswith("Error"):
+            with self._schema_cache_lock:
+                self._schema_cache[key] = (now, value)
+        return value
+
+    def list_tables(self) -> str:
+        """Use this function to get a list of table names in the database.
+
+        Returns:
+            str: list of tables in the database.
+        """
+        return self._cached(("list_tables",), super().list_tables)
+
+    def describe_table(self, table_name: str) -> str:
+        """Use this function to describe a table.
+
+        Args:
+            table_name (str): The name of the table to get the schema for.
+
+        Returns:
+            str: schema of a table
+        """
+        return self._cached(("describe_table", table_name), lambda: super(GuardedSQLTools, self).describe_table(table_name))
+
+    # ------------------------------------------------------------------
+    # 查詢檢查
+    # ------------------------------------------------------------------
+    def _explain_cost(self, query: str) -> float:
+        with self.Session() as sess, sess.begin():
+            self._apply_session_limits(sess)
+            plan = sess.execute(text(f"EXPLAIN (FORMAT JSON) {query}")).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return float(plan[0]["Plan"]["Total Cost"])
+
+    def _apply_session_limits(self, sess) -> None:
+        if self._is_postgres:
+            sess.execute(text("SET TRANSACTION READ ONLY"))
+            sess.execute(text(f"SET LOCAL statement_timeout = {int(self.statement_timeout_ms)}"))
+
+    def check_query(self, query: str, limit: Optional[int] = None) -> Tuple[Optional[str], str]:
+        """回傳 (要執行的 SQL, 說明)；SQL 為 None 表示拒絕執行，說明即拒絕原因。"""
+        statements = _split_statements(query)
+        if len(statements) != 1:
+            return None, "Error: exactly one SQL statement is allowed per call."
+        sql = statements[0]
+        keyword = _first_keyword(sql)
+        if keyword not in READ_ONLY_KEYWORDS:
+            return None, "Error: only read-only queries (SELECT / WITH / EXPLAIN / SHOW) are allowed."
+        if keyword == "explain":
+            analyze, inner = _parse_explain(sql)
+            if _first_keyword(inner) not in EXPLAINABLE_KEYWORDS:
+                return None, "Error: EXPLAIN is only allowed for SELECT / WITH / VALUES / TABLE queries."
+            if not analyze or not self._is_postgres:
+                return sql, ""
+            # EXPLAIN ANALYZE 會真的執行內層查詢
+            cost = self._explain_cost(inner)
+            if cost <= self.max_cost:
+                return sql, ""
+            return None, (
+                f"Error: query rejected by sql-guard. EXPLAIN ANALYZE executes the query, and its estimated cost "
+                f"{cost:.0f} exceeds the limit {self.max_cost:.0f}. Use EXPLAIN without ANALYZE to see the plan."
+            )
+        if not self._is_postgres or keyword == "show":
+            return sql, ""
+
+        cost = self._explain_cost(sql)
+        if cost <= self.max_cost:
+            return sql, ""
+
+        if not _HAS_LIMIT.search(sql):
+            row_limit = min(limit, self.guard_limit) if limit and limit > 0 else self.guard_limit
+            limited = f"SELECT * FROM ({sql}) AS guarded_query LIMIT {row_limit}"
+            limited_cost = self._explain_cost(limited)
+            if limited_cost <= self.max_cost:
+                return limited, (
+                    f"[sql-guard] Estimated cost {cost:.0f} exceeded the limit {self.max_cost:.0f}; "
+                    f"the query was wrapped with LIMIT {row_limit} (new cost {limited_cost:.0f}).\n"
+                )
+
+        return None, (
+            f"Error: query rejected by sql-guard. Estimated cost {cost:.0f} exceeds the limit {self.max_cost:.0f}. "
+            "Add selective WHERE filters on indexed columns, aggregate in SQL instead of selecting raw rows, "
+            "avoid joining large tables without join conditions, or add a LIMIT."
+        )
+
+    # ------------------------------------------------------------------
+    # 執行
+    # ------------------------------------------------------------------
+    def run_sql(self, sql: str, limit: Optional[int] = None) -> List[dict]:
+        """Internal function to run a sql query inside a read-only transaction with a statement timeout.
+
+        Args:
+            sql (str): The sql query to run.
+            limit (int, optional): The number of rows to return. Defaults to None. Non-positive values return no rows.
+
+        Returns:
+            List[dict]: The result of the query.
+        """
+        with self.Session() as sess, sess.begin():
+            self._apply_session_limits(sess)
+            result = sess.execute(text(sql))
+            if not result.returns_rows:
+                return []
+            if limit is None:
+                rows = result.fetchall()
+            elif limit > 0:
+                rows = result.fetchmany(limit)
+            else:
+                rows = []
+            return [row._asdict() for row in rows]
+
+    def run_sql_query(self, query: str, limit: Optional[int] = 10) -> str:
+        """Use this function to run a read-only SQL query and return the result.
+
+        Args:
+            query (str): The query to run. Only SELECT / WITH / EXPLAIN / SHOW statements are allowed.
+            limit (int, optional): The number of rows to return. Defaults to 10. Use `None` to show all results.
+                Expensive queries are rejected or automatically wrapped with a LIMIT.
+
+        Returns:
+            str: Result of the SQL query.
+        Notes:
+            - The result may be empty if the query does not return any data.
+        """
+        try:
+            sql, note = self.check_query(query, limit)
+        except Exception as e:
+            return f"Error running query: {e}"
+        if sql is None:
+            return note
+        return note + super().run_sql_query(sql, limit)
@@ -0,0 +1,225 @@
+"""
+SSE 事件合併 (Coalesced Stream Mode)
+
+AgentOS 串流 run 時每個 content delta 都是一個 SSE frame，monitor=True 時還有大量 tool / 狀態事件；
+前端每個 frame 都要 JSON.parse 並觸發一次 React render，而且每個 frame 都重複帶著
+agent_id / run_id / session_id / tools 等相同的 metadata。
+
+請求帶上 `?stream_mode=coalesced` 時，SSECoalescingMiddleware 改寫 text/event-stream 回應：
+1. 連續、metadata 相同的 RunContent / TeamRunContent delta 合併成一個 frame，
+   在時間窗（預設 30ms）到期或累積超過大小上限（預設 2KB）時送出；其他事件會先送出已累積的內容，順序不變
+2. 每個事件只送出與「上一個同名事件」不同的欄位（被移除的欄位送 null），
+   前端以 {...上一個同名事件, ...本次 delta} 還原完整事件
+3. 串流開頭送出註解行 `: stream-mode coalesced`，前端據此啟用還原；未帶參數的請求完全不受影響
+
+環境變數：
+    SSE_COALESCE_WINDOW_MS  content 合併時間窗（預設 30）
+    SSE_COALESCE_MAX_BYTES  單一合併 frame 的 content 上限（預設 2048）
+"""
+
+import asyncio
+import codecs
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from metrics import SSE_BYTES, SSE_FRAMES
+
+STREAM_MODE_COMMENT = ": stream-mode coalesced\n\n"
+CONTENT_EVENTS = {"RunContent", "TeamRunContent"}
+
+# 每個 delta 都會變動、合併時取最後一個值的欄位；不參與「metadata 是否相同」的判斷
+_VOLATILE_FIELDS = ("created_at", "event_index")
+
+_RUN_PATH = re.compile(r"/(agents|teams)/[^/]+/runs$")
+
+
+def _identity(event: str, obj: Dict[str, Any]) -> str:
+    rest = {k: v for k, v in obj.items() if k != "content" and k not in _VOLATILE_FIELDS}
+    return event + json.dumps(rest, sort_keys=True, default=str)
+
+
+class _CoalescingStream:
+    """單一 SSE 回應的合併狀態；app 的 send 與計時器 flush 以 lock 序列化，保證 frame 順序。"""
+
+    def __init__(self, send, window: float, max_bytes: int):
+        self.send = send
+        self.window = window
+        self.max_bytes = max_bytes
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pending: Optional[Dict[str, Any]] = None
+        self.pending_event = ""
+        self.pending_key = ""
+        self.pending_bytes = 0
+        self.last: Dict[str, Dict[str, Any]] = {}
+        self.lock = asyncio.Lock()
+        self.timer: Optional[asyncio.Task] = None
+        self.started = False
+        self.closed = False
+        self.frames_in = self.frames_out = 0
+        self.bytes_in = self.bytes_out = 0
+
+    # ------------------------------------------------------------------
+    # Frame 處理（同步，只產生輸出字串）
+    # ------------------------------------------------------------------
+    def _encode(self, event: str, obj: Dict[str, Any]) -> str:
+        prev = self.last.get(event)
+        self.last[event] = obj
+        if prev is None:
+            payload = obj
+        else:
+            payload = {k: v for k, v in obj.items() if k not in prev or prev[k] != v}
+            payload.update({k: None for k in prev if k not in obj})
+        data = json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str)
+        self.frames_out += 1
+        return (f"event: {event}\n" if event else "") + f"data: {data}\n\n"
+
+    def _flush_pending(self) -> List[str]:
+        if self.pending is None:
+            return []
+        frame = self._encode(self.pending_event, self.pending)
+        self.pending = None
+        self.pending_bytes = 0
+        return [frame]
+
+    def _process(self, frame: str) -> List[str]:
+        self.frames_in += 1
+        event = ""
+        data_lines: List[str] = []
+        for line in frame.split("\n"):
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data_lines.append(line[5:].lstrip())
+            elif line:
+                data_lines = []  # id: / retry: / 註解等無法安全合併，原樣轉送
+                break
+        obj: Any = None
+        if data_lines:
+            try:
+                obj = json.loads("\n".join(data_lines))
+            except ValueError:
+                obj = None
+        if not isinstance(obj, dict):
+            self.frames_out += 1
+            return [*self._flush_pending(), frame + "\n\n"]
+
+        if event not in CONTENT_EVENTS or not isinstance(obj.get("content"), str):
+            return [*self._flush_pending(), self._encode(event, obj)]
+
+        out: List[str] = []
+        key = _identity(event, obj)
+        if self.pending is not None and key == self.pending_key:
+            self.pending["content"] += obj["content"]
+            for field in _VOLATILE_FIELDS:
+                if field in obj:
+                    self.pending[field] = obj[field]
+        else:
+            out.extend(self._flush_pending())
+            self.pending, self.pending_event, self.pending_key = obj, event, key
+        self.pending_bytes += len(obj["content"].encode("utf-8"))
+        if self.pending_bytes >= self.max_bytes:
+            out.extend(self._flush_pending())
+        return out
+
+    # ------------------------------------------------------------------
+    # ASGI 輸出
+    # ------------------------------------------------------------------
+    async def _write(self, parts: List[str], more_body: bool) -> None:
+        if self.closed or (not parts and more_body):
+            return
+        if not self.started and parts:
+            parts.insert(0, STREAM_MODE_COMMENT)
+            self.started = True
+        body = "".join(parts).encode("utf-8")
+        self.bytes_out += len(body)
+        if not more_body:
+            self.closed = True
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    async def _flush_later(self) -> None:
+        try:
+            await asyncio.sleep(self.window)
+            async with self.lock:
+                self.timer = None
+                await self._write(self._flush_pending(), True)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # client 已斷線；由 app 的下一次 send 回報錯誤
+            self.closed = True
+
+    async def feed(self, chunk: bytes, more_body: bool) -> None:
+        self.bytes_in += len(chunk)
+        async with self.lock:
+            self.buffer += self.decoder.decode(chunk, final=not more_body)
+            *frames, self.buffer = self.buffer.split("\n\n")
+            out: List[str] = []
+            for frame in frames:
+                if frame.strip():
+                    out.extend(self._process(frame))
+            if not more_body:
+                if self.buffer.strip():
+                    out.extend(self._process(self.buffer))
+                    self.buffer = ""
+                out.extend(self._flush_pending())
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+            await self._write(out, more_body)
+            if self.pending is not None and self.timer is None:
+                self.timer = asyncio.create_task(self._flush_later())
+
+    def record(self) -> None:
+        SSE_FRAMES.labels("upstream").inc(self.frames_in)
+        SSE_FRAMES.labels("sent").inc(self.frames_out)
+        SSE_BYTES.labels("upstream").inc(self.bytes_in)
+        SSE_BYTES.labels("sent").inc(self.bytes_out)
+
+
+def _wants_coalescing(scope) -> bool:
+    if scope["type"] != "http" or scope["method"] != "POST" or not _RUN_PATH.search(scope["path"]):
+        return False
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("stream_mode", [""])[0] == "coalesced"
+
+
+class SSECoalescingMiddleware:
+    """純 ASGI middleware：對帶 `?stream_mode=coalesced` 的 run 串流合併 content delta 並壓縮重複 metadata。"""
+
+    def __init__(self, app, window_ms: Optional[float] = None, max_bytes: Optional[int] = None):
+        self.app = app
+        self.window = (window_ms if window_ms is not None else float(os.getenv("SSE_COALESCE_WINDOW_MS", "30"))) / 1000
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("SSE_COALESCE_MAX_BYTES", "2048"))
+
+    async def __call__(self, scope, receive, send):
+        if not _wants_coalescing(scope):
+            await self.app(scope, receive, send)
+            return
+
+        state: Dict[str, Any] = {"stream": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers: List[Tuple[bytes, bytes]] = message.get("headers", [])
+                content_type = next((v for k, v in headers if k.lower() == b"content-type"), b"")
+                if content_type.startswith(b"text/event-stream"):
+                    state["stream"] = _CoalescingStream(send, self.window, self.max_bytes)
+                    message = {**message, "headers": [(k, v) for k, v in headers if k.lower() != b"content-length"]}
+                await send(message)
+            elif message["type"] == "http.response.body" and state["stream"] is not None:
+                await state["stream"].feed(message.get("body", b""), message.get("more_body", False))
+            else:
+                await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stream = state["stream"]
+            if stream is not None:
+                if stream.timer is not None:
+                    stream.timer.cancel()
+                stream.record()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# backend 的模組彼此以平面方式 import（from metrics import ...），測試時把 backend/ 放進 sys.path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
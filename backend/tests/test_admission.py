@@ -0,0 +1,46 @@
+"""AdmissionController 的公平佇列分配測試（memory 後端）。"""
+
+import asyncio
+
+from admission import AdmissionController
+from shared_state import MemorySharedState
+
+
+class _AbandoningState(MemorySharedState):
+    """取得某使用者的租約時，模擬該使用者的排隊請求剛好在等待期間全部放棄。"""
+
+    def __init__(self):
+        super().__init__()
+        self.on_acquire = None
+
+    def acquire(self, name, holder, limit, ttl):
+        acquired = super().acquire(name, holder, limit, ttl)
+        if self.on_acquire is not None:
+            callback, self.on_acquire = self.on_acquire, None
+            callback(name)
+        return acquired
+
+
+def test_dispatch_skips_user_whose_queue_emptied_during_wait():
+    async def scenario():
+        state = _AbandoningState()
+        controller = AdmissionController(max_concurrent=1, max_per_user=1, state=state, lease_ttl=60)
+        holder = await controller.try_acquire("busy")
+        gone = controller.enqueue("gone")
+        waiting = controller.enqueue("waiting")
+
+        def abandon_gone(name):
+            # abandon 是 coroutine，這裡直接做同樣的同步清理
+            controller.queues["gone"].remove(gone)
+            controller._remove_user("gone")
+
+        state.on_acquire = abandon_gone
+        await controller.release("busy", holder)
+
+        assert waiting.admitted.is_set()
+        assert not gone.admitted.is_set()
+        assert controller.queues == {}
+        assert state.count("admission:global") == 1
+        controller._refresher.cancel()
+
+    asyncio.run(scenario())
@@ -0,0 +1,107 @@
+"""ArtifactStore 的 session scratch 收錄、put_file 鎖範圍與 /charts 子路徑測試（local 後端）。"""
+
+import os
+import threading
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import artifacts
+from artifacts import ArtifactStore, LocalArtifactBackend
+
+
+def _store(tmp_path):
+    return ArtifactStore(LocalArtifactBackend(str(tmp_path / "store")), scratch_root=str(tmp_path))
+
+
+def _write(directory, name, content):
+    path = os.path.join(directory, *name.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def test_concurrent_sessions_ingest_only_their_own_files(tmp_path):
+    store = _store(tmp_path)
+    _write(store.session_scratch_dir("session-a", "charts"), "a.html", "<p>a</p>")
+    _write(store.session_scratch_dir("session-b", "charts"), "b.html", "<p>b</p>")
+    _write(store.session_scratch_dir("session-b", "downloads"), "report.csv", "x,y\n")
+
+    assert store.ingest_session_scratch("session-a") == ["charts/a.html"]
+    assert sorted(store.ingest_session_scratch("session-b")) == ["charts/b.html", "downloads/report.csv"]
+    assert list(store.session_manifest("session-a")["artifacts"]) == ["charts/a.html"]
+    assert sorted(store.session_manifest("session-b")["artifacts"]) == ["charts/b.html", "downloads/report.csv"]
+    # 沒有變動的檔案不會重複收錄
+    assert store.ingest_session_scratch("session-a") == []
+
+
+def test_rewritten_session_file_is_reingested_on_read(tmp_path):
+    store = _store(tmp_path)
+    directory = store.session_scratch_dir("session-a", "charts")
+    _write(directory, "a.html", "v1")
+    store.ingest_session_scratch("session-a")
+    first = store.resolve("charts", "a.html")["digest"]
+
+    _write(directory, "a.html", "version 2")
+    os.utime(os.path.join(directory, "a.html"), (1, 1))
+    ref = store.resolve("charts", "a.html")
+    assert ref["digest"] != first
+    assert ref["session_id"] == "session-a"
+
+
+def test_put_file_copies_blob_without_holding_lock(tmp_path):
+    store = _store(tmp_path)
+    lock_held = []
+    put_blob = store.backend.put_blob
+
+    def checking_put_blob(digest, src_path):
+        lock_held.append(store._lock.locked())
+        put_blob(digest, src_path)
+
+    store.backend.put_blob = checking_put_blob
+    threads = [threading.Thread(target=store.put_bytes, args=("downloads", f"f{i}.txt", b"same"))
+               for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert lock_held and not any(lock_held)
+    assert store.stats()["blobs"] == 1
+    assert all(store.resolve("downloads", f"f{i}.txt") for i in range(4))
+
+
+def test_charts_serves_subpaths_and_directory_index(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    monkeypatch.setattr(artifacts, "_artifact_store", store)
+    _write(store.scratch_dir("charts"), "flat.html", "flat")
+    _write(store.session_scratch_dir("session-a", "charts"), "report/index.html", "index")
+    _write(store.session_scratch_dir("session-a", "charts"), "report/plotly.min.js", "js")
+    store.ingest_session_scratch("session-a")
+
+    app = FastAPI()
+    artifacts.install_artifacts(app)
+    client = TestClient(app)
+    assert client.get("/charts/flat.html").text == "flat"
+    assert client.get("/charts/report/").text == "index"
+    assert client.get("/charts/report/plotly.min.js").text == "js"
+    assert client.get("/artifacts/charts/report/index.html").text == "index"
+    assert client.get("/charts/../artifacts.py").status_code == 404
+    assert store.resolve("charts", "report/../../artifacts.py") is None
+
+
+def test_session_id_cannot_escape_the_manifest_directory(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    monkeypatch.setattr(artifacts, "_artifact_store", store)
+    for session_id in ("../../escaped", "a/b"):
+        store.put_bytes("images", "a.png", b"x", session_id=session_id)
+        assert store.session_manifest(session_id)["session_id"] == session_id
+
+    manifests = tmp_path / "store" / "manifests"
+    assert not list(tmp_path.rglob("escaped.json"))
+    assert all(path.parent == manifests for path in manifests.rglob("*.json"))
+
+    app = FastAPI()
+    artifacts.install_artifacts(app)
+    body = TestClient(app).get("/artifacts/sessions/..%2F..%2Fescaped").json()
+    assert body["artifacts"] == {"images/a.png": store.resolve("images", "a.png")["digest"]}
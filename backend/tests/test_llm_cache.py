@@ -0,0 +1,50 @@
+"""CachedLiteLLMOpenAI 快取 key 對 add_datetime_to_context 目前時間的處理，以及共用層的存活時間。"""
+
+import time
+from datetime import datetime, timedelta
+
+from agno.models.message import Message
+
+from llm_cache import CachedLiteLLMOpenAI, ResponseCache
+from shared_state import MemorySharedState
+
+
+def _messages(now):
+    system = (
+        "You are an image prompt writer.\n\n"
+        f"<additional_information>\n- Use markdown.\n- The current time is {now}.\n</additional_information>\n\n"
+    )
+    return [Message(role="system", content=system), Message(role="user", content="a red bicycle")]
+
+
+def _key(model, now):
+    messages, tools = model._prepare(_messages(now), None)
+    return model._cache_key(messages, False, tools=tools)
+
+
+def _model(**kwargs):
+    return CachedLiteLLMOpenAI(id="deepseek-chat", api_key="test", temperature=0,
+                               response_cache=ResponseCache(), **kwargs)
+
+
+def test_identical_calls_milliseconds_apart_share_a_key():
+    for model in (_model(stable_prefix=True), _model()):
+        first = _key(model, datetime.now())
+        time.sleep(0.005)
+        assert _key(model, datetime.now()) == first
+
+
+def test_key_changes_with_the_date():
+    model = _model(stable_prefix=True)
+    today = datetime(2024, 5, 1, 23, 59, 59, 999999)
+    assert _key(model, today) != _key(model, today + timedelta(microseconds=1))
+    assert _key(model, today) == _key(model, today.replace(hour=0, microsecond=0))
+
+
+def test_shared_tier_expires_without_llm_cache_ttl():
+    shared = MemorySharedState()
+    cache = ResponseCache(shared=shared)
+    cache.set("k", [{"content": "x"}])
+    expires_at, _ = shared._kv["llm-cache:k"]
+    assert expires_at is not None
+    assert ResponseCache(ttl=60, shared=shared).shared_ttl == 60
@@ -0,0 +1,89 @@
+"""metrics_tool_hook 的 generator 計時、/extract-text 的 file_type label 與多 worker 匯總測試。"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from metrics import EXTRACT_BYTES, TOOL_DURATION, metrics_tool_hook, observe_extraction
+
+
+# 直接讀各個 metric，不走 REGISTRY：scrape 時 _RuntimeCollector 會載入 llm_cache（與 litellm）
+def _tool_sample(suffix, tool, status):
+    for sample in TOOL_DURATION.collect()[0].samples:
+        if sample.name.endswith(suffix) and sample.labels == {"tool": tool, "status": status}:
+            return sample.value
+    return 0
+
+
+def _tool_count(tool, status):
+    return _tool_sample("_count", tool, status)
+
+
+def _tool_sum(tool, status):
+    return _tool_sample("_sum", tool, status)
+
+
+def test_async_generator_tool_is_timed_until_exhausted():
+    async def tool():
+        yield "queued"
+        await asyncio.sleep(0.05)
+        yield "done"
+
+    async def scenario():
+        gen = await metrics_tool_hook("test_async_gen", tool, {})
+        assert _tool_count("test_async_gen", "ok") == 0  # 尚未消費完，不應提早記錄
+        return [item async for item in gen]
+
+    assert asyncio.run(scenario()) == ["queued", "done"]
+    assert _tool_count("test_async_gen", "ok") == 1
+    assert _tool_sum("test_async_gen", "ok") >= 0.05
+
+
+def test_sync_generator_tool_is_timed_and_errors_are_labelled():
+    def tool():
+        yield 1
+        time.sleep(0.02)
+        raise RuntimeError("boom")
+
+    gen = asyncio.run(metrics_tool_hook("test_sync_gen", tool, {}))
+    assert next(gen) == 1
+    with pytest.raises(RuntimeError):
+        next(gen)
+    assert _tool_count("test_sync_gen", "error") == 1
+    assert _tool_sum("test_sync_gen", "error") >= 0.02
+
+
+def test_extraction_file_type_label_is_whitelisted():
+    observe_extraction("pdf", 0.01, 10, 5)
+    observe_extraction("exe-2024-report-final", 0.01, 10, 5)
+    observe_extraction("", 0.01, 10, 5)
+    labels = {sample.labels["type"] for sample in EXTRACT_BYTES.collect()[0].samples}
+    assert labels == {"pdf", "other"}
+
+
+_SCRAPE = """
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from metrics import install_metrics
+app = FastAPI()
+install_metrics(app)
+print(TestClient(app).get("/metrics").text)
+"""
+
+
+def test_multiprocess_metrics_are_summed_across_workers(tmp_path):
+    # prometheus_client 在 import 時決定是否寫入 PROMETHEUS_MULTIPROC_DIR，每個 worker 需是獨立行程
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path), "LITELLM_LOCAL_MODEL_COST_MAP": "True"}
+    backend = Path(__file__).resolve().parent.parent
+    for frames in (3, 4):
+        worker = f"from metrics import SSE_FRAMES; SSE_FRAMES.labels('sent').inc({frames})"
+        subprocess.run([sys.executable, "-c", worker], cwd=backend, env=env, check=True)
+
+    scrape = subprocess.run([sys.executable, "-c", _SCRAPE], cwd=backend, env=env,
+                            check=True, capture_output=True, text=True, timeout=120)
+    assert 'agentos_sse_frames_total{stage="sent"} 7.0' in scrape.stdout
@@ -0,0 +1,79 @@
+"""
+PostgresSharedState 的寫入路徑測試。
+
+_exec 的 DML 行為以 SQLite 引擎驗證（不需外部服務）；完整的 KV / Lease 流程需要真的 PostgreSQL，
+設定 SHARED_STATE_TEST_URL（例如 postgresql://ai:ai@localhost:5532/ai）時才執行。
+"""
+
+import os
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+
+import shared_state
+from shared_state import PostgresSharedState
+
+
+@pytest.fixture
+def sqlite_state(tmp_path):
+    # 只借用 _exec，略過會建立 PostgreSQL 專用資料表的 __init__
+    state = object.__new__(PostgresSharedState)
+    state._engine = create_engine(f"sqlite:///{tmp_path / 'state.db'}")
+    state._exec("CREATE TABLE kv (key TEXT PRIMARY KEY, value TEXT)")
+    return state
+
+
+def test_exec_commits_statements_without_result_rows(sqlite_state):
+    assert sqlite_state._exec("INSERT INTO kv (key, value) VALUES (:k, :v)", {"k": "a", "v": "1"}) == []
+    assert sqlite_state._exec("UPDATE kv SET value = :v WHERE key = :k", {"k": "a", "v": "2"}) == []
+    assert sqlite_state._exec("SELECT value FROM kv WHERE key = :k", {"k": "a"}) == [("2",)]
+    assert sqlite_state._exec("DELETE FROM kv WHERE key = :k", {"k": "a"}) == []
+    assert sqlite_state._exec("SELECT count(*) FROM kv") == [(0,)]
+
+
+@pytest.fixture
+def postgres_state():
+    url = os.getenv("SHARED_STATE_TEST_URL")
+    if not url:
+        pytest.skip("SHARED_STATE_TEST_URL is not set")
+    pytest.importorskip("psycopg")
+    return PostgresSharedState(url, schema=os.getenv("SHARED_STATE_TEST_SCHEMA", "ai"))
+
+
+def test_postgres_kv_set_get_delete(postgres_state):
+    key = f"test:{uuid.uuid4().hex}"
+    postgres_state.set(key, {"n": 1}, ttl=60)
+    assert postgres_state.get(key) == {"n": 1}
+    postgres_state.set(key, {"n": 2})
+    assert postgres_state.scan(key) == {key: {"n": 2}}
+    postgres_state.delete(key)
+    assert postgres_state.get(key) is None
+
+
+def test_postgres_lease_refresh_release(postgres_state):
+    name = f"test:{uuid.uuid4().hex}"
+    assert postgres_state.acquire(name, "a", limit=1, ttl=60)
+    assert not postgres_state.acquire(name, "b", limit=1, ttl=60)
+    postgres_state.refresh(name, "a", ttl=120)
+    assert postgres_state.count(name) == 1
+    postgres_state.release(name, "a")
+    assert postgres_state.count(name) == 0
+    assert postgres_state.acquire(name, "b", limit=1, ttl=60)
+    postgres_state.release(name, "b")
+
+
+def test_postgres_sweep(postgres_state):
+    postgres_state._last_sweep = 0.0
+    postgres_state._maybe_sweep()
+
+
+def test_workers_refuse_agents_that_cache_sessions(monkeypatch):
+    monkeypatch.setattr(shared_state, "get_shared_state", lambda: SimpleNamespace(distributed=True, name="redis"))
+    member = SimpleNamespace(name="writer", cache_session=True)
+    team = SimpleNamespace(name="team", cache_session=False, members=[SimpleNamespace(name="ok"), member])
+    shared_state.require_shared_state_for_workers(4, [SimpleNamespace(name="ok", cache_session=False)])
+    with pytest.raises(SystemExit, match="writer"):
+        shared_state.require_shared_state_for_workers(4, [team])
+    shared_state.require_shared_state_for_workers(1, [team])
@@ -0,0 +1,54 @@
+"""GuardedSQLTools 的語句切分與 EXPLAIN ANALYZE 檢查（SQLite 引擎，PostgreSQL 專屬的成本估算以替身代替）。"""
+
+import pytest
+
+from sql_guard import GuardedSQLTools, _split_statements
+from tool_governor import ResultGovernor
+
+
+@pytest.fixture
+def guard(tmp_path):
+    return GuardedSQLTools(governor=ResultGovernor(spill_dir=tmp_path), db_url="sqlite://", max_cost=1000)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("select 1;", ["select 1"]),
+    ("select ';' as x ;  -- trailing comment", ["select ';' as x"]),
+    ("select 'a''b;c', \"we;ird\", E'it\\'s;'", ["select 'a''b;c', \"we;ird\", E'it\\'s;'"]),
+    ("select $tag$ ; $tag$, $$;$$", ["select $tag$ ; $tag$, $$;$$"]),
+    ("/* a; /* nested; */ */ select 1", ["select 1"]),
+    ("select 1; drop table t", ["select 1", "drop table t"]),
+    ("select 1 -- ;\n; select 2", ["select 1", "select 2"]),
+])
+def test_split_statements_ignores_quoted_semicolons(query, expected):
+    assert _split_statements(query) == expected
+
+
+def test_semicolons_in_literals_and_trailing_semicolon_are_allowed(guard):
+    assert guard.check_query("select ';' as x;") == ("select ';' as x", "")
+    assert '";"' in guard.run_sql_query("select ';' as x;")
+
+
+def test_multiple_statements_are_rejected(guard):
+    sql, note = guard.check_query("select 1; delete from t")
+    assert sql is None and "one SQL statement" in note
+
+
+def test_explain_analyze_checks_the_cost_of_the_inner_query(guard, monkeypatch):
+    costs = {"select * from big": 5000.0, "select * from small": 10.0}
+    monkeypatch.setattr(GuardedSQLTools, "_is_postgres", property(lambda self: True))
+    monkeypatch.setattr(guard, "_explain_cost", lambda sql: costs[sql])
+
+    sql, note = guard.check_query("EXPLAIN ANALYZE select * from big")
+    assert sql is None and "EXPLAIN ANALYZE executes the query" in note
+    sql, _ = guard.check_query("explain (analyze, buffers) select * from big")
+    assert sql is None
+    assert guard.check_query("EXPLAIN ANALYZE select * from small")[0] == "EXPLAIN ANALYZE select * from small"
+    # 沒有 ANALYZE 的 EXPLAIN 不執行查詢，不需要估算成本
+    assert guard.check_query("explain (analyze false) select * from big")[0] is not None
+    assert guard.check_query("explain select * from big")[0] is not None
+
+
+def test_explain_of_a_write_is_rejected(guard):
+    sql, note = guard.check_query("explain analyze delete from t")
+    assert sql is None and "EXPLAIN is only allowed" in note
@@ -0,0 +1,70 @@
+"""ResultGovernor 的 Parquet 型別保留與 SQL 讀取上限旗標測試。"""
+
+import datetime
+import json
+from decimal import Decimal
+
+import pytest
+
+import tool_governor
+from tool_governor import GovernedSQLTools, ResultGovernor
+
+
+def test_parquet_spill_keeps_native_types_and_nulls(tmp_path):
+    pytest.importorskip("pyarrow")
+    governor = ResultGovernor(spill_dir=tmp_path, max_rows=2)
+    rows = [
+        {"id": i, "price": Decimal("1.50") if i else None, "day": datetime.date(2024, 1, i + 1),
+         "ok": i % 2 == 0, "name": None if i == 1 else f"n{i}", "mixed": [1, "a", {"k": i}][i]}
+        for i in range(3)
+    ]
+    summary = json.loads(governor.govern_rows(rows))
+    assert summary["result_id"].endswith(".parquet")
+
+    page = json.loads(governor.read(summary["result_id"], offset=0, limit=2))
+    assert page["total_rows"] == 3
+    first, second = page["rows"]
+    (third,) = json.loads(governor.read(summary["result_id"], offset=2, limit=2))["rows"]
+    assert first["id"] == 0 and isinstance(first["id"], int)
+    assert first["price"] is None and second["price"] == "1.50"
+    assert first["day"] == "2024-01-01"
+    assert first["ok"] is True and second["ok"] is False
+    assert second["name"] is None
+    # 無法推斷單一型別的欄位改存字串，NULL 以外的值不會變成 "None"
+    assert [first["mixed"], second["mixed"], third["mixed"]] == ["1", "a", '{"k": 2}']
+
+
+@pytest.fixture
+def sql_tools(tmp_path):
+    tools = GovernedSQLTools(governor=ResultGovernor(spill_dir=tmp_path), db_url="sqlite://")
+    return tools
+
+
+def test_rows_capped_when_unlimited_query_hits_fetch_cap(sql_tools, monkeypatch):
+    monkeypatch.setattr(tool_governor, "MAX_FETCH_ROWS", 60)
+    query = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {}) SELECT i FROM n"
+
+    capped = json.loads(sql_tools.run_sql_query(query.format(100), limit=None))
+    assert capped["rows_capped"] is True and capped["total_rows"] == 60
+
+    exact = json.loads(sql_tools.run_sql_query(query.format(60), limit=None))
+    assert "rows_capped" not in exact and exact["total_rows"] == 60
+
+
+def test_rows_over_the_cap_are_not_serialized_whole(tmp_path, monkeypatch):
+    governor = ResultGovernor(spill_dir=tmp_path, max_rows=5)
+    rows = [{"id": i} for i in range(1000)]
+    dumped = []
+    dumps = json.dumps
+
+    def counting_dumps(obj, *args, **kwargs):
+        dumped.append(obj)
+        return dumps(obj, *args, **kwargs)
+
+    monkeypatch.setattr(tool_governor.json, "dumps", counting_dumps)
+    summary = json.loads(governor.govern_rows(rows))
+    assert summary["total_rows"] == 1000
+    assert all(obj is not rows for obj in dumped)
+
+    assert json.loads(governor.govern_rows(rows[:5])) == rows[:5]
+    assert rows[:5] in dumped
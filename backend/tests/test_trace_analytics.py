@@ -0,0 +1,66 @@
+"""
+SpanAnalytics 每小時 rollup 的晚到 span 測試。
+
+rollup SQL 使用 PostgreSQL 專用函式（width_bucket、to_regclass、jsonb），
+設定 TRACE_ANALYTICS_TEST_URL（例如 postgresql+psycopg://ai:ai@localhost:5532/ai）時才執行。
+"""
+
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.sql.expression import text
+
+from trace_analytics import SpanAnalytics
+
+
+@pytest.fixture
+def analytics():
+    url = os.getenv("TRACE_ANALYTICS_TEST_URL")
+    if not url:
+        pytest.skip("TRACE_ANALYTICS_TEST_URL is not set")
+    pytest.importorskip("psycopg")
+    engine = create_engine(url)
+    schema = f"trace_test_{uuid.uuid4().hex[:8]}"
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.execute(text(
+            f"CREATE TABLE {schema}.spans (span_id text PRIMARY KEY, trace_id text, name text, "
+            "span_kind text, start_time text, duration_ms bigint, attributes jsonb)"
+        ))
+    tracing_db = SimpleNamespace(db_engine=engine, db_schema=schema,
+                                 trace_table_name="traces", span_table_name="spans")
+    analytics = SpanAnalytics(tracing_db)
+    analytics.ensure_schema()
+    yield analytics
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+
+
+def _insert_span(analytics, start_time, duration_ms):
+    with analytics.engine.begin() as conn:
+        conn.execute(text(
+            f"INSERT INTO {analytics.spans_table} VALUES "
+            "(:span_id, 't', 'llm', 'INTERNAL', :start, :duration, '{\"openinference.span.kind\": \"LLM\"}')"
+        ), {"span_id": uuid.uuid4().hex, "start": start_time.isoformat(), "duration": duration_ms})
+
+
+def _model_count(analytics):
+    stats = {row["span_type"]: row for row in analytics.span_stats(hours=6)}
+    return stats["model"]["count"]
+
+
+def test_late_spans_in_finished_hours_are_counted(analytics):
+    finished_hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(hours=2)
+    _insert_span(analytics, finished_hour + timedelta(minutes=5), 40)
+    analytics.refresh_rollup(force=True)
+    assert _model_count(analytics) == 1
+
+    # 同一個（已彙總過的）小時晚到兩個 span，其中一個落在同一個延遲 bucket
+    _insert_span(analytics, finished_hour + timedelta(minutes=50), 45)
+    _insert_span(analytics, finished_hour + timedelta(minutes=55), 4000)
+    analytics.refresh_rollup(force=True)
+    assert _model_count(analytics) == 3
@@ -0,0 +1,249 @@
+"""
+Tool 輸出大小管控 (Result Governor)
+
+run_sql_query 可能回傳上千列、run_python_code 會回傳完整 stdout，
+這些內容原本會原封不動地進入模型 context 與 session DB，浪費 tokens、儲存空間與延遲。
+
+ResultGovernor 對每個 tool 結果設定列數與 bytes 上限：
+- 未超過上限：原樣回傳
+- 超過上限：完整結果寫到 downloads/tool_results/（表格為 Parquet，無 pyarrow 時改用 CSV；文字為 .txt），
+  模型只看到精簡預覽 + schema + 統計資訊 + result_id，需要時再用 read_tool_result 分頁讀取
+- Parquet 保留各欄位的原生型別，NULL 仍為 null；無法轉成單一 Arrow 型別的欄位才改存字串
+- SQL 未指定 limit 時最多取回 MAX_FETCH_ROWS 列；結果被截在這個上限時回應帶 rows_capped
+
+環境變數：
+    TOOL_RESULT_MAX_ROWS   表格結果的列數上限（預設 50）
+    TOOL_RESULT_MAX_BYTES  單一 tool 結果的 bytes 上限（預設 8000）
+"""
+
+import csv
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from agno.tools import Toolkit
+from agno.tools.sql import SQLTools
+
+# 預覽列數；實際列數會再依 max_bytes 往下調整
+PREVIEW_ROWS = 20
+
+# SQL 未指定 limit 時最多取回的列數（其餘不讀取），避免把整張大表載入記憶體
+MAX_FETCH_ROWS = 100_000
+
+
+def _parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _as_text(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str, ensure_ascii=False)
+    return str(value)
+
+
+def _arrow_column(values: List[Any]):
+    """欄位轉成 Arrow array：能推斷出單一型別就保留（整數、小數、時間、布林…），否則改存字串。"""
+    import pyarrow as pa
+
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, OverflowError):
+        return pa.array([_as_text(v) for v in values], type=pa.string())
+
+
+def _column_stats(rows: List[Dict[str, Any]], column: str) -> Dict[str, Any]:
+    values = [row.get(column) for row in rows]
+    non_null = [v for v in values if v is not None]
+    stats: Dict[str, Any] = {"non_null": len(non_null)}
+    numeric = [v for v in non_null if isinstance(v, (int, float)) and not isinstance(v, bool)]
+    if numeric and len(numeric) == len(non_null):
+        stats["type"] = "number"
+        stats["min"] = min(numeric)
+        stats["max"] = max(numeric)
+        stats["mean"] = round(sum(numeric) / len(numeric), 4)
+    else:
+        stats["type"] = type(non_null[0]).__name__ if non_null else "null"
+        stats["distinct"] = len({str(v) for v in non_null})
+    return stats
+
+
+class ResultGovernor:
+    """限制 tool 結果的列數與大小，超過上限的完整結果寫入 spill_dir。"""
+
+    def __init__(
+        self,
+        spill_dir: Path,
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.spill_dir = Path(spill_dir)
+        self.max_rows = max_rows if max_rows is not None else int(os.getenv("TOOL_RESULT_MAX_ROWS", "50"))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("TOOL_RESULT_MAX_BYTES", "8000"))
+
+    def _new_path(self, source: str, suffix: str) -> Path:
+        os.makedirs(self.spill_dir, exist_ok=True)
+        return self.spill_dir / f"{source}_{uuid.uuid4().hex[:12]}{suffix}"
+
+    def _spill_rows(self, rows: List[Dict[str, Any]], columns: List[str], source: str) -> Path:
+        if _parquet_available():
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            path = self._new_path(source, ".parquet")
+            table = pa.table({column: _arrow_column([row.get(column) for row in rows]) for column in columns})
+            pq.write_table(table, path)
+            return path
+        path = self._new_path(source, ".csv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def govern_rows(self, rows: List[Dict[str, Any]], source: str = "sql", row_cap: Optional[int] = None) -> str:
+        """表格結果：未超過上限時回傳 JSON，否則回傳預覽 + schema + 統計 + result_id。
+
+        row_cap：rows 在讀取時已被截在這個列數（後面還有資料），回應一律帶 rows_capped 說明。
+        """
+        # 先比列數：超過上限的結果（最多 MAX_FETCH_ROWS 列）不需要整份序列化
+        if row_cap is None and len(rows) <= self.max_rows:
+            full = json.dumps(rows, default=str, ensure_ascii=False)
+            if len(full.encode("utf-8")) <= self.max_bytes:
+                return full
+
+        columns = list(rows[0].keys()) if rows else []
+        path = self._spill_rows(rows, columns, source)
+        summary: Dict[str, Any] = {
+            "truncated": True,
+            "result_id": path.name,
+            "total_rows": len(rows),
+            "columns": {column: _column_stats(rows, column) for column in columns},
+            "preview": rows[: min(PREVIEW_ROWS, self.max_rows)],
+            "note": f"Full result saved to downloads/tool_results/{path.name}. "
+            f"Use read_tool_result(result_id='{path.name}', offset=..., limit=...) to page through it, "
+            "or load it with pandas in Python for further analysis.",
+        }
+        if row_cap is not None:
+            summary["rows_capped"] = True
+            summary["note"] += (
+                f" The query returned more than {row_cap} rows; only the first {row_cap} were fetched. "
+                "Add WHERE filters or aggregate in SQL to work with the complete result."
+            )
+        # 預覽本身也不能超過 max_bytes
+        text = json.dumps(summary, default=str, ensure_ascii=False)
+        while summary["preview"] and len(text.encode("utf-8")) > self.max_bytes:
+            summary["preview"] = summary["preview"][: len(summary["preview"]) // 2]
+            text = json.dumps(summary, default=str, ensure_ascii=False)
+        return text
+
+    def govern_text(self, text: str, source: str = "python") -> str:
+        """文字結果：超過 max_bytes 時保留開頭與結尾，完整內容寫入 .txt。"""
+        data = text.encode("utf-8")
+        if len(data) <= self.max_bytes:
+            return text
+
+        path = self._new_path(source, ".txt")
+        path.write_bytes(data)
+        lines = text.count("\n") + 1
+        head = data[: self.max_bytes * 2 // 3].decode("utf-8", errors="ignore")
+        tail = data[-(self.max_bytes // 3):].decode("utf-8", errors="ignore")
+        return (
+            f"{head}\n\n...[output truncated: {len(data)} bytes, {lines} lines total. "
+            f"Full output saved as result_id='{path.name}'; "
+            f"use read_tool_result(result_id='{path.name}', offset=<line>, limit=<lines>) to read more]...\n\n{tail}"
+        )
+
+    def read(self, result_id: str, offset: int = 0, limit: int = 50) -> str:
+        """分頁讀取已寫入的結果；表格以列為單位，文字以行為單位。"""
+        path = self.spill_dir / os.path.basename(result_id)
+        if not path.is_file():
+            return f"Error: result '{result_id}' not found"
+        offset = max(offset, 0)
+        limit = max(min(limit, self.max_rows), 1)
+
+        if path.suffix == ".parquet":
+            import pyarrow.parquet as pq
+
+            table = pq.read_table(path)
+            page = table.slice(offset, limit).to_pylist()
+            total = table.num_rows
+        elif path.suffix == ".csv":
+            page = []
+            total = 0
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                for i, row in enumerate(csv.DictReader(f)):
+                    if offset <= i < offset + limit:
+                        page.append(row)
+                    total = i + 1
+        else:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                all_lines = f.read().splitlines()
+            page_text = "\n".join(all_lines[offset: offset + limit])
+            header = f"[{path.name}: lines {offset}-{offset + limit} of {len(all_lines)}]\n"
+            # 單行極長時仍需截斷，但不再另存檔案
+            return header + page_text.encode("utf-8")[: self.max_bytes].decode("utf-8", errors="ignore")
+
+        return json.dumps({"result_id": path.name, "offset": offset, "total_rows": total, "rows": page},
+                          default=str, ensure_ascii=False)
+
+
+class ToolResultTools(Toolkit):
+    """讓 agent 分頁讀取被截斷的 tool 結果。"""
+
+    def __init__(self, governor: ResultGovernor, **kwargs):
+        self.governor = governor
+        super().__init__(name="tool_result_tools", tools=[self.read_tool_result], **kwargs)
+
+    def read_tool_result(self, result_id: str, offset: int = 0, limit: int = 50) -> str:
+        """Read a page of a large tool result that was truncated and saved to disk.
+
+        Args:
+            result_id (str): The result_id returned in the truncated tool output.
+            offset (int): Row (for tables) or line (for text output) to start from. Defaults to 0.
+            limit (int): Number of rows / lines to return. Defaults to 50.
+
+        Returns:
+            str: The requested page as JSON (tables) or plain text (text output).
+        """
+        return self.governor.read(result_id, offset=offset, limit=limit)
+
+
+class GovernedSQLTools(SQLTools):
+    """run_sql_query 的結果經過 ResultGovernor，大結果只回傳預覽。"""
+
+    def __init__(self, governor: ResultGovernor, **kwargs):
+        self.governor = governor
+        super().__init__(**kwargs)
+
+    def run_sql_query(self, query: str, limit: Optional[int] = 10) -> str:
+        """Use this function to run a SQL query and return the result.
+
+        Args:
+            query (str): The query to run.
+            limit (int, optional): The number of rows to return. Defaults to 10. Use `None` to show all results.
+                Large results are returned as a preview with schema and stats plus a result_id for paging.
+
+        Returns:
+            str: Result of the SQL query.
+        Notes:
+            - The result may be empty if the query does not return any data.
+        """
+        try:
+            if limit is not None:
+                return self.governor.govern_rows(self.run_sql(sql=query, limit=limit), source="sql")
+            # 多取一列，判斷結果是否被 MAX_FETCH_ROWS 截斷
+            rows = self.run_sql(sql=query, limit=MAX_FETCH_ROWS + 1)
+            if len(rows) > MAX_FETCH_ROWS:
+                return self.governor.govern_rows(rows[:MAX_FETCH_ROWS], source="sql", row_cap=MAX_FETCH_ROWS)
+            return self.governor.govern_rows(rows, source="sql")
+        except Exception as e:
+            return f"Error running query: {e}"
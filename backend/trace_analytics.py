@@ -0,0 +1,343 @@
+"""
+Tracing Span 分析 API（延遲瀑布圖與 p50/p95 彙總）
+
+AgentOS 開啟 tracing=True 後，每個 run 的 OpenTelemetry spans 會寫入 tracing_db 的
+traces / spans 表（agno 預設 ai.agno_traces / ai.agno_spans），但從來沒有被彙整過。
+team run 變慢時無從得知時間花在模型、Tavily、ComfyUI 委派還是 DB。
+
+提供的端點：
+- GET /traces/runs/{run_id}/waterfall   單一 run 的 span 樹（相對起點 / 長度 / 自身時間）與 critical path，
+                                         並依類型（model / tool:<name> / agent ...）彙總 critical path 上的時間
+- GET /traces/span-stats?hours=24       指定時間窗內各 span 類型的次數與 p50 / p95 / max
+
+為了讓彙總查詢在 span 表持續成長時仍然快速：
+- 建立 (trace_id, start_time) 複合索引，供 waterfall 查詢
+- 建立每小時 rollup 表（每個 span 類型的固定延遲 bucket 計數），查詢時合併 rollup 與
+  「目前這個小時」的原始 spans，百分位數由 bucket 內插估算
+- span 在結束時才寫入（長時間的 run、批次匯出），已結束的小時仍可能補進 span：
+  每次彙總都重新計算最近 TRACE_ROLLUP_LATE_HOURS 個小時並以 upsert 覆寫，最多每分鐘一次
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Query
+from sqlalchemy.sql.expression import text
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLE = "tracing_span_rollup_hourly"
+
+# 晚到的 span：最近這幾個已結束的小時每次彙總都重新計算
+ROLLUP_LATE_HOURS = int(os.getenv("TRACE_ROLLUP_LATE_HOURS", "3"))
+# 兩次彙總的最短間隔（秒），避免每個 span-stats 請求都重算最近幾個小時
+ROLLUP_REFRESH_SECONDS = 60
+
+# 延遲 bucket 上界（毫秒），大致為對數刻度；最後一個 bucket 收納所有更長的 span
+BUCKET_BOUNDS_MS = [
+    5, 10, 25, 50, 100, 250, 500, 1000, 2000, 3000, 5000, 7500,
+    10000, 15000, 20000, 30000, 45000, 60000, 90000, 120000, 180000, 300000, 600000,
+]
+
+# span 類型：openinference 的 span kind（LLM / TOOL / AGENT / CHAIN），TOOL 再細分到 tool 名稱
+_SPAN_TYPE_SQL = """
+    CASE
+        WHEN attributes->>'openinference.span.kind' = 'LLM' THEN 'model'
+        WHEN attributes->>'openinference.span.kind' = 'TOOL'
+            THEN 'tool:' || COALESCE(attributes->>'tool.name', name)
+        ELSE lower(COALESCE(attributes->>'openinference.span.kind', span_kind))
+    END
+"""
+
+
+def span_type(name: str, span_kind: str, attributes: Optional[Dict[str, Any]]) -> str:
+    """與 _SPAN_TYPE_SQL 相同的分類邏輯（Python 版，供 waterfall 使用）。"""
+    attributes = attributes or {}
+    kind = attributes.get("openinference.span.kind")
+    if kind == "LLM":
+        return "model"
+    if kind == "TOOL":
+        return f"tool:{attributes.get('tool.name') or name}"
+    return (kind or span_kind or "unknown").lower()
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def percentile_from_buckets(counts: Dict[int, int], q: float) -> Optional[float]:
+    """由 bucket 計數估算百分位數（bucket 內線性內插）。"""
+    total = sum(counts.values())
+    if total == 0:
+        return None
+    target = q * total
+    seen = 0
+    for index in sorted(counts):
+        count = counts[index]
+        if seen + count >= target:
+            lower = BUCKET_BOUNDS_MS[index - 1] if index > 0 else 0
+            upper = BUCKET_BOUNDS_MS[index] if index < len(BUCKET_BOUNDS_MS) else lower * 2
+            fraction = (target - seen) / count if count else 0
+            return round(lower + (upper - lower) * fraction, 1)
+        seen += count
+    return float(BUCKET_BOUNDS_MS[-1])
+
+
+# ----------------------------------------------------------------------------
+# Waterfall
+# ----------------------------------------------------------------------------
+def build_waterfall(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """把一個 trace 的 spans 組成樹狀瀑布圖並標出 critical path。
+
+    critical path：從 root 往回走，每一層挑「最晚結束」的子 span，
+    再從它的開始時間往前找下一個在那之前結束的兄弟 span，依此遞迴。
+    """
+    if not spans:
+        return {"spans": [], "critical_path": [], "breakdown": {}}
+
+    by_id = {s["span_id"]: s for s in spans}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for s in spans:
+        s["_start"] = _parse_time(s["start_time"])
+        s["_end"] = _parse_time(s["end_time"])
+        parent = s.get("parent_span_id") if s.get("parent_span_id") in by_id else None
+        children.setdefault(parent, []).append(s)
+    for kids in children.values():
+        kids.sort(key=lambda s: s["_start"])
+
+    roots = children.get(None, [])
+    trace_start = min(s["_start"] for s in spans)
+
+    critical: List[str] = []
+    critical_children: Dict[str, List[Dict[str, Any]]] = {}
+
+    def walk_critical(span: Dict[str, Any]) -> None:
+        critical.append(span["span_id"])
+        chosen: List[Dict[str, Any]] = []
+        cursor = span["_end"]
+        for child in sorted(children.get(span["span_id"], []), key=lambda s: s["_end"], reverse=True):
+            if child["_end"] <= cursor:
+                chosen.append(child)
+                cursor = child["_start"]
+        chosen.reverse()
+        critical_children[span["span_id"]] = chosen
+        for child in chosen:
+            walk_critical(child)
+
+    # 多個 root 時（例如跨服務的 span 沒有 parent），以同樣規則從最後結束的 root 開始
+    cursor = None
+    for root in sorted(roots, key=lambda s: s["_end"], reverse=True):
+        if cursor is None or root["_end"] <= cursor:
+            walk_critical(root)
+            cursor = root["_start"]
+
+    critical_set = set(critical)
+    breakdown: Dict[str, float] = {}
+    rows: List[Dict[str, Any]] = []
+
+    def emit(span: Dict[str, Any], depth: int) -> None:
+        kind = span_type(span["name"], span["span_kind"], span.get("attributes"))
+        self_ms = span["duration_ms"] - sum(c["duration_ms"] for c in critical_children.get(span["span_id"], []))
+        on_path = span["span_id"] in critical_set
+        if on_path:
+            breakdown[kind] = breakdown.get(kind, 0) + max(self_ms, 0)
+        rows.append({
+            "span_id": span["span_id"],
+            "parent_span_id": span.get("parent_span_id"),
+            "name": span["name"],
+            "type": kind,
+            "depth": depth,
+            "offset_ms": round((span["_start"] - trace_start).total_seconds() * 1000, 1),
+            "duration_ms": span["duration_ms"],
+            "self_ms": max(self_ms, 0) if on_path else None,
+            "status": span["status_code"],
+            "critical": on_path,
+        })
+        for child in children.get(span["span_id"], []):
+            emit(child, depth + 1)
+
+    for root in roots:
+        emit(root, 0)
+
+    total_ms = round((max(s["_end"] for s in spans) - trace_start).total_seconds() * 1000, 1)
+    return {
+        "total_ms": total_ms,
+        "spans": rows,
+        "critical_path": critical,
+        "breakdown": dict(sorted(breakdown.items(), key=lambda kv: kv[1], reverse=True)),
+    }
+
+
+# ----------------------------------------------------------------------------
+# Rollup
+# ----------------------------------------------------------------------------
+class SpanAnalytics:
+    """span 表的查詢、索引與每小時 rollup。"""
+
+    def __init__(self, tracing_db):
+        self.engine = tracing_db.db_engine
+        self.schema = tracing_db.db_schema
+        self.traces_table = f"{self.schema}.{tracing_db.trace_table_name}"
+        self.spans_table = f"{self.schema}.{tracing_db.span_table_name}"
+        self.rollup_table = f"{self.schema}.{ROLLUP_TABLE}"
+        self._refresh_lock = threading.Lock()
+        self._last_refresh = float("-inf")
+        self._indexed = False
+
+    def ensure_schema(self) -> None:
+        """建立 rollup 表與索引；spans 表尚未建立（還沒有任何 trace）時只建立 rollup 表，
+        索引會在之後第一次查詢統計時補建。"""
+        span_table_name = self.spans_table.split(".", 1)[1]
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {self.rollup_table} ("
+                " hour timestamptz NOT NULL,"
+                " span_type text NOT NULL,"
+                " bucket smallint NOT NULL,"
+                " span_count bigint NOT NULL,"
+                " duration_sum_ms bigint NOT NULL,"
+                " duration_max_ms bigint NOT NULL,"
+                " PRIMARY KEY (hour, span_type, bucket))"
+            ))
+            if self._spans_table_exists(conn):
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{span_table_name}_trace_start "
+                    f"ON {self.spans_table} (trace_id, start_time)"
+                ))
+                self._indexed = True
+
+    def _spans_table_exists(self, conn) -> bool:
+        return conn.execute(text("SELECT to_regclass(:name)"), {"name": self.spans_table}).scalar() is not None
+
+    def _bucket_sql(self) -> str:
+        bounds = ",".join(str(b) for b in BUCKET_BOUNDS_MS)
+        # width_bucket 對排序陣列回傳「小於等於該值的上界數量」，
+        # 因此以 duration_ms - 1 讓 bucket i 涵蓋 (BUCKET_BOUNDS_MS[i-1], BUCKET_BOUNDS_MS[i]]
+        return f"width_bucket((duration_ms - 1)::float8, ARRAY[{bounds}]::float8[])"
+
+    def refresh_rollup(self, force: bool = False) -> None:
+        """彙總已結束的小時：上次彙總之後的小時，加上最近 ROLLUP_LATE_HOURS 個小時（收進晚到的 span）。
+        每個小時都由原始 spans 完整重算後覆寫，可重複呼叫（idempotent）。"""
+        if not force and time.monotonic() - self._last_refresh < ROLLUP_REFRESH_SECONDS:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return  # 其他請求正在彙總
+        try:
+            with self.engine.begin() as conn:
+                last = conn.execute(text(f"SELECT max(hour) FROM {self.rollup_table}")).scalar()
+                current_hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+                start = None
+                if last:
+                    start = min(last + timedelta(hours=1), current_hour - timedelta(hours=ROLLUP_LATE_HOURS))
+                params: Dict[str, Any] = {"end": current_hour.isoformat()}
+                where = "start_time < :end"
+                if start is not None:
+                    where += " AND start_time >= :start"
+                    params["start"] = start.isoformat()
+                conn.execute(text(
+                    f"INSERT INTO {self.rollup_table} "
+                    f"SELECT date_trunc('hour', start_time::timestamptz) AS hour, {_SPAN_TYPE_SQL} AS span_type, "
+                    f"{self._bucket_sql()} AS bucket, count(*), sum(duration_ms), max(duration_ms) "
+                    f"FROM {self.spans_table} WHERE {where} "
+                    "GROUP BY 1, 2, 3 "
+                    "ON CONFLICT (hour, span_type, bucket) DO UPDATE SET "
+                    "span_count = EXCLUDED.span_count, duration_sum_ms = EXCLUDED.duration_sum_ms, "
+                    "duration_max_ms = EXCLUDED.duration_max_ms"
+                ), params)
+            self._last_refresh = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    def span_stats(self, hours: int, span_type_prefix: Optional[str] = None) -> List[Dict[str, Any]]:
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
+        since_hour = since.replace(minute=0, second=0, microsecond=0)
+        current_hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+        with self.engine.connect() as conn:
+            if not self._spans_table_exists(conn):
+                return []
+        if not self._indexed:
+            self.ensure_schema()
+        self.refresh_rollup()
+        with self.engine.connect() as conn:
+            # 已結束的小時：讀 rollup；目前這個小時：直接彙總原始 spans
+            rollup_rows = conn.execute(text(
+                f"SELECT span_type, bucket, sum(span_count), sum(duration_sum_ms), max(duration_max_ms) "
+                f"FROM {self.rollup_table} WHERE hour >= :since AND hour < :current GROUP BY 1, 2"
+            ), {"since": since_hour, "current": current_hour}).fetchall()
+            raw_rows = conn.execute(text(
+                f"SELECT {_SPAN_TYPE_SQL} AS span_type, {self._bucket_sql()} AS bucket, "
+                f"count(*), sum(duration_ms), max(duration_ms) "
+                f"FROM {self.spans_table} WHERE start_time >= :current GROUP BY 1, 2"
+            ), {"current": current_hour.isoformat()}).fetchall()
+
+        merged: Dict[str, Dict[str, Any]] = {}
+        for span_type_name, bucket, count, duration_sum, duration_max in list(rollup_rows) + list(raw_rows):
+            if span_type_prefix and not span_type_name.startswith(span_type_prefix):
+                continue
+            entry = merged.setdefault(span_type_name, {"buckets": {}, "count": 0, "sum": 0, "max": 0})
+            entry["buckets"][bucket] = entry["buckets"].get(bucket, 0) + int(count)
+            entry["count"] += int(count)
+            entry["sum"] += int(duration_sum)
+            entry["max"] = max(entry["max"], int(duration_max))
+
+        results = []
+        for span_type_name, entry in merged.items():
+            results.append({
+                "span_type": span_type_name,
+                "count": entry["count"],
+                "avg_ms": round(entry["sum"] / entry["count"], 1) if entry["count"] else None,
+                "p50_ms": percentile_from_buckets(entry["buckets"], 0.50),
+                "p95_ms": percentile_from_buckets(entry["buckets"], 0.95),
+                "max_ms": entry["max"],
+                "total_ms": entry["sum"],
+            })
+        results.sort(key=lambda r: r["total_ms"], reverse=True)
+        return results
+
+    def waterfall(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            trace = conn.execute(text(
+                f"SELECT trace_id, name, agent_id, team_id, session_id, duration_ms "
+                f"FROM {self.traces_table} WHERE run_id = :run_id ORDER BY start_time LIMIT 1"
+            ), {"run_id": run_id}).mappings().first()
+            if trace is None:
+                return None
+            spans = conn.execute(text(
+                f"SELECT span_id, parent_span_id, name, span_kind, status_code, start_time, end_time, "
+                f"duration_ms, attributes FROM {self.spans_table} WHERE trace_id = :trace_id ORDER BY start_time"
+            ), {"trace_id": trace["trace_id"]}).mappings().all()
+        result = build_waterfall([dict(s) for s in spans])
+        return {"run_id": run_id, **dict(trace), **result}
+
+
+def install_trace_analytics(app, tracing_db) -> SpanAnalytics:
+    """掛上 /traces/runs/{run_id}/waterfall 與 /traces/span-stats。"""
+    analytics = SpanAnalytics(tracing_db)
+    try:
+        analytics.ensure_schema()
+    except Exception as e:
+        logger.warning(f"[trace-analytics] 無法建立索引 / rollup 表：{e}")
+
+    # 同步 DB 查詢，使用 def 讓 FastAPI 放到 threadpool 執行，避免阻塞 event loop
+    @app.get("/traces/runs/{run_id}/waterfall")
+    def run_waterfall(run_id: str):
+        """回傳單一 run 的 span 瀑布圖、critical path 與各類型時間分佈。"""
+        result = analytics.waterfall(run_id)
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"No trace found for run '{run_id}'")
+        return result
+
+    @app.get("/traces/span-stats")
+    def span_stats(
+        hours: int = Query(default=24, ge=1, le=24 * 90),
+        span_type: Optional[str] = Query(default=None, description="span 類型前綴，例如 tool: 或 model"),
+    ):
+        """回傳時間窗內各 span 類型的次數與 p50 / p95 / max 延遲（毫秒）。"""
+        return {"hours": hours, "stats": analytics.span_stats(hours, span_type)}
+
+    return analytics
@@ -239,6 +239,26 @@ const ChatInterface = forwardRef(function ChatInterface({ onSessionChange, onMes
 
         console.log('Received event:', event); // Debug log
 
+        // Team 准入控制：排隊中，顯示排隊位置與預估等待時間
+        if (event.event === 'RunQueued') {
+          setCurrentAgent(`排隊中（第 ${event.position} 位，預估 ${event.eta_seconds} 秒）`);
+          continue;
+        }
+
+        // Image Generator 進度：ComfyUI 排隊位置 / 取樣步數
+        if (event.event === 'CustomEvent' && event.kind === 'image_progress') {
+          if (event.stage === 'queued') {
+            setCurrentAgent(`圖片排隊中（第 ${event.position} 位）`);
+          } else if (event.stage === 'sampling' && event.steps) {
+            setCurrentAgent(`圖片生成中 ${Math.round((event.step / event.steps) * 100)}%（${event.step}/${event.steps}）`);
+          } else if (event.stage === 'submitted' || event.stage === 'rendering') {
+            setCurrentAgent('圖片生成中…');
+          } else if (event.stage === 'done') {
+            setCurrentAgent('圖片已完成');
+          }
+          continue;
+        }
+
         // 處理不同類型的事件
         // Agent 模式: RunContent
         // Team 模式: TeamRunContent
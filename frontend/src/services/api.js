@@ -1,7 +1,14 @@
 ﻿import { API_BASE } from '../config';
 import { getUserId } from './userContext';
 
-const TEAM_API = `${API_BASE}/teams/creative-team/runs`;
+// 後端 SSE 合併模式：content delta 以 ~30ms / 2KB 為單位合併，事件只送出變動的欄位
+// resumable=1：run 與連線解耦，斷線後可用 stream id + Last-Event-ID 續傳
+const STREAM_MODE_QUERY = '?stream_mode=coalesced&resumable=1';
+const MAX_RESUME_ATTEMPTS = 5;
+const TERMINAL_EVENTS = new Set([
+  'RunCompleted', 'TeamRunCompleted', 'RunError', 'TeamRunError', 'RunCancelled', 'TeamRunCancelled',
+]);
+const TEAM_API = `${API_BASE}/teams/creative-team/runs${STREAM_MODE_QUERY}`;
 
 // 取得可用的 Agent 列表
 export async function getAgents() {
@@ -39,12 +46,20 @@ export function clearSession() {
   return generateSessionId();
 }
 
+// 跨重連共用的串流狀態：coalesced 合併基準、已處理的最後 event id、stream id、是否已收到結束事件
+function createStreamState() {
+  return { coalesced: false, lastByEvent: {}, lastEventId: 0, streamId: null, finished: false };
+}
+
 // SSE 串流解析共用函數
-async function* parseSSEStream(response, signal) {
+// 後端以 `: stream-mode coalesced` 開頭時，每個事件只包含與上一個同名事件不同的欄位，
+// 需與上一個同名事件合併還原成完整事件
+async function* parseSSEStream(response, signal, state = createStreamState()) {
   const reader = response.body.getReader();
   const decoder = new TextDecoder();
   let buffer = '';
   let currentEvent = null;
+  let pendingId = null;
 
   // 若 AbortSignal 觸發，立即關閉 reader
   if (signal) {
@@ -68,23 +83,46 @@ async function* parseSSEStream(response, signal) {
       for (const line of lines) {
         const trimmedLine = line.trim();
 
-        if (line.startsWith('event: ')) {
+        if (line.startsWith(': stream-id ')) {
+          state.streamId = line.slice(12).trim();
+        } else if (line.startsWith(': stream-mode')) {
+          state.coalesced = line.includes('coalesced');
+        } else if (line.startsWith('id: ')) {
+          pendingId = parseInt(line.slice(4), 10);
+        } else if (line.startsWith('event: ')) {
           currentEvent = line.slice(7).trim();
         } else if (line.startsWith('data: ')) {
           try {
             const dataStr = line.slice(6);
             if (dataStr === '[DONE]') continue;
 
-            const data = JSON.parse(dataStr);
+            let data = JSON.parse(dataStr);
+            if (state.coalesced) {
+              const key = currentEvent || '';
+              data = { ...state.lastByEvent[key], ...data };
+              state.lastByEvent[key] = data;
+            }
             if (currentEvent) {
               data.event = currentEvent;
             }
+            if (TERMINAL_EVENTS.has(data.event)) {
+              state.finished = true;
+            }
             yield data;
+            // 事件處理完才記錄 id，斷在 frame 中間時續傳會重送這個事件
+            if (pendingId !== null) {
+              state.lastEventId = pendingId;
+              pendingId = null;
+            }
             currentEvent = null;
           } catch (e) {
             console.error('Error parsing SSE data:', e);
           }
         } else if (trimmedLine === '') {
+          if (pendingId !== null) {
+            state.lastEventId = pendingId;
+            pendingId = null;
+          }
           currentEvent = null;
         }
       }
@@ -94,6 +132,56 @@ async function* parseSSEStream(response, signal) {
   }
 }
 
+// 可續傳的串流：連線中斷（例外或未收到結束事件就結束）時，以 Last-Event-ID 向 /run-streams 續傳；
+// 使用者主動中止（AbortSignal）時通知後端取消背景中的 run
+async function* streamWithResume(response, signal) {
+  const state = createStreamState();
+  signal?.addEventListener('abort', () => {
+    if (state.streamId && !state.finished) {
+      fetch(`${API_BASE}/run-streams/${state.streamId}`, { method: 'DELETE' }).catch(() => {});
+    }
+  }, { once: true });
+
+  let current = response;
+  let attempts = 0;
+  while (true) {
+    const resumedFrom = state.lastEventId;
+    let endedCleanly = false;
+    if (current) {
+      try {
+        yield* parseSSEStream(current, signal, state);
+        endedCleanly = true;
+      } catch (e) {
+        if (signal?.aborted) throw e;
+        console.warn('[SSE] stream interrupted, resuming:', e);
+      }
+    }
+    if (state.finished || signal?.aborted || !state.streamId) return;
+    // 續傳的串流正常結束卻沒有新事件：後端 run 已結束，不再重試
+    if (current && current !== response && endedCleanly && state.lastEventId === resumedFrom) return;
+    if (state.lastEventId > resumedFrom) attempts = 0;
+    if (attempts >= MAX_RESUME_ATTEMPTS) throw new Error('串流連線中斷，續傳失敗');
+
+    await new Promise(resolve => setTimeout(resolve, Math.min(500 * 2 ** attempts, 5000)));
+    attempts += 1;
+    current = null;
+    let resp;
+    try {
+      resp = await fetch(`${API_BASE}/run-streams/${state.streamId}`, {
+        headers: { 'Last-Event-ID': String(state.lastEventId) },
+        signal,
+      });
+    } catch (e) {
+      if (signal?.aborted) throw e;
+      continue;
+    }
+    if (resp.status === 404 || resp.status === 410) {
+      throw new Error(`串流已過期，無法續傳（HTTP ${resp.status}），請重新整理以載入對話紀錄`);
+    }
+    if (resp.ok) current = resp;
+  }
+}
+
 // ============================================================================
 // 文件類型常數
 // ============================================================================
@@ -164,7 +252,7 @@ export async function* sendMessage(message, sessionId, agentId = 'research-agent
   // 只附加圖片檔（文件已轉為文字）
   imageFiles.forEach(file => formData.append('files', file));
 
-  const response = await fetch(`${API_BASE}/agents/${agentId}/runs`, {
+  const response = await fetch(`${API_BASE}/agents/${agentId}/runs${STREAM_MODE_QUERY}`, {
     method: 'POST',
     body: formData,
     signal,
@@ -174,7 +262,7 @@ export async function* sendMessage(message, sessionId, agentId = 'research-agent
     throw new Error('HTTP error! status: ' + response.status);
   }
 
-  yield* parseSSEStream(response, signal);
+  yield* streamWithResume(response, signal);
 }
 
 // 串流傳送訊息（Team 模式），支援檔案上傳
@@ -199,11 +287,18 @@ export async function* sendTeamMessage(message, sessionId, signal, files = []) {
     signal,
   });
 
+  // 後端准入控制：同時執行 / 排隊人數已滿
+  if (response.status === 429) {
+    const body = await response.json().catch(() => ({}));
+    const eta = body.eta_seconds || response.headers.get('Retry-After');
+    throw new Error(`目前使用人數過多，請${eta ? `約 ${eta} 秒後` : '稍後'}再試`);
+  }
+
   if (!response.ok) {
     throw new Error('HTTP error! status: ' + response.status);
   }
 
-  yield* parseSSEStream(response, signal);
+  yield* streamWithResume(response, signal);
 }
 
 // 取得 Image Agent 的 Sessions（透過主後端 proxy）
@@ -2,6 +2,7 @@
 """Unpack and format XML contents of Office files (.docx, .pptx, .xlsx)"""
 
 import random
+import shutil
 import sys
 import defusedxml.minidom
 import zipfile
@@ -14,14 +15,25 @@ input_file, output_dir = sys.argv[1], sys.argv[2]
 # Extract and format
 output_path = Path(output_dir)
 output_path.mkdir(parents=True, exist_ok=True)
-zipfile.ZipFile(input_file).extractall(output_path)
+root = output_path.resolve()
 
-# Pretty print all XML files
-xml_files = list(output_path.rglob("*.xml")) + list(output_path.rglob("*.rels"))
-for xml_file in xml_files:
-    content = xml_file.read_text(encoding="utf-8")
-    dom = defusedxml.minidom.parseString(content)
-    xml_file.write_bytes(dom.toprettyxml(indent="  ", encoding="ascii"))
+# Each part is read once from the archive and written once: XML is pretty
+# printed in memory, everything else is streamed to disk as is
+with zipfile.ZipFile(input_file) as zf:
+    for info in zf.infolist():
+        if info.is_dir():
+            continue
+        target = (root / info.filename).resolve()
+        assert target.is_relative_to(root), f"Unsafe path in archive: {info.filename}"
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        # Pretty print all XML files
+        if target.suffix in {".xml", ".rels"} or target.name == ".rels":
+            dom = defusedxml.minidom.parseString(zf.read(info))
+            target.write_bytes(dom.toprettyxml(indent="  ", encoding="ascii"))
+        else:
+            with zf.open(info) as src, open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst)
 
 # For .docx files, suggest an RSID for tracked changes
 if input_file.endswith(".docx"):
@@ -2,11 +2,87 @@
 Base validator with common validation logic for document files.
 """
 
+import functools
+import hashlib
+import io
+import os
 import re
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 
 import lxml.etree
 
+# Compiled XSD schemas, shared by every validator in the process.
+# Keyed by (schema path, mtime) so an edited schema file is recompiled.
+_SCHEMA_CACHE = {}
+
+
+def load_schema(schema_path):
+    """Return the compiled XMLSchema for schema_path, compiling it on first use."""
+    schema_path = Path(schema_path)
+    key = (str(schema_path), schema_path.stat().st_mtime_ns)
+    schema = _SCHEMA_CACHE.get(key)
+    if schema is None:
+        with open(schema_path, "rb") as xsd_file:
+            parser = lxml.etree.XMLParser()
+            xsd_doc = lxml.etree.parse(
+                xsd_file, parser=parser, base_url=str(schema_path)
+            )
+        schema = lxml.etree.XMLSchema(xsd_doc)
+        # Drop entries for older versions of the same file
+        for stale in [k for k in _SCHEMA_CACHE if k[0] == key[0]]:
+            del _SCHEMA_CACHE[stale]
+        _SCHEMA_CACHE[key] = schema
+    return schema
+
+
+# Scan workers shared by every validator in the process. The pool lives as
+# long as the process (e.g. the whole validate.py --serve session), so the
+# schemas each worker compiles stay in that worker's _SCHEMA_CACHE.
+_scan_pool = None
+_scan_pool_workers = 0
+
+
+def _get_scan_pool(max_workers):
+    """Return the process-wide scan pool, starting it on first use."""
+    global _scan_pool, _scan_pool_workers
+    if _scan_pool is None or _scan_pool_workers != max_workers:
+        _discard_scan_pool()
+        _scan_pool = ProcessPoolExecutor(max_workers=max_workers)
+        _scan_pool_workers = max_workers
+    return _scan_pool
+
+
+def _discard_scan_pool():
+    """Shut the scan pool down; the next scan starts a new one."""
+    global _scan_pool
+    if _scan_pool is not None:
+        _scan_pool.shutdown(wait=False, cancel_futures=True)
+        _scan_pool = None
+
+
+# Validator for the scan a worker process is serving, and that scan's token.
+# A new token means a new validation, so nothing cached for an earlier one
+# (parsed trees, the open original archive) is reused.
+_worker_validator = None
+_worker_token = None
+
+
+def _scan_in_worker(token, validator_class, unpacked_dir, original_file, xml_file):
+    global _worker_validator, _worker_token
+    if _worker_token != token:
+        if _worker_validator is not None:
+            _worker_validator._close_original()
+        _worker_validator = validator_class(unpacked_dir, original_file)
+        _worker_token = token
+    report = _worker_validator._scan_file(xml_file)
+    # Trees are only needed while scanning their own file
+    _worker_validator._trees.clear()
+    return report
+
 
 class BaseSchemaValidator:
     """Base validator with common validation logic for document files."""
@@ -84,6 +160,11 @@ class BaseSchemaValidator:
     # Folders where we should clean ignorable namespaces
     MAIN_CONTENT_FOLDERS = {"word", "ppt", "xl"}
 
+    # Per-file checks run in a process pool once a document has this many
+    # XML parts; below that, starting the workers costs more than it saves
+    PARALLEL_MIN_FILES = 64
+    MAX_WORKERS = min(os.cpu_count() or 1, 8)
+
     # All allowed OOXML namespaces (superset of all document types)
     OOXML_NAMESPACES = {
         "http://schemas.openxmlformats.org/officeDocument/2006/math",
@@ -108,14 +189,24 @@ class BaseSchemaValidator:
         self.original_file = Path(original_file)
         self.verbose = verbose
 
+        # Original archive, opened once on first use (see _read_original_part)
+        self._original_zip = None
+        # Baseline XSD errors of original parts, memoized by content hash
+        self._original_errors_cache = {}
+
         # Set schemas directory
         self.schemas_dir = Path(__file__).parent.parent.parent / "schemas"
 
-        # Get all XML and .rels files
+        # Get all XML and .rels files, sorted so errors are reported in a stable order
         patterns = ["*.xml", "*.rels"]
-        self.xml_files = [
+        self.xml_files = sorted(
             f for pattern in patterns for f in self.unpacked_dir.rglob(pattern)
-        ]
+        )
+
+        # Parsed trees shared by all checks, and per-file scan results
+        # (see _get_tree and _scan)
+        self._trees = {}
+        self._reports = None
 
         if not self.xml_files:
             print(f"Warning: No XML files found in {self.unpacked_dir}")
@@ -128,19 +219,12 @@ class BaseSchemaValidator:
         """Validate that all XML files are well-formed."""
         errors = []
 
+        reports = self._scan()
         for xml_file in self.xml_files:
-            try:
-                # Try to parse the XML file
-                lxml.etree.parse(str(xml_file))
-            except lxml.etree.XMLSyntaxError as e:
-                errors.append(
-                    f"  {xml_file.relative_to(self.unpacked_dir)}: "
-                    f"Line {e.lineno}: {e.msg}"
-                )
-            except Exception as e:
+            syntax_error = reports[xml_file]["syntax_error"]
+            if syntax_error:
                 errors.append(
-                    f"  {xml_file.relative_to(self.unpacked_dir)}: "
-                    f"Unexpected error: {str(e)}"
+                    f"  {xml_file.relative_to(self.unpacked_dir)}: {syntax_error}"
                 )
 
         if errors:
@@ -157,22 +241,9 @@ class BaseSchemaValidator:
         """Validate that namespace prefixes in Ignorable attributes are declared."""
         errors = []
 
+        reports = self._scan()
         for xml_file in self.xml_files:
-            try:
-                root = lxml.etree.parse(str(xml_file)).getroot()
-                declared = set(root.nsmap.keys()) - {None}  # Exclude default namespace
-
-                for attr_val in [
-                    v for k, v in root.attrib.items() if k.endswith("Ignorable")
-                ]:
-                    undeclared = set(attr_val.split()) - declared
-                    errors.extend(
-                        f"  {xml_file.relative_to(self.unpacked_dir)}: "
-                        f"Namespace '{ns}' in Ignorable but not declared"
-                        for ns in undeclared
-                    )
-            except lxml.etree.XMLSyntaxError:
-                continue
+            errors.extend(reports[xml_file]["namespace_errors"])
 
         if errors:
             print(f"FAILED - {len(errors)} namespace issues:")
@@ -188,81 +259,26 @@ class BaseSchemaValidator:
         errors = []
         global_ids = {}  # Track globally unique IDs across all files
 
+        # File-scope IDs are checked per file during the scan; global IDs are
+        # merged here in file order
+        reports = self._scan()
         for xml_file in self.xml_files:
-            try:
-                root = lxml.etree.parse(str(xml_file)).getroot()
-                file_ids = {}  # Track IDs that must be unique within this file
+            relative_path = xml_file.relative_to(self.unpacked_dir)
+            for entry in reports[xml_file]["ids"]:
+                if entry[0] == "error":
+                    errors.append(entry[1])
+                    continue
 
-                # Remove all mc:AlternateContent elements from the tree
-                mc_elements = root.xpath(
-                    ".//mc:AlternateContent", namespaces={"mc": self.MC_NAMESPACE}
-                )
-                for elem in mc_elements:
-                    elem.getparent().remove(elem)
-
-                # Now check IDs in the cleaned tree
-                for elem in root.iter():
-                    # Get the element name without namespace
-                    tag = (
-                        elem.tag.split("}")[-1].lower()
-                        if "}" in elem.tag
-                        else elem.tag.lower()
+                _, id_value, line, tag = entry
+                if id_value in global_ids:
+                    prev_file, prev_line, prev_tag = global_ids[id_value]
+                    errors.append(
+                        f"  {relative_path}: "
+                        f"Line {line}: Global ID '{id_value}' in <{tag}> "
+                        f"already used in {prev_file} at line {prev_line} in <{prev_tag}>"
                     )
-
-                    # Check if this element type has ID uniqueness requirements
-                    if tag in self.UNIQUE_ID_REQUIREMENTS:
-                        attr_name, scope = self.UNIQUE_ID_REQUIREMENTS[tag]
-
-                        # Look for the specified attribute
-                        id_value = None
-                        for attr, value in elem.attrib.items():
-                            attr_local = (
-                                attr.split("}")[-1].lower()
-                                if "}" in attr
-                                else attr.lower()
-                            )
-                            if attr_local == attr_name:
-                                id_value = value
-                                break
-
-                        if id_value is not None:
-                            if scope == "global":
-                                # Check global uniqueness
-                                if id_value in global_ids:
-                                    prev_file, prev_line, prev_tag = global_ids[
-                                        id_value
-                                    ]
-                                    errors.append(
-                                        f"  {xml_file.relative_to(self.unpacked_dir)}: "
-                                        f"Line {elem.sourceline}: Global ID '{id_value}' in <{tag}> "
-                                        f"already used in {prev_file} at line {prev_line} in <{prev_tag}>"
-                                    )
-                                else:
-                                    global_ids[id_value] = (
-                                        xml_file.relative_to(self.unpacked_dir),
-                                        elem.sourceline,
-                                        tag,
-                                    )
-                            elif scope == "file":
-                                # Check file-level uniqueness
-                                key = (tag, attr_name)
-                                if key not in file_ids:
-                                    file_ids[key] = {}
-
-                                if id_value in file_ids[key]:
-                                    prev_line = file_ids[key][id_value]
-                                    errors.append(
-                                        f"  {xml_file.relative_to(self.unpacked_dir)}: "
-                                        f"Line {elem.sourceline}: Duplicate {attr_name}='{id_value}' in <{tag}> "
-                                        f"(first occurrence at line {prev_line})"
-                                    )
-                                else:
-                                    file_ids[key][id_value] = elem.sourceline
-
-            except (lxml.etree.XMLSyntaxError, Exception) as e:
-                errors.append(
-                    f"  {xml_file.relative_to(self.unpacked_dir)}: Error: {e}"
-                )
+                else:
+                    global_ids[id_value] = (relative_path, line, tag)
 
         if errors:
             print(f"FAILED - Found {len(errors)} ID uniqueness violations:")
@@ -281,7 +297,7 @@ class BaseSchemaValidator:
         errors = []
 
         # Find all .rels files
-        rels_files = list(self.unpacked_dir.rglob("*.rels"))
+        rels_files = [f for f in self.xml_files if f.name.endswith(".rels")]
 
         if not rels_files:
             if self.verbose:
@@ -307,59 +323,45 @@ class BaseSchemaValidator:
             )
 
         # Check each .rels file
+        reports = self._scan()
         for rels_file in rels_files:
-            try:
-                # Parse relationships file
-                rels_root = lxml.etree.parse(str(rels_file)).getroot()
-
-                # Get the directory where this .rels file is located
-                rels_dir = rels_file.parent
-
-                # Find all relationships and their targets
-                referenced_files = set()
-                broken_refs = []
+            rel_path = rels_file.relative_to(self.unpacked_dir)
+            report = reports[rels_file]
+            if report["parse_error"] is not None:
+                errors.append(f"  Error parsing {rel_path}: {report['parse_error']}")
+                continue
 
-                for rel in rels_root.findall(
-                    ".//ns:Relationship",
-                    namespaces={"ns": self.PACKAGE_RELATIONSHIPS_NAMESPACE},
-                ):
-                    target = rel.get("Target")
-                    if target and not target.startswith(
-                        ("http", "mailto:")
-                    ):  # Skip external URLs
-                        # Resolve the target path relative to the .rels file location
-                        if rels_file.name == ".rels":
-                            # Root .rels file - targets are relative to unpacked_dir
-                            target_path = self.unpacked_dir / target
+            # Get the directory where this .rels file is located
+            rels_dir = rels_file.parent
+
+            for _, _, target, line in report["relationships"]:
+                if target and not target.startswith(
+                    ("http", "mailto:")
+                ):  # Skip external URLs
+                    # Resolve the target path relative to the .rels file location
+                    if rels_file.name == ".rels":
+                        # Root .rels file - targets are relative to unpacked_dir
+                        target_path = self.unpacked_dir / target
+                    else:
+                        # Other .rels files - targets are relative to their parent's parent
+                        # e.g., word/_rels/document.xml.rels -> targets relative to word/
+                        base_dir = rels_dir.parent
+                        target_path = base_dir / target
+
+                    # Normalize the path and check if it exists
+                    try:
+                        target_path = target_path.resolve()
+                        if target_path.exists() and target_path.is_file():
+                            all_referenced_files.add(target_path)
                         else:
-                            # Other .rels files - targets are relative to their parent's parent
-                            # e.g., word/_rels/document.xml.rels -> targets relative to word/
-                            base_dir = rels_dir.parent
-                            target_path = base_dir / target
-
-                        # Normalize the path and check if it exists
-                        try:
-                            target_path = target_path.resolve()
-                            if target_path.exists() and target_path.is_file():
-                                referenced_files.add(target_path)
-                                all_referenced_files.add(target_path)
-                            else:
-                                broken_refs.append((target, rel.sourceline))
-                        except (OSError, ValueError):
-                            broken_refs.append((target, rel.sourceline))
-
-                # Report broken references
-                if broken_refs:
-                    rel_path = rels_file.relative_to(self.unpacked_dir)
-                    for broken_ref, line_num in broken_refs:
+                            errors.append(
+                                f"  {rel_path}: Line {line}: Broken reference to {target}"
+                            )
+                    except (OSError, ValueError):
                         errors.append(
-                            f"  {rel_path}: Line {line_num}: Broken reference to {broken_ref}"
+                            f"  {rel_path}: Line {line}: Broken reference to {target}"
                         )
 
-            except Exception as e:
-                rel_path = rels_file.relative_to(self.unpacked_dir)
-                errors.append(f"  Error parsing {rel_path}: {e}")
-
         # Check for unreferenced files (files that exist but are not referenced anywhere)
         unreferenced_files = set(all_files) - all_referenced_files
 
@@ -390,11 +392,10 @@ class BaseSchemaValidator:
         Validate that all r:id attributes in XML files reference existing IDs
         in their corresponding .rels files, and optionally validate relationship types.
         """
-        import lxml.etree
-
         errors = []
 
         # Process each XML file that might contain r:id references
+        reports = self._scan()
         for xml_file in self.xml_files:
             # Skip .rels files themselves
             if xml_file.suffix == ".rels":
@@ -406,71 +407,62 @@ class BaseSchemaValidator:
             rels_file = rels_dir / f"{xml_file.name}.rels"
 
             # Skip if there's no corresponding .rels file (that's okay)
-            if not rels_file.exists():
+            if rels_file not in reports:
                 continue
 
-            try:
-                # Parse the .rels file to get valid relationship IDs and their types
-                rels_root = lxml.etree.parse(str(rels_file)).getroot()
-                rid_to_type = {}
+            xml_rel_path = xml_file.relative_to(self.unpacked_dir)
+            rels_report = reports[rels_file]
+            if rels_report["parse_error"] is not None:
+                errors.append(
+                    f"  Error processing {xml_rel_path}: {rels_report['parse_error']}"
+                )
+                continue
 
-                for rel in rels_root.findall(
-                    f".//{{{self.PACKAGE_RELATIONSHIPS_NAMESPACE}}}Relationship"
-                ):
-                    rid = rel.get("Id")
-                    rel_type = rel.get("Type", "")
-                    if rid:
-                        # Check for duplicate rIds
-                        if rid in rid_to_type:
-                            rels_rel_path = rels_file.relative_to(self.unpacked_dir)
-                            errors.append(
-                                f"  {rels_rel_path}: Line {rel.sourceline}: "
-                                f"Duplicate relationship ID '{rid}' (IDs must be unique)"
-                            )
-                        # Extract just the type name from the full URL
-                        type_name = (
-                            rel_type.split("/")[-1] if "/" in rel_type else rel_type
-                        )
-                        rid_to_type[rid] = type_name
-
-                # Parse the XML file to find all r:id references
-                xml_root = lxml.etree.parse(str(xml_file)).getroot()
-
-                # Find all elements with r:id attributes
-                for elem in xml_root.iter():
-                    # Check for r:id attribute (relationship ID)
-                    rid_attr = elem.get(f"{{{self.OFFICE_RELATIONSHIPS_NAMESPACE}}}id")
-                    if rid_attr:
-                        xml_rel_path = xml_file.relative_to(self.unpacked_dir)
-                        elem_name = (
-                            elem.tag.split("}")[-1] if "}" in elem.tag else elem.tag
+            # Valid relationship IDs and their types
+            rid_to_type = {}
+            for rid, rel_type, _, line in rels_report["relationships"]:
+                if rid:
+                    # Check for duplicate rIds
+                    if rid in rid_to_type:
+                        rels_rel_path = rels_file.relative_to(self.unpacked_dir)
+                        errors.append(
+                            f"  {rels_rel_path}: Line {line}: "
+                            f"Duplicate relationship ID '{rid}' (IDs must be unique)"
                         )
+                    # Extract just the type name from the full URL
+                    type_name = (
+                        rel_type.split("/")[-1] if "/" in rel_type else rel_type
+                    )
+                    rid_to_type[rid] = type_name
+
+            report = reports[xml_file]
+            if report["parse_error"] is not None:
+                errors.append(
+                    f"  Error processing {xml_rel_path}: {report['parse_error']}"
+                )
+                continue
 
-                        # Check if the ID exists
-                        if rid_attr not in rid_to_type:
+            # All elements with r:id attributes
+            for line, elem_name, rid_attr in report["rid_refs"]:
+                # Check if the ID exists
+                if rid_attr not in rid_to_type:
+                    errors.append(
+                        f"  {xml_rel_path}: Line {line}: "
+                        f"<{elem_name}> references non-existent relationship '{rid_attr}' "
+                        f"(valid IDs: {', '.join(sorted(rid_to_type.keys())[:5])}{'...' if len(rid_to_type) > 5 else ''})"
+                    )
+                # Check if we have type expectations for this element
+                elif self.ELEMENT_RELATIONSHIP_TYPES:
+                    expected_type = self._get_expected_relationship_type(elem_name)
+                    if expected_type:
+                        actual_type = rid_to_type[rid_attr]
+                        # Check if the actual type matches or contains the expected type
+                        if expected_type not in actual_type.lower():
                             errors.append(
-                                f"  {xml_rel_path}: Line {elem.sourceline}: "
-                                f"<{elem_name}> references non-existent relationship '{rid_attr}' "
-                                f"(valid IDs: {', '.join(sorted(rid_to_type.keys())[:5])}{'...' if len(rid_to_type) > 5 else ''})"
-                            )
-                        # Check if we have type expectations for this element
-                        elif self.ELEMENT_RELATIONSHIP_TYPES:
-                            expected_type = self._get_expected_relationship_type(
-                                elem_name
+                                f"  {xml_rel_path}: Line {line}: "
+                                f"<{elem_name}> references '{rid_attr}' which points to '{actual_type}' "
+                                f"but should point to a '{expected_type}' relationship"
                             )
-                            if expected_type:
-                                actual_type = rid_to_type[rid_attr]
-                                # Check if the actual type matches or contains the expected type
-                                if expected_type not in actual_type.lower():
-                                    errors.append(
-                                        f"  {xml_rel_path}: Line {elem.sourceline}: "
-                                        f"<{elem_name}> references '{rid_attr}' which points to '{actual_type}' "
-                                        f"but should point to a '{expected_type}' relationship"
-                                    )
-
-            except Exception as e:
-                xml_rel_path = xml_file.relative_to(self.unpacked_dir)
-                errors.append(f"  Error processing {xml_rel_path}: {e}")
 
         if errors:
             print(f"FAILED - Found {len(errors)} relationship ID reference errors:")
@@ -531,7 +523,7 @@ class BaseSchemaValidator:
 
         try:
             # Parse and get all declared parts and extensions
-            root = lxml.etree.parse(str(content_types_file)).getroot()
+            root = self._get_tree(content_types_file).getroot()
             declared_parts = set()
             declared_extensions = set()
 
@@ -580,6 +572,7 @@ class BaseSchemaValidator:
             all_files = [f for f in all_files if f.is_file()]
 
             # Check all XML files for Override declarations
+            reports = self._scan()
             for xml_file in self.xml_files:
                 path_str = str(xml_file.relative_to(self.unpacked_dir)).replace(
                     "\\", "/"
@@ -592,18 +585,15 @@ class BaseSchemaValidator:
                 ):
                     continue
 
-                try:
-                    root_tag = lxml.etree.parse(str(xml_file)).getroot().tag
-                    root_name = root_tag.split("}")[-1] if "}" in root_tag else root_tag
-
-                    if root_name in declarable_roots and path_str not in declared_parts:
-                        errors.append(
-                            f"  {path_str}: File with <{root_name}> root not declared in [Content_Types].xml"
-                        )
-
-                except Exception:
+                root_name = reports[xml_file]["root_name"]
+                if root_name is None:
                     continue  # Skip unparseable files
 
+                if root_name in declarable_roots and path_str not in declared_parts:
+                    errors.append(
+                        f"  {path_str}: File with <{root_name}> root not declared in [Content_Types].xml"
+                    )
+
             # Check all non-XML files for Default extension declarations
             for file_path in all_files:
                 # Skip XML files and metadata files (already checked above)
@@ -638,6 +628,197 @@ class BaseSchemaValidator:
                 )
             return True
 
+    def _get_tree(self, xml_file):
+        """Parse an XML file once; later calls return the same tree.
+
+        The tree is shared by every check, so callers must not modify it.
+        Parse errors are cached too and raised again on every call.
+        """
+        key = Path(xml_file)
+        tree = self._trees.get(key)
+        if tree is None:
+            try:
+                tree = lxml.etree.parse(str(xml_file))
+            except Exception as e:
+                tree = e
+            self._trees[key] = tree
+        if isinstance(tree, Exception):
+            raise tree
+        return tree
+
+    def _scan(self):
+        """Run the per-file checks on every XML file, once per validator.
+
+        Files are scanned in the shared process pool for large documents.
+        Results keep the order of self.xml_files, and the checks that span files
+        (global IDs, relationship graph) merge them in that order.
+
+        Returns:
+            dict: xml_file -> report from _scan_file
+        """
+        if self._reports is None:
+            reports = None
+            if (
+                len(self.xml_files) >= self.PARALLEL_MIN_FILES
+                and self.MAX_WORKERS > 1
+            ):
+                scan = functools.partial(
+                    _scan_in_worker,
+                    uuid.uuid4().hex,
+                    type(self),
+                    self.unpacked_dir,
+                    self.original_file,
+                )
+                chunksize = max(1, len(self.xml_files) // (self.MAX_WORKERS * 4))
+                try:
+                    pool = _get_scan_pool(self.MAX_WORKERS)
+                    reports = list(pool.map(scan, self.xml_files, chunksize=chunksize))
+                except (OSError, BrokenProcessPool):
+                    # No usable worker processes; scan in-process
+                    _discard_scan_pool()
+                    reports = None
+
+            if reports is None:
+                reports = [self._scan_file(xml_file) for xml_file in self.xml_files]
+            self._reports = dict(zip(self.xml_files, reports))
+        return self._reports
+
+    def _scan_file(self, xml_file):
+        """Run every per-file check on one XML file, parsing it only once.
+
+        Returns a picklable report so files can be scanned in worker processes:
+            syntax_error: well-formedness error message, or None
+            parse_error: parse exception message, or None
+            namespace_errors: undeclared Ignorable prefixes
+            ids: file-scope ID errors as ("error", message) and global-scope
+                IDs as ("global", id, line, tag), in document order
+            relationships: (Id, Type, Target, line) for .rels files
+            rid_refs: (line, element name, r:id) for other files
+            root_name: local name of the root element
+            xsd: (is_valid, new_errors, unchanged) from _check_file_against_xsd
+        """
+        relative_path = xml_file.relative_to(self.unpacked_dir)
+        report = {
+            "syntax_error": None,
+            "parse_error": None,
+            "namespace_errors": [],
+            "ids": [],
+            "relationships": [],
+            "rid_refs": [],
+            "root_name": None,
+            "xsd": self._check_file_against_xsd(xml_file),
+        }
+
+        try:
+            root = self._get_tree(xml_file).getroot()
+        except lxml.etree.XMLSyntaxError as e:
+            report["syntax_error"] = f"Line {e.lineno}: {e.msg}"
+            report["parse_error"] = str(e)
+            report["ids"].append(("error", f"  {relative_path}: Error: {e}"))
+            return report
+        except Exception as e:
+            report["syntax_error"] = f"Unexpected error: {str(e)}"
+            report["parse_error"] = str(e)
+            report["ids"].append(("error", f"  {relative_path}: Error: {e}"))
+            return report
+
+        root_tag = root.tag
+        report["root_name"] = root_tag.split("}")[-1] if "}" in root_tag else root_tag
+
+        # Namespace prefixes in Ignorable attributes must be declared
+        declared = set(root.nsmap.keys()) - {None}  # Exclude default namespace
+        for attr_val in [v for k, v in root.attrib.items() if k.endswith("Ignorable")]:
+            undeclared = set(attr_val.split()) - declared
+            report["namespace_errors"].extend(
+                f"  {relative_path}: "
+                f"Namespace '{ns}' in Ignorable but not declared"
+                for ns in undeclared
+            )
+
+        report["ids"] = self._scan_unique_ids(root, relative_path)
+
+        if xml_file.name.endswith(".rels"):
+            for rel in root.findall(
+                f".//{{{self.PACKAGE_RELATIONSHIPS_NAMESPACE}}}Relationship"
+            ):
+                report["relationships"].append(
+                    (rel.get("Id"), rel.get("Type", ""), rel.get("Target"), rel.sourceline)
+                )
+        else:
+            for elem in root.iter():
+                # Check for r:id attribute (relationship ID)
+                rid_attr = elem.get(f"{{{self.OFFICE_RELATIONSHIPS_NAMESPACE}}}id")
+                if rid_attr:
+                    elem_name = elem.tag.split("}")[-1] if "}" in elem.tag else elem.tag
+                    report["rid_refs"].append((elem.sourceline, elem_name, rid_attr))
+
+        return report
+
+    def _scan_unique_ids(self, root, relative_path):
+        """Check file-scope IDs in one tree and collect its global-scope IDs."""
+        entries = []
+        file_ids = {}  # Track IDs that must be unique within this file
+        alternate_content = f"{{{self.MC_NAMESPACE}}}AlternateContent"
+
+        try:
+            # Walk the tree in document order, skipping mc:AlternateContent
+            # subtrees (the shared tree must not be modified)
+            stack = [root]
+            while stack:
+                elem = stack.pop()
+                stack.extend(
+                    child for child in reversed(elem) if child.tag != alternate_content
+                )
+
+                # Get the element name without namespace
+                tag = (
+                    elem.tag.split("}")[-1].lower()
+                    if "}" in elem.tag
+                    else elem.tag.lower()
+                )
+
+                # Check if this element type has ID uniqueness requirements
+                if tag not in self.UNIQUE_ID_REQUIREMENTS:
+                    continue
+                attr_name, scope = self.UNIQUE_ID_REQUIREMENTS[tag]
+
+                # Look for the specified attribute
+                id_value = None
+                for attr, value in elem.attrib.items():
+                    attr_local = (
+                        attr.split("}")[-1].lower() if "}" in attr else attr.lower()
+                    )
+                    if attr_local == attr_name:
+                        id_value = value
+                        break
+
+                if id_value is None:
+                    continue
+                if scope == "global":
+                    # Checked across files in validate_unique_ids
+                    entries.append(("global", id_value, elem.sourceline, tag))
+                elif scope == "file":
+                    # Check file-level uniqueness
+                    key = (tag, attr_name)
+                    if key not in file_ids:
+                        file_ids[key] = {}
+
+                    if id_value in file_ids[key]:
+                        prev_line = file_ids[key][id_value]
+                        entries.append((
+                            "error",
+                            f"  {relative_path}: "
+                            f"Line {elem.sourceline}: Duplicate {attr_name}='{id_value}' in <{tag}> "
+                            f"(first occurrence at line {prev_line})",
+                        ))
+                    else:
+                        file_ids[key][id_value] = elem.sourceline
+
+        except Exception as e:
+            entries.append(("error", f"  {relative_path}: Error: {e}"))
+
+        return entries
+
     def validate_file_against_xsd(self, xml_file, verbose=False):
         """Validate a single XML file against XSD schema, comparing with original.
 
@@ -648,79 +829,69 @@ class BaseSchemaValidator:
         Returns:
             tuple: (is_valid, new_errors_set) where is_valid is True/False/None (skipped)
         """
-        # Resolve both paths to handle symlinks
-        xml_file = Path(xml_file).resolve()
-        unpacked_dir = self.unpacked_dir.resolve()
+        is_valid, new_errors, unchanged = self._check_file_against_xsd(xml_file)
 
-        # Validate current file
-        is_valid, current_errors = self._validate_single_file_xsd(
-            xml_file, unpacked_dir
-        )
-
-        if is_valid is None:
-            return None, set()  # Skipped
-        elif is_valid:
-            return True, set()  # Valid, no errors
-
-        # Get errors from original file for this specific file
-        original_errors = self._get_original_file_errors(xml_file)
-
-        # Compare with original (both are guaranteed to be sets here)
-        assert current_errors is not None
-        new_errors = current_errors - original_errors
-
-        if new_errors:
-            if verbose:
-                relative_path = xml_file.relative_to(unpacked_dir)
+        if verbose and is_valid is not None:
+            relative_path = Path(xml_file).resolve().relative_to(self.unpacked_dir)
+            if unchanged:
+                print(f"PASSED - {relative_path} is unchanged from original")
+            elif new_errors:
                 print(f"FAILED - {relative_path}: {len(new_errors)} new error(s)")
-                for error in list(new_errors)[:3]:
+                for error in sorted(new_errors)[:3]:
                     truncated = error[:250] + "..." if len(error) > 250 else error
                     print(f"  - {truncated}")
-            return False, new_errors
-        else:
-            # All errors existed in original
-            if verbose:
-                print(
-                    f"PASSED - No new errors (original had {len(current_errors)} errors)"
-                )
-            return True, set()
+            else:
+                print(f"PASSED - {relative_path}: no new errors")
+
+        return is_valid, new_errors or set()
 
     def validate_against_xsd(self):
         """Validate XML files against XSD schemas, showing only new errors compared to original."""
         new_errors = []
         original_error_count = 0
         valid_count = 0
+        unchanged_count = 0
         skipped_count = 0
 
-        for xml_file in self.xml_files:
-            relative_path = str(xml_file.relative_to(self.unpacked_dir))
-            is_valid, new_file_errors = self.validate_file_against_xsd(
-                xml_file, verbose=False
-            )
+        try:
+            reports = self._scan()
+            for xml_file in self.xml_files:
+                relative_path = str(xml_file.relative_to(self.unpacked_dir))
+                is_valid, new_file_errors, unchanged = reports[xml_file]["xsd"]
 
-            if is_valid is None:
-                skipped_count += 1
-                continue
-            elif is_valid and not new_file_errors:
-                valid_count += 1
-                continue
-            elif is_valid:
-                # Had errors but all existed in original
-                original_error_count += 1
-                valid_count += 1
-                continue
+                if is_valid is None:
+                    skipped_count += 1
+                    continue
+                elif unchanged:
+                    unchanged_count += 1
+                    valid_count += 1
+                    continue
+                elif is_valid and new_file_errors is None:
+                    # Had errors but all existed in original
+                    original_error_count += 1
+                    valid_count += 1
+                    continue
+                elif is_valid:
+                    valid_count += 1
+                    continue
 
-            # Has new errors
-            new_errors.append(f"  {relative_path}: {len(new_file_errors)} new error(s)")
-            for error in list(new_file_errors)[:3]:  # Show first 3 errors
+                # Has new errors
                 new_errors.append(
-                    f"    - {error[:250]}..." if len(error) > 250 else f"    - {error}"
+                    f"  {relative_path}: {len(new_file_errors)} new error(s)"
                 )
+                for error in sorted(new_file_errors)[:3]:  # Show first 3 errors
+                    new_errors.append(
+                        f"    - {error[:250]}..." if len(error) > 250 else f"    - {error}"
+                    )
+        finally:
+            self._close_original()
 
         # Print summary
         if self.verbose:
             print(f"Validated {len(self.xml_files)} files:")
             print(f"  - Valid: {valid_count}")
+            if unchanged_count:
+                print(f"  - Unchanged from original (not re-validated): {unchanged_count}")
             print(f"  - Skipped (no schema): {skipped_count}")
             if original_error_count:
                 print(f"  - With original errors (ignored): {original_error_count}")
@@ -738,6 +909,75 @@ class BaseSchemaValidator:
                 print("\nPASSED - No new XSD validation errors introduced")
             return True
 
+    def _check_file_against_xsd(self, xml_file):
+        """Validate one part, comparing with the same part in the original file.
+
+        Parts that are byte-identical to the original cannot introduce new
+        errors and are not validated at all.
+
+        Returns:
+            tuple: (is_valid, new_errors, unchanged). is_valid is None when the
+            part has no schema; new_errors is None when the part has errors
+            that all existed in the original.
+        """
+        # Resolve both paths to handle symlinks
+        xml_file = Path(xml_file).resolve()
+        if not self._get_schema_path(xml_file):
+            return None, set(), False
+
+        relative_path = xml_file.relative_to(self.unpacked_dir)
+        content = xml_file.read_bytes()
+        if self._matches_original(relative_path, content):
+            return True, set(), True
+
+        is_valid, current_errors = self._validate_single_file_xsd(
+            xml_file, self.unpacked_dir
+        )
+        if is_valid:
+            return True, set(), False
+
+        # Compare with original (both are guaranteed to be sets here)
+        assert current_errors is not None
+        new_errors = current_errors - self._get_original_file_errors(xml_file)
+        if new_errors:
+            return False, new_errors, False
+        return True, None, False
+
+    def _original_part_info(self, relative_path):
+        """Return the ZipInfo of a part in the original file, or None if absent."""
+        if self._original_zip is None:
+            self._original_zip = zipfile.ZipFile(self.original_file, "r")
+        try:
+            return self._original_zip.getinfo(Path(relative_path).as_posix())
+        except KeyError:
+            return None
+
+    def _read_original_part(self, relative_path):
+        """Return the bytes of a part in the original file, or None if absent."""
+        info = self._original_part_info(relative_path)
+        if info is None:
+            return None
+        return self._original_zip.read(info)
+
+    def _matches_original(self, relative_path, content):
+        """Check whether a part is byte-identical to the same part in the original."""
+        info = self._original_part_info(relative_path)
+        # Size and CRC come from the zip directory, so most edited parts are
+        # told apart without decompressing anything
+        if (
+            info is None
+            or info.file_size != len(content)
+            or info.CRC != zipfile.crc32(content)
+        ):
+            return False
+        return self._original_zip.read(info) == content
+
+    def _close_original(self):
+        """Close the original archive; it is reopened on next use."""
+        if self._original_zip is not None:
+            self._original_zip.close()
+            self._original_zip = None
+
     def _get_schema_path(self, xml_file):
         """Determine the appropriate schema path for an XML file."""
         # Check exact filename match
@@ -823,24 +1063,26 @@ class BaseSchemaValidator:
 
         return xml_doc
 
-    def _validate_single_file_xsd(self, xml_file, base_path):
-        """Validate a single XML file against XSD schema. Returns (is_valid, errors_set)."""
+    def _validate_single_file_xsd(self, xml_file, base_path, content=None):
+        """Validate a single XML file against XSD schema. Returns (is_valid, errors_set).
+
+        When content is given it is validated in place of the file's bytes;
+        xml_file is then only used to pick the schema. Otherwise the file's
+        shared tree is used (it is copied before preprocessing).
+        """
         schema_path = self._get_schema_path(xml_file)
         if not schema_path:
             return None, None  # Skip file
 
         try:
-            # Load schema
-            with open(schema_path, "rb") as xsd_file:
-                parser = lxml.etree.XMLParser()
-                xsd_doc = lxml.etree.parse(
-                    xsd_file, parser=parser, base_url=str(schema_path)
-                )
-                schema = lxml.etree.XMLSchema(xsd_doc)
+            # Load schema (compiled once per process)
+            schema = load_schema(schema_path)
 
             # Load and preprocess XML
-            with open(xml_file, "r") as f:
-                xml_doc = lxml.etree.parse(f)
+            if content is None:
+                xml_doc = self._get_tree(xml_file)
+            else:
+                xml_doc = lxml.etree.parse(io.BytesIO(content))
 
             xml_doc, _ = self._remove_template_tags_from_text_nodes(xml_doc)
             xml_doc = self._preprocess_for_mc_ignorable(xml_doc)
@@ -869,39 +1111,36 @@ class BaseSchemaValidator:
     def _get_original_file_errors(self, xml_file):
         """Get XSD validation errors from a single file in the original document.
 
+        Reads the part straight from the original archive; results are memoized
+        by content hash, so identical parts are validated only once.
+
         Args:
             xml_file: Path to the XML file in unpacked_dir to check
 
         Returns:
             set: Set of error messages from the original file
         """
-        import tempfile
-        import zipfile
-
         # Resolve both paths to handle symlinks (e.g., /var vs /private/var on macOS)
         xml_file = Path(xml_file).resolve()
-        unpacked_dir = self.unpacked_dir.resolve()
-        relative_path = xml_file.relative_to(unpacked_dir)
-
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_path = Path(temp_dir)
-
-            # Extract original file
-            with zipfile.ZipFile(self.original_file, "r") as zip_ref:
-                zip_ref.extractall(temp_path)
-
-            # Find corresponding file in original
-            original_xml_file = temp_path / relative_path
-
-            if not original_xml_file.exists():
-                # File didn't exist in original, so no original errors
-                return set()
-
-            # Validate the specific file in original
+        relative_path = xml_file.relative_to(self.unpacked_dir)
+
+        original_content = self._read_original_part(relative_path)
+        if original_content is None:
+            # File didn't exist in original, so no original errors
+            return set()
+
+        # Schema and namespace cleaning depend on where the part lives
+        key = (
+            hashlib.sha256(original_content).hexdigest(),
+            self._get_schema_path(xml_file),
+            relative_path.parts[0] in self.MAIN_CONTENT_FOLDERS,
+        )
+        if key not in self._original_errors_cache:
             is_valid, errors = self._validate_single_file_xsd(
-                original_xml_file, temp_path
+                xml_file, self.unpacked_dir, content=original_content
             )
-            return errors if errors else set()
+            self._original_errors_cache[key] = errors if errors else set()
+        return self._original_errors_cache[key]
 
     def _remove_template_tags_from_text_nodes(self, xml_doc):
         """Remove template tags from XML text nodes and collect warnings.
@@ -2,11 +2,14 @@
 Validator for tracked changes in Word documents.
 """
 
-import subprocess
-import tempfile
+import re
+import xml.etree.ElementTree as ET
 import zipfile
 from pathlib import Path
 
+# Edit distance beyond which a diff falls back to coarser tokens
+MAX_DIFF_EDITS = 2000
+
 
 class RedliningValidator:
     """Validator for tracked changes in Word documents."""
@@ -16,7 +19,8 @@ class RedliningValidator:
         self.original_docx = Path(original_docx)
         self.verbose = verbose
         self.namespaces = {
-            "w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+            "w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main",
+            "w14": "http://schemas.microsoft.com/office/word/2010/wordml",
         }
 
     def validate(self):
@@ -27,92 +31,63 @@ class RedliningValidator:
             print(f"FAILED - Modified document.xml not found at {modified_file}")
             return False
 
-        # First, check if there are any tracked changes by Claude to validate
         try:
-            import xml.etree.ElementTree as ET
-
-            tree = ET.parse(modified_file)
-            root = tree.getroot()
-
-            # Check for w:del or w:ins tags authored by Claude
-            del_elements = root.findall(".//w:del", self.namespaces)
-            ins_elements = root.findall(".//w:ins", self.namespaces)
-
-            # Filter to only include changes by Claude
-            claude_del_elements = [
-                elem
-                for elem in del_elements
-                if elem.get(f"{{{self.namespaces['w']}}}author") == "Claude"
-            ]
-            claude_ins_elements = [
-                elem
-                for elem in ins_elements
-                if elem.get(f"{{{self.namespaces['w']}}}author") == "Claude"
-            ]
-
-            # Redlining validation is only needed if tracked changes by Claude have been used.
-            if not claude_del_elements and not claude_ins_elements:
-                if self.verbose:
-                    print("PASSED - No tracked changes by Claude found.")
-                return True
-
-        except Exception:
-            # If we can't parse the XML, continue with full validation
-            pass
-
-        # Create temporary directory for unpacking original docx
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_path = Path(temp_dir)
-
-            # Unpack original docx
-            try:
-                with zipfile.ZipFile(self.original_docx, "r") as zip_ref:
-                    zip_ref.extractall(temp_path)
-            except Exception as e:
-                print(f"FAILED - Error unpacking original docx: {e}")
-                return False
-
-            original_file = temp_path / "word" / "document.xml"
-            if not original_file.exists():
-                print(
-                    f"FAILED - Original document.xml not found in {self.original_docx}"
-                )
-                return False
-
-            # Parse both XML files using xml.etree.ElementTree for redlining validation
-            try:
-                import xml.etree.ElementTree as ET
-
-                modified_tree = ET.parse(modified_file)
-                modified_root = modified_tree.getroot()
-                original_tree = ET.parse(original_file)
-                original_root = original_tree.getroot()
-            except ET.ParseError as e:
-                print(f"FAILED - Error parsing XML files: {e}")
-                return False
-
-            # Remove Claude's tracked changes from both documents
-            self._remove_claude_tracked_changes(original_root)
-            self._remove_claude_tracked_changes(modified_root)
-
-            # Extract and compare text content
-            modified_text = self._extract_text_content(modified_root)
-            original_text = self._extract_text_content(original_root)
-
-            if modified_text != original_text:
-                # Show detailed character-level differences for each paragraph
-                error_message = self._generate_detailed_diff(
-                    original_text, modified_text
-                )
-                print(error_message)
-                return False
+            modified_root = ET.parse(modified_file).getroot()
+        except ET.ParseError as e:
+            print(f"FAILED - Error parsing XML files: {e}")
+            return False
+
+        # Check for w:del or w:ins tags authored by Claude
+        author_attr = f"{{{self.namespaces['w']}}}author"
+        claude_changes = [
+            elem
+            for tag in ("del", "ins")
+            for elem in modified_root.iter(f"{{{self.namespaces['w']}}}{tag}")
+            if elem.get(author_attr) == "Claude"
+        ]
 
+        # Redlining validation is only needed if tracked changes by Claude have been used.
+        if not claude_changes:
             if self.verbose:
-                print("PASSED - All changes by Claude are properly tracked")
+                print("PASSED - No tracked changes by Claude found.")
             return True
 
-    def _generate_detailed_diff(self, original_text, modified_text):
-        """Generate detailed word-level differences using git word diff."""
+        # Read the original document.xml straight from the archive
+        try:
+            with zipfile.ZipFile(self.original_docx, "r") as zip_ref:
+                original_xml = zip_ref.read("word/document.xml")
+        except KeyError:
+            print(f"FAILED - Original document.xml not found in {self.original_docx}")
+            return False
+        except Exception as e:
+            print(f"FAILED - Error reading original docx: {e}")
+            return False
+
+        try:
+            original_root = ET.fromstring(original_xml)
+        except ET.ParseError as e:
+            print(f"FAILED - Error parsing XML files: {e}")
+            return False
+
+        # Remove Claude's tracked changes from both documents
+        self._remove_claude_tracked_changes(original_root)
+        self._remove_claude_tracked_changes(modified_root)
+
+        # Align paragraphs and compare only the spans that differ
+        changes = _paragraph_changes(
+            self._extract_paragraphs(original_root),
+            self._extract_paragraphs(modified_root),
+        )
+        if changes:
+            print(self._generate_detailed_diff(changes))
+            return False
+
+        if self.verbose:
+            print("PASSED - All changes by Claude are properly tracked")
+        return True
+
+    def _generate_detailed_diff(self, changes):
+        """Generate per-paragraph character-level differences."""
         error_parts = [
             "FAILED - Document text doesn't match after removing Claude's tracked changes",
             "",
@@ -125,95 +100,24 @@ class RedliningValidator:
             "  - To reject another's INSERTION: Nest <w:del> inside their <w:ins>",
             "  - To restore another's DELETION: Add new <w:ins> AFTER their <w:del>",
             "",
+            f"Differences ({len(changes)} paragraph(s)):",
+            "============",
         ]
 
-        # Show git word diff
-        git_diff = self._get_git_word_diff(original_text, modified_text)
-        if git_diff:
-            error_parts.extend(["Differences:", "============", git_diff])
-        else:
-            error_parts.append("Unable to generate word diff (git not available)")
+        for original, modified in changes:
+            if modified is None:
+                label = f"Paragraph {original[0]} of the original"
+                diff = _inline_diff(original[2], "")
+            else:
+                label = f"Paragraph {modified[0]}"
+                diff = _inline_diff(original[2] if original else "", modified[2])
+            para_id = (modified or original)[1]
+            if para_id:
+                label += f" (w14:paraId={para_id})"
+            error_parts.append(f"{label}: {diff}")
 
         return "\n".join(error_parts)
 
-    def _get_git_word_diff(self, original_text, modified_text):
-        """Generate word diff using git with character-level precision."""
-        try:
-            with tempfile.TemporaryDirectory() as temp_dir:
-                temp_path = Path(temp_dir)
-
-                # Create two files
-                original_file = temp_path / "original.txt"
-                modified_file = temp_path / "modified.txt"
-
-                original_file.write_text(original_text, encoding="utf-8")
-                modified_file.write_text(modified_text, encoding="utf-8")
-
-                # Try character-level diff first for precise differences
-                result = subprocess.run(
-                    [
-                        "git",
-                        "diff",
-                        "--word-diff=plain",
-                        "--word-diff-regex=.",  # Character-by-character diff
-                        "-U0",  # Zero lines of context - show only changed lines
-                        "--no-index",
-                        str(original_file),
-                        str(modified_file),
-                    ],
-                    capture_output=True,
-                    text=True,
-                )
-
-                if result.stdout.strip():
-                    # Clean up the output - remove git diff header lines
-                    lines = result.stdout.split("\n")
-                    # Skip the header lines (diff --git, index, +++, ---, @@)
-                    content_lines = []
-                    in_content = False
-                    for line in lines:
-                        if line.startswith("@@"):
-                            in_content = True
-                            continue
-                        if in_content and line.strip():
-                            content_lines.append(line)
-
-                    if content_lines:
-                        return "\n".join(content_lines)
-
-                # Fallback to word-level diff if character-level is too verbose
-                result = subprocess.run(
-                    [
-                        "git",
-                        "diff",
-                        "--word-diff=plain",
-                        "-U0",  # Zero lines of context
-                        "--no-index",
-                        str(original_file),
-                        str(modified_file),
-                    ],
-                    capture_output=True,
-                    text=True,
-                )
-
-                if result.stdout.strip():
-                    lines = result.stdout.split("\n")
-                    content_lines = []
-                    in_content = False
-                    for line in lines:
-                        if line.startswith("@@"):
-                            in_content = True
-                            continue
-                        if in_content and line.strip():
-                            content_lines.append(line)
-                    return "\n".join(content_lines)
-
-        except (subprocess.CalledProcessError, FileNotFoundError, Exception):
-            # Git not available or other error, return None to use fallback
-            pass
-
-        return None
-
     def _remove_claude_tracked_changes(self, root):
         """Remove tracked changes authored by Claude from the XML root."""
         ins_tag = f"{{{self.namespaces['w']}}}ins"
@@ -235,9 +139,9 @@ class RedliningValidator:
 
         for parent in root.iter():
             to_process = []
-            for child in parent:
+            for index, child in enumerate(parent):
                 if child.tag == del_tag and child.get(author_attr) == "Claude":
-                    to_process.append((child, list(parent).index(child)))
+                    to_process.append((child, index))
 
             # Process in reverse order to maintain indices
             for del_elem, del_index in reversed(to_process):
@@ -251,28 +155,199 @@ class RedliningValidator:
                     parent.insert(del_index, child)
                 parent.remove(del_elem)
 
-    def _extract_text_content(self, root):
-        """Extract text content from Word XML, preserving paragraph structure.
+    def _extract_paragraphs(self, root):
+        """Extract (number, paraId, text) for each paragraph in the document.
 
-        Empty paragraphs are skipped to avoid false positives when tracked
-        insertions add only structural elements without text content.
+        Paragraphs are numbered from 1 in document order. Empty paragraphs
+        are skipped to avoid false positives when tracked insertions add only
+        structural elements without text content.
         """
         p_tag = f"{{{self.namespaces['w']}}}p"
         t_tag = f"{{{self.namespaces['w']}}}t"
+        para_id_attr = f"{{{self.namespaces['w14']}}}paraId"
 
         paragraphs = []
-        for p_elem in root.findall(f".//{p_tag}"):
+        for number, p_elem in enumerate(root.iter(p_tag), 1):
             # Get all text elements within this paragraph
             text_parts = []
-            for t_elem in p_elem.findall(f".//{t_tag}"):
+            for t_elem in p_elem.iter(t_tag):
                 if t_elem.text:
                     text_parts.append(t_elem.text)
             paragraph_text = "".join(text_parts)
             # Skip empty paragraphs - they don't affect content validation
             if paragraph_text:
-                paragraphs.append(paragraph_text)
-
-        return "\n".join(paragraphs)
+                paragraphs.append((number, p_elem.get(para_id_attr), paragraph_text))
+
+        return paragraphs
+
+
+def _paragraph_changes(original, modified):
+    """
+    Find the paragraphs whose text differs between two documents.
+
+    Paragraphs are aligned by text with a Myers diff, so identical runs
+    (including the common prefix and suffix) cost one comparison each. Within
+    a run of differing paragraphs, a removed and an added paragraph sharing a
+    w14:paraId are paired as an edit of the same paragraph; the rest pair up
+    in order, and any surplus are reported as removed or added.
+
+    Returns:
+        list of (original, modified) paragraph tuples from _extract_paragraphs,
+        with None for a paragraph that is missing on one side
+    """
+    ops = _diff(
+        [paragraph[2] for paragraph in original],
+        [paragraph[2] for paragraph in modified],
+        MAX_DIFF_EDITS,
+    )
+    if ops is None:
+        ops = [("-", None)] * len(original) + [("+", None)] * len(modified)
+
+    changes = []
+    removed, added = [], []
+    i = j = 0
+    for op, _ in ops + [("=", None)]:
+        if op == "-":
+            removed.append(original[i])
+            i += 1
+        elif op == "+":
+            added.append(modified[j])
+            j += 1
+        else:
+            if removed or added:
+                changes.extend(_pair_paragraphs(removed, added))
+                removed, added = [], []
+            i += 1
+            j += 1
+    return changes
+
+
+def _pair_paragraphs(removed, added):
+    """Pair removed and added paragraphs by w14:paraId, then by position."""
+    added_by_id = {paragraph[1]: paragraph for paragraph in added if paragraph[1]}
+    pairs = []
+    unpaired = []
+    for original in removed:
+        modified = added_by_id.pop(original[1], None) if original[1] else None
+        if modified is None:
+            unpaired.append(original)
+        else:
+            pairs.append((original, modified))
+
+    paired = {id(modified) for _, modified in pairs}
+    remaining = [paragraph for paragraph in added if id(paragraph) not in paired]
+    for index in range(max(len(unpaired), len(remaining))):
+        pairs.append(
+            (
+                unpaired[index] if index < len(unpaired) else None,
+                remaining[index] if index < len(remaining) else None,
+            )
+        )
+    return pairs
+
+
+def _inline_diff(old, new):
+    """Render old -> new with [-removed-] and {+added+} markers."""
+    ops = _diff(old, new, MAX_DIFF_EDITS)
+    if ops is None:
+        old_words = re.findall(r"\s+|\S+", old)
+        new_words = re.findall(r"\s+|\S+", new)
+        ops = _diff(old_words, new_words, MAX_DIFF_EDITS)
+    if ops is None:
+        ops = [("-", old), ("+", new)]
+
+    parts = []
+    removed, added = [], []
+    for op, token in ops + [("=", "")]:
+        if op == "-":
+            removed.append(token)
+        elif op == "+":
+            added.append(token)
+        else:
+            parts.append(_mark("[-", "".join(removed), "-]"))
+            parts.append(_mark("{+", "".join(added), "+}"))
+            parts.append(token)
+            removed, added = [], []
+    return "".join(parts)
+
+
+def _mark(start, text, end):
+    """Wrap each line of text in markers so no marker spans a line break."""
+    return "\n".join(start + part + end if part else "" for part in text.split("\n"))
+
+
+def _diff(a, b, max_edits):
+    """
+    Shortest edit script from sequence a to b (Myers' O((N+M)D) algorithm).
+
+    The common prefix and suffix are trimmed first, so the cost depends on
+    the size of the change rather than of the inputs.
+
+    Returns:
+        list of (op, item) with op "=", "-" (item of a) or "+" (item of b),
+        or None if more than max_edits insertions and deletions are needed
+    """
+    n, m = len(a), len(b)
+    prefix = 0
+    while prefix < n and prefix < m and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < n - prefix
+        and suffix < m - prefix
+        and a[n - 1 - suffix] == b[m - 1 - suffix]
+    ):
+        suffix += 1
+    head = [("=", item) for item in a[:prefix]]
+    tail = [("=", item) for item in a[n - suffix :]]
+    a, b = a[prefix : n - suffix], b[prefix : m - suffix]
+    n, m = len(a), len(b)
+
+    # Forward pass: v[k] is the furthest x reached on diagonal k = x - y
+    v = {1: 0}
+    trace = []
+    for d in range(min(n + m, max_edits) + 1):
+        trace.append(v.copy())
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                return head + _backtrack(a, b, trace) + tail
+    return None
+
+
+def _backtrack(a, b, trace):
+    """Recover the edit script from the forward pass of _diff."""
+    ops = []
+    x, y = len(a), len(b)
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1] < v[k + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            ops.append(("=", a[x]))
+        if d > 0:
+            if x == prev_x:
+                ops.append(("+", b[prev_y]))
+            else:
+                ops.append(("-", a[prev_x]))
+        x, y = prev_x, prev_y
+    ops.reverse()
+    return ops
 
 
 if __name__ == "__main__":
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Benchmark XMLEditor against the previous minidom-based implementation.
+
+Generates a synthetic document.xml with the given number of paragraphs and
+measures parse time, peak parse memory, get_node lookups (by attribute, line
+and text) and save time.
+
+Usage:
+    python scripts/benchmark_editor.py [--paragraphs 5000] [--lookups 50]
+"""
+
+import argparse
+import html
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from utilities import XMLEditor
+
+W_NAMESPACE = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+W14_NAMESPACE = "http://schemas.microsoft.com/office/word/2010/wordml"
+
+
+def write_document(path, paragraphs):
+    """Write a pretty-printed document.xml with one paragraph per 6 lines."""
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>',
+        f'<w:document xmlns:w="{W_NAMESPACE}" xmlns:w14="{W14_NAMESPACE}">',
+        "  <w:body>",
+    ]
+    for i in range(paragraphs):
+        lines += [
+            f'    <w:p w14:paraId="{i:08X}">',
+            f'      <w:r w:rsidR="00A{i % 1000:05d}">',
+            "        <w:rPr><w:b/></w:rPr>",
+            f"        <w:t>Paragraph {i} &#8220;quoted&#8221; text</w:t>",
+            "      </w:r>",
+            "    </w:p>",
+        ]
+    lines += ["  </w:body>", "</w:document>"]
+    path.write_text("\n".join(lines), encoding="utf-8")
+
+
+def _parse_minidom(xml_path):
+    """Parse the way the minidom editor did: SAX-driven DOM with line tracking."""
+    import defusedxml.minidom
+    import defusedxml.sax
+
+    def set_content_handler(dom_handler):
+        def startElementNS(name, tagName, attrs):
+            orig_start_cb(name, tagName, attrs)
+            dom_handler.elementStack[-1].parse_position = (
+                parser._parser.CurrentLineNumber,
+                parser._parser.CurrentColumnNumber,
+            )
+
+        orig_start_cb = dom_handler.startElementNS
+        dom_handler.startElementNS = startElementNS
+        orig_set_content_handler(dom_handler)
+
+    parser = defusedxml.sax.make_parser()
+    orig_set_content_handler = parser.setContentHandler
+    parser.setContentHandler = set_content_handler
+    return defusedxml.minidom.parse(str(xml_path), parser)
+
+
+def _find_minidom(dom, tag, attrs=None, line_number=None, contains=None):
+    """The minidom editor's get_node: a linear scan of getElementsByTagName."""
+
+    def text(elem):
+        parts = []
+        for node in elem.childNodes:
+            if node.nodeType == node.TEXT_NODE and node.data.strip():
+                parts.append(node.data)
+            elif node.nodeType == node.ELEMENT_NODE:
+                parts.append(text(node))
+        return "".join(parts)
+
+    contains = html.unescape(contains) if contains is not None else None
+    matches = [
+        elem
+        for elem in dom.getElementsByTagName(tag)
+        if (line_number is None or elem.parse_position[0] == line_number)
+        and (attrs is None or all(elem.getAttribute(k) == v for k, v in attrs.items()))
+        and (contains is None or contains in text(elem))
+    ]
+    assert len(matches) == 1, f"Expected one <{tag}>, found {len(matches)}"
+    return matches[0]
+
+
+def _rss():
+    """Resident set size in bytes, or 0 where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _measure(label, parse, find, save, queries):
+    # tracemalloc only sees Python allocations; libxml2 memory shows up in RSS
+    rss_before = _rss()
+    tracemalloc.start()
+    start = time.perf_counter()
+    state = parse()
+    parse_time = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak = max(peak, _rss() - rss_before)
+
+    lookup_times = {}
+    for kind, query in queries:
+        start = time.perf_counter()
+        find(state, **query)
+        lookup_times[kind] = lookup_times.get(kind, 0) + time.perf_counter() - start
+
+    start = time.perf_counter()
+    save(state)
+    save_time = time.perf_counter() - start
+
+    print(
+        f"{label:<8} parse {parse_time * 1000:8.1f} ms   "
+        f"peak {peak / 1024 / 1024:7.1f} MB   "
+        f"save {save_time * 1000:7.1f} ms"
+    )
+    for kind, total in lookup_times.items():
+        count = sum(1 for k, _ in queries if k == kind)
+        print(f"{'':<8} get_node by {kind:<8} {total / count * 1000:8.3f} ms/lookup")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the XML editor")
+    parser.add_argument("--paragraphs", type=int, default=5000)
+    parser.add_argument("--lookups", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        xml_path = Path(temp_dir) / "document.xml"
+        write_document(xml_path, args.paragraphs)
+        size = xml_path.stat().st_size
+        print(f"{args.paragraphs} paragraphs, {size / 1024 / 1024:.1f} MB")
+
+        step = max(1, args.paragraphs // args.lookups)
+        queries = []
+        for i in range(0, args.paragraphs, step)[: args.lookups]:
+            kind = len(queries) % 3
+            if kind == 0:
+                query = {"tag": "w:p", "attrs": {"w14:paraId": f"{i:08X}"}}
+                queries.append(("attrs", query))
+            elif kind == 1:
+                queries.append(("line", {"tag": "w:r", "line_number": 5 + i * 6}))
+            else:
+                query = {"tag": "w:t", "contains": f"Paragraph {i} &#8220;"}
+                queries.append(("contains", query))
+
+        def save_copy(editor):
+            editor.xml_path = xml_path.with_suffix(".lxml")
+            editor.save()
+
+        # The new editor runs first so memory freed by minidom cannot mask its growth
+        _measure(
+            "lxml",
+            lambda: XMLEditor(xml_path),
+            lambda editor, **query: editor.get_node(**query),
+            save_copy,
+            queries,
+        )
+
+        try:
+            _measure(
+                "minidom",
+                lambda: _parse_minidom(xml_path),
+                _find_minidom,
+                lambda dom: xml_path.with_suffix(".minidom").write_bytes(
+                    dom.toxml(encoding="utf-8")
+                ),
+                queries,
+            )
+        except ImportError:
+            print("minidom  skipped (defusedxml is not installed)")
+
+
+if __name__ == "__main__":
+    main()
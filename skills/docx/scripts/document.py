@@ -27,18 +27,19 @@ Usage:
 """
 
 import html
+import os
 import random
 import shutil
 import tempfile
 from datetime import datetime, timezone
 from pathlib import Path
 
-from defusedxml import minidom
+import lxml.etree
 from ooxml.scripts.pack import pack_document
 from ooxml.scripts.validation.docx import DOCXSchemaValidator
 from ooxml.scripts.validation.redlining import RedliningValidator
 
-from .utilities import XMLEditor
+from .utilities import DOMDocument, DOMElement, XMLEditor, create_parser
 
 # Path to template files
 TEMPLATE_DIR = Path(__file__).parent / "templates"
@@ -53,7 +54,7 @@ class DocxXMLEditor(XMLEditor):
     - w:id (for w:ins and w:del elements)
 
     Attributes:
-        dom (defusedxml.minidom.Document): The DOM document for direct manipulation
+        dom (DOMDocument): The parsed document for direct manipulation
     """
 
     def __init__(
@@ -88,30 +89,21 @@ class DocxXMLEditor(XMLEditor):
 
     def _ensure_w16du_namespace(self):
         """Ensure w16du namespace is declared on the root element."""
-        root = self.dom.documentElement
-        if not root.hasAttribute("xmlns:w16du"):  # type: ignore
-            root.setAttribute(  # type: ignore
-                "xmlns:w16du",
-                "http://schemas.microsoft.com/office/word/2023/wordml/word16du",
-            )
+        self._declare_namespace(
+            "w16du", "http://schemas.microsoft.com/office/word/2023/wordml/word16du"
+        )
 
     def _ensure_w16cex_namespace(self):
         """Ensure w16cex namespace is declared on the root element."""
-        root = self.dom.documentElement
-        if not root.hasAttribute("xmlns:w16cex"):  # type: ignore
-            root.setAttribute(  # type: ignore
-                "xmlns:w16cex",
-                "http://schemas.microsoft.com/office/word/2018/wordml/cex",
-            )
+        self._declare_namespace(
+            "w16cex", "http://schemas.microsoft.com/office/word/2018/wordml/cex"
+        )
 
     def _ensure_w14_namespace(self):
         """Ensure w14 namespace is declared on the root element."""
-        root = self.dom.documentElement
-        if not root.hasAttribute("xmlns:w14"):  # type: ignore
-            root.setAttribute(  # type: ignore
-                "xmlns:w14",
-                "http://schemas.microsoft.com/office/word/2010/wordml",
-            )
+        self._declare_namespace(
+            "w14", "http://schemas.microsoft.com/office/word/2010/wordml"
+        )
 
     def _inject_attributes_to_nodes(self, nodes):
         """Inject RSID, author, and date attributes into DOM nodes where applicable.
@@ -133,12 +125,7 @@ class DocxXMLEditor(XMLEditor):
 
         def is_inside_deletion(elem):
             """Check if element is inside a w:del element."""
-            parent = elem.parentNode
-            while parent:
-                if parent.nodeType == parent.ELEMENT_NODE and parent.tagName == "w:del":
-                    return True
-                parent = parent.parentNode
-            return False
+            return any(parent.tagName == "w:del" for parent in elem.iterancestors())
 
         def add_rsid_to_p(elem):
             if not elem.hasAttribute("w:rsidR"):
@@ -195,17 +182,13 @@ class DocxXMLEditor(XMLEditor):
 
         def add_xml_space_to_t(elem):
             # Add xml:space="preserve" to w:t if text has leading/trailing whitespace
-            if (
-                elem.firstChild
-                and elem.firstChild.nodeType == elem.firstChild.TEXT_NODE
-            ):
-                text = elem.firstChild.data
-                if text and (text[0].isspace() or text[-1].isspace()):
-                    if not elem.hasAttribute("xml:space"):
-                        elem.setAttribute("xml:space", "preserve")
+            text = elem.text
+            if text and (text[0].isspace() or text[-1].isspace()):
+                if not elem.hasAttribute("xml:space"):
+                    elem.setAttribute("xml:space", "preserve")
 
         for node in nodes:
-            if node.nodeType != node.ELEMENT_NODE:
+            if not isinstance(node, DOMElement):
                 continue
 
             # Handle the node itself
@@ -317,25 +300,19 @@ class DocxXMLEditor(XMLEditor):
                 elif not run.hasAttribute("w:rsidDel"):
                     run.setAttribute("w:rsidDel", self.rsid)
 
-                for t_elem in list(run.getElementsByTagName("w:t")):
-                    del_text = self.dom.createElement("w:delText")
-                    # Copy ALL child nodes (not just firstChild) to handle entities
-                    while t_elem.firstChild:
-                        del_text.appendChild(t_elem.firstChild)
-                    for i in range(t_elem.attributes.length):
-                        attr = t_elem.attributes.item(i)
-                        del_text.setAttribute(attr.name, attr.value)
-                    t_elem.parentNode.replaceChild(del_text, t_elem)
+                for t_elem in run.getElementsByTagName("w:t"):
+                    _rename(t_elem, "w:delText")
 
-            # Move all children from ins to del wrapper
-            while ins_elem.firstChild:
-                del_wrapper.appendChild(ins_elem.firstChild)
+            with self._keep_index():
+                # Move all children from ins to del wrapper
+                _move_children(ins_elem, del_wrapper)
 
-            # Add del wrapper back to ins
-            ins_elem.appendChild(del_wrapper)
+                # Add del wrapper back to ins
+                ins_elem.appendChild(del_wrapper)
 
-            # Inject attributes to the deletion wrapper
-            self._inject_attributes_to_nodes([del_wrapper])
+                # Inject attributes to the deletion wrapper
+                self._inject_attributes_to_nodes([del_wrapper])
+                self._reindex([ins_elem])
 
         return [elem]
 
@@ -398,15 +375,8 @@ class DocxXMLEditor(XMLEditor):
                 new_run = run.cloneNode(True)
 
                 # Convert w:delText → w:t
-                for del_text in list(new_run.getElementsByTagName("w:delText")):
-                    t_elem = self.dom.createElement("w:t")
-                    # Copy ALL child nodes (not just firstChild) to handle entities
-                    while del_text.firstChild:
-                        t_elem.appendChild(del_text.firstChild)
-                    for i in range(del_text.attributes.length):
-                        attr = del_text.attributes.item(i)
-                        t_elem.setAttribute(attr.name, attr.value)
-                    del_text.parentNode.replaceChild(t_elem, del_text)
+                for del_text in new_run.getElementsByTagName("w:delText"):
+                    _rename(del_text, "w:t")
 
                 # Update run attributes: w:rsidDel → w:rsidR
                 if new_run.hasAttribute("w:rsidDel"):
@@ -443,7 +413,11 @@ class DocxXMLEditor(XMLEditor):
             str: Transformed XML with tracked change wrapping
         """
         wrapper = f'<root xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">{xml_content}</root>'
-        doc = minidom.parseString(wrapper)
+        doc = DOMDocument(
+            lxml.etree.ElementTree(
+                lxml.etree.fromstring(wrapper.encode("utf-8"), create_parser())
+            )
+        )
         para = doc.getElementsByTagName("w:p")[0]
 
         # Ensure w:pPr exists
@@ -472,9 +446,7 @@ class DocxXMLEditor(XMLEditor):
 
         # Wrap all non-pPr children in <w:ins>
         ins_wrapper = doc.createElement("w:ins")
-        for child in [c for c in para.childNodes if c.nodeName != "w:pPr"]:
-            para.removeChild(child)
-            ins_wrapper.appendChild(child)
+        _move_children(para, ins_wrapper, skip="w:pPr")
         para.appendChild(ins_wrapper)
 
         return para.toxml()
@@ -500,17 +472,9 @@ class DocxXMLEditor(XMLEditor):
             if elem.getElementsByTagName("w:delText"):
                 raise ValueError("w:r element already contains w:delText")
 
-            # Convert w:t → w:delText
-            for t_elem in list(elem.getElementsByTagName("w:t")):
-                del_text = self.dom.createElement("w:delText")
-                # Copy ALL child nodes (not just firstChild) to handle entities
-                while t_elem.firstChild:
-                    del_text.appendChild(t_elem.firstChild)
-                # Preserve attributes like xml:space
-                for i in range(t_elem.attributes.length):
-                    attr = t_elem.attributes.item(i)
-                    del_text.setAttribute(attr.name, attr.value)
-                t_elem.parentNode.replaceChild(del_text, t_elem)
+            # Convert w:t → w:delText (attributes like xml:space are kept)
+            for t_elem in elem.getElementsByTagName("w:t"):
+                _rename(t_elem, "w:delText")
 
             # Update run attributes: w:rsidR → w:rsidDel
             if elem.hasAttribute("w:rsidR"):
@@ -522,12 +486,14 @@ class DocxXMLEditor(XMLEditor):
             # Wrap in w:del
             del_wrapper = self.dom.createElement("w:del")
             parent = elem.parentNode
-            parent.insertBefore(del_wrapper, elem)
-            parent.removeChild(elem)
-            del_wrapper.appendChild(elem)
+            with self._keep_index():
+                parent.insertBefore(del_wrapper, elem)
+                parent.removeChild(elem)
+                del_wrapper.appendChild(elem)
 
-            # Inject attributes to the deletion wrapper
-            self._inject_attributes_to_nodes([del_wrapper])
+                # Inject attributes to the deletion wrapper
+                self._inject_attributes_to_nodes([del_wrapper])
+                self._reindex([del_wrapper])
 
             return del_wrapper
 
@@ -540,52 +506,44 @@ class DocxXMLEditor(XMLEditor):
             pPr_list = elem.getElementsByTagName("w:pPr")
             is_numbered = pPr_list and pPr_list[0].getElementsByTagName("w:numPr")
 
-            if is_numbered:
-                # Add <w:del/> to w:rPr in w:pPr
-                pPr = pPr_list[0]
-                rPr_list = pPr.getElementsByTagName("w:rPr")
-
-                if not rPr_list:
-                    rPr = self.dom.createElement("w:rPr")
-                    pPr.appendChild(rPr)
-                else:
-                    rPr = rPr_list[0]
-
-                # Add <w:del/> marker
-                del_marker = self.dom.createElement("w:del")
-                rPr.insertBefore(
-                    del_marker, rPr.firstChild
-                ) if rPr.firstChild else rPr.appendChild(del_marker)
-
-            # Convert w:t → w:delText in all runs
-            for t_elem in list(elem.getElementsByTagName("w:t")):
-                del_text = self.dom.createElement("w:delText")
-                # Copy ALL child nodes (not just firstChild) to handle entities
-                while t_elem.firstChild:
-                    del_text.appendChild(t_elem.firstChild)
-                # Preserve attributes like xml:space
-                for i in range(t_elem.attributes.length):
-                    attr = t_elem.attributes.item(i)
-                    del_text.setAttribute(attr.name, attr.value)
-                t_elem.parentNode.replaceChild(del_text, t_elem)
+            with self._keep_index():
+                if is_numbered:
+                    # Add <w:del/> to w:rPr in w:pPr
+                    pPr = pPr_list[0]
+                    rPr_list = pPr.getElementsByTagName("w:rPr")
 
-            # Update run attributes: w:rsidR → w:rsidDel
-            for run in elem.getElementsByTagName("w:r"):
-                if run.hasAttribute("w:rsidR"):
-                    run.setAttribute("w:rsidDel", run.getAttribute("w:rsidR"))
-                    run.removeAttribute("w:rsidR")
-                elif not run.hasAttribute("w:rsidDel"):
-                    run.setAttribute("w:rsidDel", self.rsid)
-
-            # Wrap all non-pPr children in <w:del>
-            del_wrapper = self.dom.createElement("w:del")
-            for child in [c for c in elem.childNodes if c.nodeName != "w:pPr"]:
-                elem.removeChild(child)
-                del_wrapper.appendChild(child)
-            elem.appendChild(del_wrapper)
-
-            # Inject attributes to the deletion wrapper
-            self._inject_attributes_to_nodes([del_wrapper])
+                    if not rPr_list:
+                        rPr = self.dom.createElement("w:rPr")
+                        pPr.appendChild(rPr)
+                    else:
+                        rPr = rPr_list[0]
+
+                    # Add <w:del/> marker
+                    del_marker = self.dom.createElement("w:del")
+                    rPr.insertBefore(
+                        del_marker, rPr.firstChild
+                    ) if rPr.firstChild else rPr.appendChild(del_marker)
+
+                # Convert w:t → w:delText in all runs (attributes like xml:space are kept)
+                for t_elem in elem.getElementsByTagName("w:t"):
+                    _rename(t_elem, "w:delText")
+
+                # Update run attributes: w:rsidR → w:rsidDel
+                for run in elem.getElementsByTagName("w:r"):
+                    if run.hasAttribute("w:rsidR"):
+                        run.setAttribute("w:rsidDel", run.getAttribute("w:rsidR"))
+                        run.removeAttribute("w:rsidR")
+                    elif not run.hasAttribute("w:rsidDel"):
+                        run.setAttribute("w:rsidDel", self.rsid)
+
+                # Wrap all non-pPr children in <w:del>
+                del_wrapper = self.dom.createElement("w:del")
+                _move_children(elem, del_wrapper, skip="w:pPr")
+                elem.appendChild(del_wrapper)
+
+                # Inject attributes to the deletion wrapper
+                self._inject_attributes_to_nodes([del_wrapper])
+                self._reindex([elem])
 
             return elem
 
@@ -604,11 +562,42 @@ def _generate_hex_id() -> str:
     return f"{random.randint(1, 0x7FFFFFFE):08X}"
 
 
+def _link_file(source: Path, target: Path):
+    """Hard link source at target, falling back to a symlink across filesystems."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if target.exists() or target.is_symlink():
+        target.unlink()
+    try:
+        os.link(source, target)
+    except OSError:
+        os.symlink(source.resolve(), target)
+
+
 def _generate_rsid() -> str:
     """Generate random 8-character hex RSID."""
     return "".join(random.choices("0123456789ABCDEF", k=8))
 
 
+def _rename(elem, tag_name: str):
+    """Rename an element in place (e.g. w:t → w:delText), keeping text and attributes."""
+    prefix, _, local = tag_name.rpartition(":")
+    elem.tag = f"{{{elem.nsmap[prefix]}}}{local}"
+
+
+def _move_children(source, target, skip=None):
+    """Move child nodes, with the text that follows each, from source to target.
+
+    Args:
+        source: Element to take children from
+        target: Element to append them to
+        skip: Qualified name of children to leave in place (e.g. "w:pPr")
+    """
+    for child in list(source):
+        if skip and isinstance(child, DOMElement) and child.tagName == skip:
+            continue
+        target.append(child)
+
+
 class Document:
     """Manages comments in unpacked Word documents."""
 
@@ -636,16 +625,15 @@ class Document:
         if not self.original_path.exists() or not self.original_path.is_dir():
             raise ValueError(f"Directory not found: {unpacked_dir}")
 
-        # Create temporary directory with subdirectories for unpacked content and baseline
+        # Copy-on-write session: parts are read from the original directory and
+        # only edited or added parts are written to unpacked_path
         self.temp_dir = tempfile.mkdtemp(prefix="docx_")
         self.unpacked_path = Path(self.temp_dir) / "unpacked"
-        shutil.copytree(self.original_path, self.unpacked_path)
+        self.word_path = self.unpacked_path / "word"
+        self.word_path.mkdir(parents=True)
 
-        # Pack original directory into temporary .docx for validation baseline (outside unpacked dir)
+        # Validation baseline, packed from the original directory on first use
         self.original_docx = Path(self.temp_dir) / "original.docx"
-        pack_document(self.original_path, self.original_docx, validate=False)
-
-        self.word_path = self.unpacked_path / "word"
 
         # Generate RSID if not provided
         self.rsid = rsid if rsid else _generate_rsid()
@@ -702,6 +690,8 @@ class Document:
         """
         if xml_path not in self._editors:
             file_path = self.unpacked_path / xml_path
+            if not file_path.exists():
+                file_path = self.original_path / xml_path
             if not file_path.exists():
                 raise ValueError(f"XML file not found: {xml_path}")
             # Use DocxXMLEditor with RSID, author, and initials for all editors
@@ -842,12 +832,23 @@ class Document:
         Raises:
             ValueError: If validation fails.
         """
+        self._build_baseline()
+
+        # Validators see the whole document: staged parts over the original directory
+        merged_path = Path(self.temp_dir) / "merged"
+        if merged_path.exists():
+            shutil.rmtree(merged_path)
+        for source in (self.original_path, self.unpacked_path):
+            for file_path in source.rglob("*"):
+                if file_path.is_file():
+                    _link_file(file_path, merged_path / file_path.relative_to(source))
+
         # Create validators with current state
         schema_validator = DOCXSchemaValidator(
-            self.unpacked_path, self.original_docx, verbose=False
+            merged_path, self.original_docx, verbose=False
         )
         redlining_validator = RedliningValidator(
-            self.unpacked_path, self.original_docx, verbose=False
+            merged_path, self.original_docx, verbose=False
         )
 
         # Run validations
@@ -861,33 +862,64 @@ class Document:
         Save all modified XML files to disk and copy to destination directory.
 
         This persists all changes made via add_comment() and reply_to_comment().
+        Only edited or added parts are written back to the original directory;
+        a different destination receives the complete document.
 
         Args:
             destination: Optional path to save to. If None, saves back to original directory.
             validate: If True, validates document before saving (default: True).
         """
         # Only ensure comment relationships and content types if comment files exist
-        if self.comments_path.exists():
+        if self._part_exists(self.comments_path):
             self._ensure_comment_relationships()
             self._ensure_comment_content_types()
 
-        # Save all modified XML files in temp directory
-        for editor in self._editors.values():
+        # Write edited XML files to the staging directory; parts that serialize
+        # to the original bytes stay untouched
+        for xml_path, editor in self._editors.items():
+            staged_path = self.unpacked_path / xml_path
+            source_path = self.original_path / xml_path
+            content = editor.serialize()
+            if (
+                not staged_path.exists()
+                and source_path.exists()
+                and source_path.stat().st_size == len(content)
+                and source_path.read_bytes() == content
+            ):
+                continue
+            staged_path.parent.mkdir(parents=True, exist_ok=True)
+            editor.xml_path = staged_path
             editor.save()
 
         # Validate by default
         if validate:
             self.validate()
 
-        # Copy contents from temp directory to destination (or original directory)
+        # Copy staged parts to the destination (or original directory); a new
+        # destination also gets the untouched parts
         target_path = Path(destination) if destination else self.original_path
+        if target_path.resolve() == self.original_path.resolve():
+            # Keep the baseline independent of the files about to be overwritten
+            self._build_baseline()
+        else:
+            shutil.copytree(self.original_path, target_path, dirs_exist_ok=True)
         shutil.copytree(self.unpacked_path, target_path, dirs_exist_ok=True)
 
+    def _build_baseline(self):
+        """Pack the original directory into original.docx if not done yet."""
+        if not self.original_docx.exists():
+            pack_document(self.original_path, self.original_docx, validate=False)
+
+    def _part_exists(self, path):
+        """Whether a part exists, given its path under unpacked_path."""
+        relative = Path(path).relative_to(self.unpacked_path)
+        return Path(path).exists() or (self.original_path / relative).exists()
+
     # ==================== Private: Initialization ====================
 
     def _get_next_comment_id(self):
         """Get the next available comment ID."""
-        if not self.comments_path.exists():
+        if not self._part_exists(self.comments_path):
             return 0
 
         editor = self["word/comments.xml"]
@@ -903,7 +935,7 @@ class Document:
 
     def _load_existing_comments(self):
         """Load existing comments from files to enable replies."""
-        if not self.comments_path.exists():
+        if not self._part_exists(self.comments_path):
             return {}
 
         editor = self["word/comments.xml"]
@@ -953,7 +985,7 @@ class Document:
 
     def _update_people_xml(self, path):
         """Create people.xml if it doesn't exist."""
-        if not path.exists():
+        if not self._part_exists(path):
             # Copy from template
             shutil.copy(TEMPLATE_DIR / "people.xml", path)
 
@@ -1069,7 +1101,7 @@ class Document:
         self, comment_id, para_id, text, author, initials, timestamp
     ):
         """Add a single comment to comments.xml."""
-        if not self.comments_path.exists():
+        if not self._part_exists(self.comments_path):
             shutil.copy(TEMPLATE_DIR / "comments.xml", self.comments_path)
 
         editor = self["word/comments.xml"]
@@ -1090,7 +1122,7 @@ class Document:
 
     def _add_to_comments_extended_xml(self, para_id, parent_para_id):
         """Add a single comment to commentsExtended.xml."""
-        if not self.comments_extended_path.exists():
+        if not self._part_exists(self.comments_extended_path):
             shutil.copy(
                 TEMPLATE_DIR / "commentsExtended.xml", self.comments_extended_path
             )
@@ -1106,7 +1138,7 @@ class Document:
 
     def _add_to_comments_ids_xml(self, para_id, durable_id):
         """Add a single comment to commentsIds.xml."""
-        if not self.comments_ids_path.exists():
+        if not self._part_exists(self.comments_ids_path):
             shutil.copy(TEMPLATE_DIR / "commentsIds.xml", self.comments_ids_path)
 
         editor = self["word/commentsIds.xml"]
@@ -1117,7 +1149,7 @@ class Document:
 
     def _add_to_comments_extensible_xml(self, durable_id):
         """Add a single comment to commentsExtensible.xml."""
-        if not self.comments_extensible_path.exists():
+        if not self._part_exists(self.comments_extensible_path):
             shutil.copy(
                 TEMPLATE_DIR / "commentsExtensible.xml", self.comments_extensible_path
             )
@@ -1183,7 +1215,7 @@ class Document:
         people_path = self.word_path / "people.xml"
 
         # people.xml should already exist from _setup_tracking
-        if not people_path.exists():
+        if not self._part_exists(people_path):
             raise ValueError("people.xml should exist after _setup_tracking")
 
         editor = self["word/people.xml"]
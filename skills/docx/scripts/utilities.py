@@ -3,8 +3,8 @@
 Utilities for editing OOXML documents.
 
 This module provides XMLEditor, a tool for manipulating XML files with support for
-line-number-based node finding and DOM manipulation. Each element is automatically
-annotated with its original line and column position during parsing.
+line-number-based node finding and DOM manipulation. Documents are parsed with
+lxml, which records the original line of each element as it parses.
 
 Example usage:
     editor = XMLEditor("document.xml")
@@ -30,26 +30,163 @@ Example usage:
     editor.save()
 """
 
+import bisect
+import contextlib
+import copy
 import html
+import weakref
+import xml.parsers.expat
 from pathlib import Path
 from typing import Optional, Union
 
-import defusedxml.minidom
-import defusedxml.sax
+import lxml.etree
+
+XML_NAMESPACE = "http://www.w3.org/XML/1998/namespace"
+
+# libxml2 stores element line numbers in 16 bits
+MAX_SOURCELINE = 65535
+
+# Inserts and removes made through the DOM helpers, counted per document (keyed
+# by root element) so XMLEditor can tell when its lookup index may be stale
+_dom_changes = weakref.WeakKeyDictionary()
+
+
+class DOMElement(lxml.etree.ElementBase):
+    """
+    lxml element with the minidom-style helpers used by editing scripts.
+
+    Names are qualified as written in the document ("w:p", "w:id"), and
+    prefixes are resolved against the namespaces in scope. Only elements are
+    nodes: text lives in .text and .tail, so childNodes and firstChild never
+    return text.
+    """
+
+    @property
+    def tagName(self):
+        return _qualified_name(self)
+
+    nodeName = tagName
+
+    def __bool__(self):
+        # DOM nodes are always truthy; lxml elements are falsy without children
+        return True
+
+    @property
+    def parentNode(self):
+        return self.getparent()
+
+    @property
+    def childNodes(self):
+        return list(self)
+
+    @property
+    def firstChild(self):
+        return self[0] if len(self) else None
+
+    def getAttribute(self, name):
+        key = _attribute_key(self, name)
+        return self.get(key, "") if key else ""
+
+    def hasAttribute(self, name):
+        key = _attribute_key(self, name)
+        return key is not None and key in self.attrib
+
+    def setAttribute(self, name, value):
+        key = _attribute_key(self, name)
+        if key is None:
+            raise ValueError(f"Namespace prefix of '{name}' is not declared")
+        self.set(key, value)
+
+    def removeAttribute(self, name):
+        key = _attribute_key(self, name)
+        if key is not None:
+            self.attrib.pop(key, None)
+
+    def getElementsByTagName(self, name):
+        """Descendants (not the element itself) with the given qualified name."""
+        if name == "*":
+            return list(self.iterdescendants(lxml.etree.Element))
+        key = _tag_key(self, name)
+        return list(self.iterdescendants(key)) if key else []
+
+    def appendChild(self, node):
+        _detach(node)
+        self.append(node)
+        _count_change(self)
+        return node
+
+    def insertBefore(self, node, ref):
+        if ref is None:
+            return self.appendChild(node)
+        _detach(node)
+        ref.addprevious(node)
+        _count_change(ref)
+        return node
+
+    def removeChild(self, node):
+        _detach(node)
+        return node
+
+    def replaceChild(self, new, old):
+        self.insertBefore(new, old)
+        return self.removeChild(old)
+
+    def cloneNode(self, deep=True):
+        return copy.deepcopy(self) if deep else self.makeelement(self.tag, self.attrib)
+
+    def toxml(self):
+        return lxml.etree.tostring(self, encoding="unicode", with_tail=False)
+
+
+class DOMDocument:
+    """
+    Document-level view of a parsed XML file, in the shape of minidom's Document.
+
+    Attributes:
+        tree: The underlying lxml ElementTree
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+
+    @property
+    def documentElement(self):
+        return self.tree.getroot()
+
+    def getElementsByTagName(self, name):
+        """All elements with the given qualified name, including the root."""
+        root = self.tree.getroot()
+        if name == "*":
+            return list(root.iter(lxml.etree.Element))
+        key = _tag_key(root, name)
+        return list(root.iter(key)) if key else []
+
+    def createElement(self, name):
+        """Create a detached element; its prefix must be declared on the root."""
+        root = self.tree.getroot()
+        key = _tag_key(root, name)
+        if key is None:
+            raise ValueError(f"Namespace prefix of '{name}' is not declared")
+        prefix = name.rpartition(":")[0] or None
+        nsmap = {prefix: root.nsmap[prefix]} if prefix else None
+        return root.makeelement(key, nsmap=nsmap)
+
+    def toxml(self):
+        return lxml.etree.tostring(self.tree, encoding="unicode")
 
 
 class XMLEditor:
     """
     Editor for manipulating OOXML XML files with line-number-based node finding.
 
-    This class parses XML files and tracks the original line and column position
-    of each element. This enables finding nodes by their line number in the original
-    file, which is useful when working with Read tool output.
+    This class parses XML files with lxml, which tracks the original line of
+    each element (sourceline). This enables finding nodes by their line number
+    in the original file, which is useful when working with Read tool output.
 
     Attributes:
         xml_path: Path to the XML file being edited
         encoding: Detected encoding of the XML file ('ascii' or 'utf-8')
-        dom: Parsed DOM tree with parse_position attributes on elements
+        dom: DOMDocument wrapping the parsed lxml tree
     """
 
     def __init__(self, xml_path):
@@ -70,8 +207,13 @@ class XMLEditor:
             header = f.read(200).decode("utf-8", errors="ignore")
         self.encoding = "ascii" if 'encoding="ascii"' in header else "utf-8"
 
-        parser = _create_line_tracking_parser()
-        self.dom = defusedxml.minidom.parse(str(self.xml_path), parser)
+        self.dom = DOMDocument(lxml.etree.parse(str(self.xml_path), create_parser()))
+        self._long_lines = _read_long_line_numbers(
+            self.xml_path, self.dom.documentElement
+        )
+        # Built on the first get_node call, then kept up to date by the editing
+        # methods; rebuilt after any insert or remove made through direct DOM calls
+        self._index = None
 
     def get_node(
         self,
@@ -91,10 +233,10 @@ class XMLEditor:
             attrs: Dictionary of attribute name-value pairs to match (e.g., {"w:id": "1"})
             line_number: Line number (int) or line range (range) in original XML file (1-indexed)
             contains: Text string that must appear in any text node within the element.
-                      Supports both entity notation (&#8220;) and Unicode characters (\u201c).
+                      Supports both entity notation (&#8220;) and Unicode characters (“).
 
         Returns:
-            defusedxml.minidom.Element: The matching DOM element
+            DOMElement: The matching element
 
         Raises:
             ValueError: If node not found or multiple matches found
@@ -107,42 +249,31 @@ class XMLEditor:
             elem = editor.get_node(tag="w:commentRangeStart", attrs={"w:id": "0"})
             elem = editor.get_node(tag="w:p", contains="specific text")
             elem = editor.get_node(tag="w:t", contains="&#8220;Agreement")  # Entity notation
-            elem = editor.get_node(tag="w:t", contains="\u201cAgreement")   # Unicode character
+            elem = editor.get_node(tag="w:t", contains="“Agreement")   # Unicode character
         """
-        matches = []
-        for elem in self.dom.getElementsByTagName(tag):
-            # Check line_number filter
-            if line_number is not None:
-                parse_pos = getattr(elem, "parse_position", (None,))
-                elem_line = parse_pos[0]
-
-                # Handle both single line number and range
-                if isinstance(line_number, range):
-                    if elem_line not in line_number:
-                        continue
-                else:
-                    if elem_line != line_number:
-                        continue
-
-            # Check attrs filter
-            if attrs is not None:
-                if not all(
-                    elem.getAttribute(attr_name) == attr_value
-                    for attr_name, attr_value in attrs.items()
-                ):
-                    continue
-
-            # Check contains filter
-            if contains is not None:
-                elem_text = self._get_element_text(elem)
-                # Normalize the search string: convert HTML entities to Unicode characters
-                # This allows searching for both "&#8220;Rowan" and ""Rowan"
-                normalized_contains = html.unescape(contains)
-                if normalized_contains not in elem_text:
-                    continue
-
-            # If all applicable filters passed, this is a match
-            matches.append(elem)
+        # Normalize the search string: convert HTML entities to Unicode characters
+        # This allows searching for both "&#8220;Rowan" and ""Rowan"
+        normalized_contains = html.unescape(contains) if contains is not None else None
+
+        if self._index is None or not self._index.is_current():
+            self._index = _NodeIndex(self.dom.documentElement, self._line_of)
+        matches = self._filter_nodes(
+            self._index.candidates(tag, attrs, line_number),
+            attrs,
+            line_number,
+            normalized_contains,
+        )
+        if not matches:
+            # The index misses elements renamed or re-attributed through direct
+            # DOM access; confirm with a full scan and rebuild it if needed
+            matches = self._filter_nodes(
+                self.dom.getElementsByTagName(tag),
+                attrs,
+                line_number,
+                normalized_contains,
+            )
+            if matches:
+                self._index = None
 
         if not matches:
             # Build descriptive error message
@@ -180,48 +311,83 @@ class XMLEditor:
             )
         return matches[0]
 
+    def _filter_nodes(self, nodes, attrs, line_number, contains):
+        """Return the nodes that pass the line_number, attrs and contains filters."""
+        matches = []
+        for elem in nodes:
+            # Check line_number filter (inserted elements have no line)
+            if line_number is not None:
+                elem_line = self._line_of(elem)
+                if not elem_line:
+                    continue
+
+                # Handle both single line number and range
+                if isinstance(line_number, range):
+                    if elem_line not in line_number:
+                        continue
+                else:
+                    if elem_line != line_number:
+                        continue
+
+            # Check attrs filter
+            if attrs is not None:
+                if not all(
+                    elem.getAttribute(attr_name) == attr_value
+                    for attr_name, attr_value in attrs.items()
+                ):
+                    continue
+
+            # Check contains filter
+            if contains is not None:
+                if contains not in self._get_element_text(elem):
+                    continue
+
+            # If all applicable filters passed, this is a match
+            matches.append(elem)
+        return matches
+
+    def _line_of(self, elem):
+        """Line of the element in the original file, or 0 for inserted elements."""
+        return self._long_lines.get(elem) or elem.sourceline or 0
+
     def _get_element_text(self, elem):
         """
-        Recursively extract all text content from an element.
+        Extract all text content from an element.
 
-        Skips text nodes that contain only whitespace (spaces, tabs, newlines),
-        which typically represent XML formatting rather than document content.
+        Skips text that contains only whitespace (spaces, tabs, newlines),
+        which typically represents XML formatting rather than document content.
 
         Args:
-            elem: defusedxml.minidom.Element to extract text from
+            elem: DOMElement to extract text from
 
         Returns:
-            str: Concatenated text from all non-whitespace text nodes within the element
+            str: Concatenated text from all non-whitespace text within the element
         """
-        text_parts = []
-        for node in elem.childNodes:
-            if node.nodeType == node.TEXT_NODE:
-                # Skip whitespace-only text nodes (XML formatting)
-                if node.data.strip():
-                    text_parts.append(node.data)
-            elif node.nodeType == node.ELEMENT_NODE:
-                text_parts.append(self._get_element_text(node))
-        return "".join(text_parts)
+        return "".join(text for text in elem.itertext() if text.strip())
 
     def replace_node(self, elem, new_content):
         """
         Replace a DOM element with new XML content.
 
         Args:
-            elem: defusedxml.minidom.Element to replace
+            elem: DOMElement to replace
             new_content: String containing XML to replace the node with
 
         Returns:
-            List[defusedxml.minidom.Node]: All inserted nodes
+            List[DOMElement]: All inserted nodes
 
         Example:
             new_nodes = editor.replace_node(old_elem, "<w:r><w:t>text</w:t></w:r>")
         """
-        parent = elem.parentNode
+        parent = elem.getparent()
         nodes = self._parse_fragment(new_content)
-        for node in nodes:
-            parent.insertBefore(node, elem)
-        parent.removeChild(elem)
+        with self._keep_index():
+            for node in nodes:
+                parent.insertBefore(node, elem)
+            parent.removeChild(elem)
+            if self._index is not None:
+                self._index.remove(elem)
+            self._reindex(nodes)
         return nodes
 
     def insert_after(self, elem, xml_content):
@@ -229,23 +395,24 @@ class XMLEditor:
         Insert XML content after a DOM element.
 
         Args:
-            elem: defusedxml.minidom.Element to insert after
+            elem: DOMElement to insert after
             xml_content: String containing XML to insert
 
         Returns:
-            List[defusedxml.minidom.Node]: All inserted nodes
+            List[DOMElement]: All inserted nodes
 
         Example:
             new_nodes = editor.insert_after(elem, "<w:r><w:t>text</w:t></w:r>")
         """
-        parent = elem.parentNode
-        next_sibling = elem.nextSibling
         nodes = self._parse_fragment(xml_content)
-        for node in nodes:
-            if next_sibling:
-                parent.insertBefore(node, next_sibling)
-            else:
-                parent.appendChild(node)
+        # addnext inserts after elem's tail text; move that text past the new nodes
+        tail, elem.tail = elem.tail, None
+        with self._keep_index():
+            for node in reversed(nodes):
+                elem.addnext(node)
+            self._reindex(nodes)
+        if tail:
+            nodes[-1].tail = (nodes[-1].tail or "") + tail
         return nodes
 
     def insert_before(self, elem, xml_content):
@@ -253,19 +420,21 @@ class XMLEditor:
         Insert XML content before a DOM element.
 
         Args:
-            elem: defusedxml.minidom.Element to insert before
+            elem: DOMElement to insert before
             xml_content: String containing XML to insert
 
         Returns:
-            List[defusedxml.minidom.Node]: All inserted nodes
+            List[DOMElement]: All inserted nodes
 
         Example:
             new_nodes = editor.insert_before(elem, "<w:r><w:t>text</w:t></w:r>")
         """
-        parent = elem.parentNode
+        parent = elem.getparent()
         nodes = self._parse_fragment(xml_content)
-        for node in nodes:
-            parent.insertBefore(node, elem)
+        with self._keep_index():
+            for node in nodes:
+                parent.insertBefore(node, elem)
+            self._reindex(nodes)
         return nodes
 
     def append_to(self, elem, xml_content):
@@ -273,20 +442,45 @@ class XMLEditor:
         Append XML content as a child of a DOM element.
 
         Args:
-            elem: defusedxml.minidom.Element to append to
+            elem: DOMElement to append to
             xml_content: String containing XML to append
 
         Returns:
-            List[defusedxml.minidom.Node]: All inserted nodes
+            List[DOMElement]: All inserted nodes
 
         Example:
             new_nodes = editor.append_to(elem, "<w:r><w:t>text</w:t></w:r>")
         """
         nodes = self._parse_fragment(xml_content)
-        for node in nodes:
-            elem.appendChild(node)
+        with self._keep_index():
+            for node in nodes:
+                elem.appendChild(node)
+            self._reindex(nodes)
         return nodes
 
+    def _reindex(self, nodes):
+        """
+        Add nodes and their descendants to the lookup index.
+
+        Call after renaming elements or changing their attributes through
+        direct DOM access so get_node finds them by their new values.
+        """
+        if self._index is not None:
+            self._index.add(nodes)
+
+    @contextlib.contextmanager
+    def _keep_index(self):
+        """
+        Keep the lookup index current across DOM helper calls in the block.
+
+        The block must pass every element it inserts to _reindex. If the index
+        was already stale, or the block raises, it is rebuilt on the next lookup.
+        """
+        current = self._index is not None and self._index.is_current()
+        yield
+        if current:
+            self._index.mark_current()
+
     def get_next_rid(self):
         """Get the next available rId for relationships files."""
         max_id = 0
@@ -299,76 +493,299 @@ class XMLEditor:
                     pass
         return f"rId{max_id + 1}"
 
+    def serialize(self):
+        """
+        Serialize the edited XML, preserving the original encoding (ascii or utf-8).
+
+        Returns:
+            bytes: The XML declaration followed by the document
+        """
+        tree = self.dom.tree
+        standalone = ' standalone="yes"' if tree.docinfo.standalone else ""
+        declaration = f'<?xml version="1.0" encoding="{self.encoding}"{standalone}?>'
+        content = lxml.etree.tostring(
+            tree, encoding=self.encoding, xml_declaration=False
+        )
+        return declaration.encode(self.encoding) + content
+
     def save(self):
         """
         Save the edited XML back to the file.
 
-        Serializes the DOM tree and writes it back to the original file path,
+        Serializes the tree and writes it back to xml_path,
         preserving the original encoding (ascii or utf-8).
         """
-        content = self.dom.toxml(encoding=self.encoding)
-        self.xml_path.write_bytes(content)
+        self.xml_path.write_bytes(self.serialize())
+
+    def _declare_namespace(self, prefix, uri):
+        """
+        Declare a namespace prefix on the root element if it is not declared yet.
+
+        lxml cannot add a declaration to an existing element, so a placeholder
+        child using the namespace is added and cleanup_namespaces lifts the
+        declaration to the root. Every prefix already declared in the tree is
+        kept, including those only referenced from mc:Ignorable or Requires.
+        """
+        root = self.dom.documentElement
+        if root.nsmap.get(prefix) == uri:
+            return
+        placeholder = root.makeelement(f"{{{uri}}}_", nsmap={prefix: uri})
+        root.append(placeholder)
+        keep = {p for e in root.iter(lxml.etree.Element) for p in e.nsmap if p}
+        lxml.etree.cleanup_namespaces(
+            self.dom.tree, top_nsmap={prefix: uri}, keep_ns_prefixes=keep
+        )
+        root.remove(placeholder)
 
     def _parse_fragment(self, xml_content):
         """
-        Parse XML fragment and return list of imported nodes.
+        Parse XML fragment and return list of nodes ready to insert.
 
         Args:
             xml_content: String containing XML fragment
 
         Returns:
-            List of defusedxml.minidom.Node objects imported into this document
+            List of DOMElement objects (and any comments) from the fragment
 
         Raises:
             AssertionError: If fragment contains no element nodes
         """
-        # Extract namespace declarations from the root document element
+        # Declare the root element's namespaces around the fragment
         root_elem = self.dom.documentElement
         namespaces = []
-        if root_elem and root_elem.attributes:
-            for i in range(root_elem.attributes.length):
-                attr = root_elem.attributes.item(i)
-                if attr.name.startswith("xmlns"):  # type: ignore
-                    namespaces.append(f'{attr.name}="{attr.value}"')  # type: ignore
+        for prefix, uri in root_elem.nsmap.items():
+            name = f"xmlns:{prefix}" if prefix else "xmlns"
+            namespaces.append(f'{name}="{html.escape(uri, quote=True)}"')
 
         ns_decl = " ".join(namespaces)
         wrapper = f"<root {ns_decl}>{xml_content}</root>"
-        fragment_doc = defusedxml.minidom.parseString(wrapper)
-        nodes = [
-            self.dom.importNode(child, deep=True)
-            for child in fragment_doc.documentElement.childNodes  # type: ignore
-        ]
-        elements = [n for n in nodes if n.nodeType == n.ELEMENT_NODE]
+        fragment_root = lxml.etree.fromstring(wrapper.encode("utf-8"), create_parser())
+        nodes = list(fragment_root)
+        elements = [n for n in nodes if isinstance(n, DOMElement)]
         assert elements, "Fragment must contain at least one element"
+
+        # Inserted content has no line in the original file
+        for node in elements:
+            for elem in node.iter(lxml.etree.Element):
+                elem.sourceline = 0
+        # Whitespace between fragment nodes is formatting, not content
+        for node in nodes:
+            if node.tail is not None and not node.tail.strip():
+                node.tail = None
         return nodes
 
 
-def _create_line_tracking_parser():
+class _NodeIndex:
+    """
+    Lookup tables for XMLEditor.get_node, each built on first use.
+
+    - by_tag: tag -> elements, built with one pass over the tree
+    - by_attr: (tag, attribute) -> value -> elements, built per pair on demand
+    - by_line: tag -> sorted original lines and elements, for line ranges
+
+    Tables are keyed by lxml's {uri}local names. Elements are added as they are
+    inserted; attribute values and lines of new elements are read when the
+    next lookup needs them, after DocxXMLEditor has injected its attributes.
+    Entries are never trusted blindly: candidates are checked against their
+    current tag and position, so stale entries only cost a comparison.
+    Elements inserted through direct DOM calls are not tracked, so the index
+    is no longer current once the DOM helpers change its document outside
+    XMLEditor._keep_index.
+    """
+
+    def __init__(self, root, line_of):
+        self.root = root
+        self.line_of = line_of
+        self.by_tag = {}
+        self.by_attr = {}
+        self.by_line = {}
+        self.pending = []
+        self.mark_current()
+        for elem in root.iter(lxml.etree.Element):
+            self.by_tag.setdefault(elem.tag, {})[elem] = None
+
+    def add(self, nodes):
+        for node in nodes:
+            if not isinstance(node, DOMElement):
+                continue
+            for elem in node.iter(lxml.etree.Element):
+                self.by_tag.setdefault(elem.tag, {})[elem] = None
+                self.pending.append(elem)
+
+    def remove(self, node):
+        for elem in node.iter(lxml.etree.Element):
+            self.by_tag.get(elem.tag, {}).pop(elem, None)
+
+    def is_current(self):
+        """Whether no DOM helper has changed the document since mark_current."""
+        return self.changes == _dom_changes.get(self.root, 0)
+
+    def mark_current(self):
+        """Record that every element inserted so far has been added."""
+        self.changes = _dom_changes.get(self.root, 0)
+
+    def candidates(self, tag, attrs, line_number):
+        """Elements that may match, checked to have the tag and be in the tree."""
+        key = _tag_key(self.root, tag)
+        if key is None:
+            return []
+        self._apply_pending()
+        if attrs:
+            name, value = next(iter(attrs.items()))
+            attr_key = _attribute_key(self.root, name)
+            if attr_key is None:
+                return []
+            found = self._attr_table(key, attr_key).get(value, ())
+        elif line_number is not None:
+            lines, elems = self._line_table(key)
+            if isinstance(line_number, range):
+                start, stop = line_number.start, line_number.stop
+            else:
+                start, stop = line_number, line_number + 1
+            low = bisect.bisect_left(lines, start)
+            found = elems[low : bisect.bisect_left(lines, stop, low)]
+        else:
+            found = self.by_tag.get(key, ())
+        # dict.fromkeys drops elements indexed twice by _reindex
+        return [e for e in dict.fromkeys(found) if e.tag == key and self._in_tree(e)]
+
+    def _attr_table(self, key, attr_key):
+        table = self.by_attr.get((key, attr_key))
+        if table is None:
+            table = {}
+            for elem in self.by_tag.get(key, ()):
+                table.setdefault(elem.get(attr_key, ""), {})[elem] = None
+            self.by_attr[(key, attr_key)] = table
+        return table
+
+    def _line_table(self, key):
+        table = self.by_line.get(key)
+        if table is None:
+            pairs = sorted(
+                (self.line_of(elem), i, elem)
+                for i, elem in enumerate(self.by_tag.get(key, ()))
+            )
+            table = ([p[0] for p in pairs if p[0]], [p[2] for p in pairs if p[0]])
+            self.by_line[key] = table
+        return table
+
+    def _apply_pending(self):
+        """Add elements inserted since the last lookup to the built tables."""
+        pending, self.pending = self.pending, []
+        for elem in pending:
+            for (key, attr_key), table in self.by_attr.items():
+                if elem.tag == key:
+                    table.setdefault(elem.get(attr_key, ""), {})[elem] = None
+            lines_table = self.by_line.get(elem.tag)
+            line = self.line_of(elem)
+            if lines_table is not None and line:
+                lines, elems = lines_table
+                i = bisect.bisect_right(lines, line)
+                lines.insert(i, line)
+                elems.insert(i, elem)
+
+    def _in_tree(self, elem):
+        top = elem
+        for top in elem.iterancestors():
+            pass
+        return top is self.root
+
+
+def create_parser():
     """
-    Create a SAX parser that tracks line and column numbers for each element.
+    Create an lxml parser that produces DOMElement nodes.
 
-    Monkey patches the SAX content handler to store the current line and column
-    position from the underlying expat parser onto each element as a parse_position
-    attribute (line, column) tuple.
+    Entities are not resolved and nothing is fetched from the network, so
+    untrusted documents cannot expand entities or reach external resources.
 
     Returns:
-        defusedxml.sax.xmlreader.XMLReader: Configured SAX parser
+        lxml.etree.XMLParser: Configured parser
     """
+    parser = lxml.etree.XMLParser(
+        resolve_entities=False, no_network=True, load_dtd=False, huge_tree=True
+    )
+    parser.set_element_class_lookup(
+        lxml.etree.ElementDefaultClassLookup(element=DOMElement)
+    )
+    return parser
 
-    def set_content_handler(dom_handler):
-        def startElementNS(name, tagName, attrs):
-            orig_start_cb(name, tagName, attrs)
-            cur_elem = dom_handler.elementStack[-1]
-            cur_elem.parse_position = (
-                parser._parser.CurrentLineNumber,  # type: ignore
-                parser._parser.CurrentColumnNumber,  # type: ignore
-            )
 
-        orig_start_cb = dom_handler.startElementNS
-        dom_handler.startElementNS = startElementNS
-        orig_set_content_handler(dom_handler)
+def _read_long_line_numbers(xml_path, root):
+    """
+    Map elements that start past line 65535 to their real line number.
+
+    Beyond MAX_SOURCELINE libxml2 reports the line of an element's first
+    child instead, which is off when the start tag ends its line. For such
+    files an expat pass records every start tag's line in document order.
+    The returned dict holds the elements, which keeps their proxies alive.
 
-    parser = defusedxml.sax.make_parser()
-    orig_set_content_handler = parser.setContentHandler
-    parser.setContentHandler = set_content_handler  # type: ignore
-    return parser
+    Returns:
+        dict: DOMElement -> line number (empty for shorter files)
+    """
+    data = Path(xml_path).read_bytes()
+    if data.count(b"\n") < MAX_SOURCELINE - 1:
+        return {}
+
+    def forbid_entities(*args):
+        raise ValueError("Entity declarations are not allowed")
+
+    lines = []
+    parser = xml.parsers.expat.ParserCreate()
+    parser.StartElementHandler = lambda name, attrs: lines.append(
+        parser.CurrentLineNumber
+    )
+    parser.EntityDeclHandler = forbid_entities
+    parser.Parse(data, True)
+    return {
+        elem: line
+        for elem, line in zip(root.iter(lxml.etree.Element), lines)
+        if line >= MAX_SOURCELINE
+    }
+
+
+def _qualified_name(elem):
+    """Return the element name as written, e.g. 'w:p'."""
+    local = lxml.etree.QName(elem).localname
+    return f"{elem.prefix}:{local}" if elem.prefix else local
+
+
+def _tag_key(elem, name):
+    """Resolve a qualified element name to lxml's {uri}local form, or None."""
+    prefix, _, local = name.rpartition(":")
+    uri = elem.nsmap.get(prefix or None)
+    if prefix and uri is None:
+        return None
+    return f"{{{uri}}}{local}" if uri else local
+
+
+def _attribute_key(elem, name):
+    """Resolve a qualified attribute name to lxml's {uri}local form, or None."""
+    prefix, _, local = name.rpartition(":")
+    if not prefix:
+        return local  # Unprefixed attributes have no namespace
+    if prefix == "xml":
+        return f"{{{XML_NAMESPACE}}}{local}"
+    uri = elem.nsmap.get(prefix)
+    return f"{{{uri}}}{local}" if uri else None
+
+
+def _count_change(node):
+    """Count an insert or remove in the document that holds node."""
+    root = node.getroottree().getroot()
+    _dom_changes[root] = _dom_changes.get(root, 0) + 1
+
+
+def _detach(node):
+    """Remove a node from its parent, leaving the text that follows it in place."""
+    parent = node.getparent()
+    if parent is None:
+        return
+    _count_change(parent)
+    if node.tail:
+        previous = node.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or "") + node.tail
+        else:
+            parent.text = (parent.text or "") + node.tail
+    node.tail = None
+    parent.remove(node)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The editing scripts import each other as scripts.* and ooxml.*, relative to skills/docx
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,53 @@
+"""XMLEditor.get_node lookups after edits made through the editor and the DOM helpers."""
+
+import pytest
+
+from scripts.utilities import XMLEditor
+
+W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+W14 = "http://schemas.microsoft.com/office/word/2010/wordml"
+
+
+@pytest.fixture
+def editor(tmp_path):
+    path = tmp_path / "document.xml"
+    path.write_text(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<w:document xmlns:w="{W}" xmlns:w14="{W14}">\n'
+        "<w:body>\n"
+        '<w:p w14:paraId="00000001"><w:r><w:t>a</w:t></w:r></w:p>\n'
+        '<w:p w14:paraId="00000002"><w:r><w:t>b</w:t></w:r></w:p>\n'
+        "</w:body>\n"
+        "</w:document>\n",
+        encoding="utf-8",
+    )
+    return XMLEditor(str(path))
+
+
+def _para(editor, para_id):
+    return editor.get_node(tag="w:p", attrs={"w14:paraId": para_id})
+
+
+def test_clone_appended_after_remove_is_found(editor):
+    a, b = _para(editor, "00000001"), _para(editor, "00000002")
+    body = editor.get_node(tag="w:body")
+    # One removed and one inserted element: the tree size is unchanged
+    body.removeChild(a)
+    body.appendChild(b.cloneNode(True))
+    with pytest.raises(ValueError, match="Multiple nodes found"):
+        _para(editor, "00000002")
+    with pytest.raises(ValueError, match="Node not found"):
+        _para(editor, "00000001")
+
+
+def test_editing_methods_keep_lookups_current(editor):
+    first = _para(editor, "00000001")
+    editor.insert_after(first, '<w:p w14:paraId="00000003"><w:r><w:t>c</w:t></w:r></w:p>')
+    editor.replace_node(_para(editor, "00000002"), '<w:p w14:paraId="00000004"/>')
+    editor.append_to(editor.get_node(tag="w:body"), '<w:p w14:paraId="00000003"/>')
+    assert editor._index.is_current()
+    with pytest.raises(ValueError, match="Multiple nodes found"):
+        _para(editor, "00000003")
+    with pytest.raises(ValueError, match="Node not found"):
+        _para(editor, "00000002")
+    assert _para(editor, "00000004").getparent() is editor.get_node(tag="w:body")
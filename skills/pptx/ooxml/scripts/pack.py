@@ -7,14 +7,25 @@ Example usage:
 """
 
 import argparse
-import shutil
+import io
 import subprocess
 import sys
 import tempfile
-import defusedxml.minidom
 import zipfile
 from pathlib import Path
 
+import lxml.etree
+
+# Media formats that are already compressed; deflating them again only costs time
+STORED_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".tif", ".tiff", ".webp",
+    ".mp3", ".m4a", ".wav", ".wma", ".mp4", ".m4v", ".mov", ".avi", ".wmv",
+    ".zip", ".docx", ".pptx", ".xlsx",
+}
+
+# No entity expansion or network access while condensing untrusted XML
+_PARSER = lxml.etree.XMLParser(resolve_entities=False, no_network=True)
+
 
 def main():
     parser = argparse.ArgumentParser(description="Pack a directory into an Office file")
@@ -61,28 +72,30 @@ def pack_document(input_dir, output_file, validate=False):
     if output_file.suffix.lower() not in {".docx", ".pptx", ".xlsx"}:
         raise ValueError(f"{output_file} must be a .docx, .pptx, or .xlsx file")
 
-    # Work in temporary directory to avoid modifying original
-    with tempfile.TemporaryDirectory() as temp_dir:
-        temp_content_dir = Path(temp_dir) / "content"
-        shutil.copytree(input_dir, temp_content_dir)
-
-        # Process XML files to remove pretty-printing whitespace
-        for pattern in ["*.xml", "*.rels"]:
-            for xml_file in temp_content_dir.rglob(pattern):
-                condense_xml(xml_file)
-
-        # Create final Office file as zip archive
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-        with zipfile.ZipFile(output_file, "w", zipfile.ZIP_DEFLATED) as zf:
-            for f in temp_content_dir.rglob("*"):
-                if f.is_file():
-                    zf.write(f, f.relative_to(temp_content_dir))
-
-        # Validate if requested
-        if validate:
-            if not validate_document(output_file):
-                output_file.unlink()  # Delete the corrupt file
-                return False
+    # [Content_Types].xml goes first, as Office itself writes it
+    files = sorted(
+        (f for f in input_dir.rglob("*") if f.is_file()),
+        key=lambda f: (f.name != "[Content_Types].xml", f.relative_to(input_dir)),
+    )
+
+    # Stream parts straight into the archive: XML is condensed in memory,
+    # everything else is copied from disk without an intermediate copy
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(output_file, "w", zipfile.ZIP_DEFLATED) as zf:
+        for f in files:
+            arcname = f.relative_to(input_dir).as_posix()
+            if f.suffix in {".xml", ".rels"} or f.name == ".rels":
+                zf.writestr(arcname, condense_xml_bytes(f.read_bytes()))
+            elif f.suffix.lower() in STORED_EXTENSIONS:
+                zf.write(f, arcname, compress_type=zipfile.ZIP_STORED)
+            else:
+                zf.write(f, arcname)
+
+    # Validate if requested
+    if validate:
+        if not validate_document(output_file):
+            output_file.unlink()  # Delete the corrupt file
+            return False
 
     return True
 
@@ -132,27 +145,42 @@ def validate_document(doc_path):
 
 def condense_xml(xml_file):
     """Strip unnecessary whitespace and remove comments."""
-    with open(xml_file, "r", encoding="utf-8") as f:
-        dom = defusedxml.minidom.parse(f)
+    xml_file = Path(xml_file)
+    xml_file.write_bytes(condense_xml_bytes(xml_file.read_bytes()))
+
+
+def condense_xml_bytes(data):
+    """Return XML with whitespace-only text and comments removed.
+
+    Text inside prefixed t elements (w:t, a:t, ...) is left untouched.
+    """
+    tree = lxml.etree.parse(io.BytesIO(data), _PARSER)
 
-    # Process each element to remove whitespace and comments
-    for element in dom.getElementsByTagName("*"):
+    for element in tree.getroot().iter(tag=lxml.etree.Element):
         # Skip w:t elements and their processing
-        if element.tagName.endswith(":t"):
+        if element.prefix and lxml.etree.QName(element).localname == "t":
             continue
 
-        # Remove whitespace-only text nodes and comment nodes
-        for child in list(element.childNodes):
-            if (
-                child.nodeType == child.TEXT_NODE
-                and child.nodeValue
-                and child.nodeValue.strip() == ""
-            ) or child.nodeType == child.COMMENT_NODE:
-                element.removeChild(child)
-
-    # Write back the condensed XML
-    with open(xml_file, "wb") as f:
-        f.write(dom.toxml(encoding="UTF-8"))
+        # Remove whitespace-only text nodes
+        if element.text and element.text.strip() == "":
+            element.text = None
+        for child in element:
+            if child.tail and child.tail.strip() == "":
+                child.tail = None
+
+        # Remove comment nodes, keeping the text that follows them
+        for comment in [c for c in element if c.tag is lxml.etree.Comment]:
+            if comment.tail:
+                previous = comment.getprevious()
+                if previous is not None:
+                    previous.tail = (previous.tail or "") + comment.tail
+                else:
+                    element.text = (element.text or "") + comment.tail
+            element.remove(comment)
+
+    standalone = ' standalone="yes"' if tree.docinfo.standalone else ""
+    declaration = f'<?xml version="1.0" encoding="UTF-8"{standalone}?>'
+    return declaration.encode() + lxml.etree.tostring(tree, encoding="UTF-8")
 
 
 if __name__ == "__main__":
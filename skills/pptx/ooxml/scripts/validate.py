@@ -4,37 +4,41 @@ Command line tool to validate Office document XML files against XSD schemas and
 
 Usage:
     python validate.py <dir> --original <original_file>
+
+Compiling the XSD schemas dominates a single run. To reuse compiled schemas
+across runs, keep a validation service running:
+
+    python validate.py --serve                      # JSON lines on stdin/stdout
+    python validate.py --serve --socket <path>      # local Unix socket
+
+With --socket, later invocations send their request to the running service
+and fall back to validating in-process when it is not reachable:
+
+    python validate.py <dir> --original <original_file> --socket <path>
+
+A request is one JSON object per line:
+    {"unpacked_dir": "...", "original": "...", "verbose": false}
+and the reply is:
+    {"success": true, "output": "<validator output>"}
 """
 
 import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
 import sys
 from pathlib import Path
 
 from validation import DOCXSchemaValidator, PPTXSchemaValidator, RedliningValidator
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Validate Office document XML files")
-    parser.add_argument(
-        "unpacked_dir",
-        help="Path to unpacked Office document directory",
-    )
-    parser.add_argument(
-        "--original",
-        required=True,
-        help="Path to original file (.docx/.pptx/.xlsx)",
-    )
-    parser.add_argument(
-        "-v",
-        "--verbose",
-        action="store_true",
-        help="Enable verbose output",
-    )
-    args = parser.parse_args()
-
-    # Validate paths
-    unpacked_dir = Path(args.unpacked_dir)
-    original_file = Path(args.original)
+def validate(unpacked_dir, original_file, verbose=False):
+    """Run the validators for original_file's type. Returns True if all pass."""
+    unpacked_dir = Path(unpacked_dir)
+    original_file = Path(original_file)
     file_extension = original_file.suffix.lower()
     assert unpacked_dir.is_dir(), f"Error: {unpacked_dir} is not a directory"
     assert original_file.is_file(), f"Error: {original_file} is not a file"
@@ -50,18 +54,134 @@ def main():
             validators = [PPTXSchemaValidator]
         case _:
             print(f"Error: Validation not supported for file type {file_extension}")
-            sys.exit(1)
+            return False
 
     # Run validators
     success = True
     for V in validators:
-        validator = V(unpacked_dir, original_file, verbose=args.verbose)
+        validator = V(unpacked_dir, original_file, verbose=verbose)
         if not validator.validate():
             success = False
 
     if success:
         print("All validations PASSED!")
 
+    return success
+
+
+def handle_request(line):
+    """Validate one JSON request line and return the JSON reply line."""
+    output = io.StringIO()
+    try:
+        request = json.loads(line)
+        with contextlib.redirect_stdout(output):
+            success = validate(
+                request["unpacked_dir"],
+                request["original"],
+                verbose=bool(request.get("verbose", False)),
+            )
+    except AssertionError as e:
+        success = False
+        output.write(f"{e}\n")
+    except Exception as e:
+        success = False
+        output.write(f"Error: {e}\n")
+    return json.dumps({"success": success, "output": output.getvalue()}) + "\n"
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if line.strip():
+                self.wfile.write(handle_request(line).encode("utf-8"))
+                self.wfile.flush()
+
+
+def serve(socket_path=None):
+    """Serve validation requests from stdin, or from a Unix socket if given."""
+    if socket_path is None:
+        for line in sys.stdin:
+            if line.strip():
+                sys.stdout.write(handle_request(line))
+                sys.stdout.flush()
+        return
+
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(socket_path)
+    # Requests are handled one at a time: compiled schemas are not thread-safe
+    with socketserver.UnixStreamServer(socket_path, _RequestHandler) as server:
+        print(f"Validation service listening on {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
+
+
+def request_service(socket_path, unpacked_dir, original_file, verbose):
+    """Send one request to a running service. Returns the reply, or None if unreachable."""
+    request = {
+        # The service may run from another working directory
+        "unpacked_dir": str(Path(unpacked_dir).resolve()),
+        "original": str(Path(original_file).resolve()),
+        "verbose": verbose,
+    }
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+            client.sendall((json.dumps(request) + "\n").encode("utf-8"))
+            with client.makefile("r", encoding="utf-8") as reply:
+                line = reply.readline()
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    return json.loads(line) if line else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate Office document XML files")
+    parser.add_argument(
+        "unpacked_dir",
+        nargs="?",
+        help="Path to unpacked Office document directory",
+    )
+    parser.add_argument(
+        "--original",
+        help="Path to original file (.docx/.pptx/.xlsx)",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Enable verbose output",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run as a validation service that keeps compiled schemas in memory",
+    )
+    parser.add_argument(
+        "--socket",
+        help="Unix socket path of the validation service",
+    )
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.socket)
+        return
+
+    if not args.unpacked_dir or not args.original:
+        parser.error("unpacked_dir and --original are required")
+
+    if args.socket:
+        reply = request_service(
+            args.socket, args.unpacked_dir, args.original, args.verbose
+        )
+        if reply is not None:
+            sys.stdout.write(reply["output"])
+            sys.exit(0 if reply["success"] else 1)
+
+    success = validate(args.unpacked_dir, args.original, verbose=args.verbose)
     sys.exit(0 if success else 1)
 
 
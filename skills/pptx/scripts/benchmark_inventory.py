@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Benchmark inventory overflow estimation against the previous wrapping code.
+
+Generates a synthetic deck with English and Traditional Chinese text boxes,
+then compares the TextMeasurer wrapping engine with the old one, which
+measured every line prefix with ImageDraw.textlength:
+- wrap time over every paragraph line in the deck
+- wrapped line counts, English and Chinese reported separately
+- extract_text_inventory time and frame_overflow_bottom results
+
+The old engine never wraps text without spaces, so Chinese line counts are
+expected to differ; English results should match within a few lines.
+
+Usage:
+    python scripts/benchmark_inventory.py [--slides 200] [--font Arial]
+"""
+
+import argparse
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from fonts import get_font, text_measurer
+from inventory import ShapeData, extract_text_inventory
+from PIL import Image, ImageDraw
+from pptx import Presentation
+from pptx.util import Inches, Pt
+
+ENGLISH_WORDS = (
+    "the quarterly revenue grew across every region while operating costs "
+    "remained flat and the board approved expansion into three new markets"
+).split()
+
+CHINESE_TEXT = (
+    "本季營收在各區域皆有成長，營運成本維持持平，董事會已核准進軍三個新市場。"
+    "我們將持續投資研發，並強化客戶服務品質，以提升長期競爭力。"
+)
+
+
+def write_deck(path, slides, font_name):
+    """Write a deck whose slides alternate English and Chinese text boxes."""
+    prs = Presentation()
+    layout = prs.slide_layouts[6]  # Blank
+    for i in range(slides):
+        slide = prs.slides.add_slide(layout)
+        for j in range(4):
+            box = slide.shapes.add_textbox(
+                Inches(0.5 + (j % 2) * 4.6),
+                Inches(0.5 + (j // 2) * 3.4),
+                Inches(4.2),
+                Inches(3.0),
+            )
+            text_frame = box.text_frame
+            text_frame.word_wrap = True
+            for k in range(3 + (i + j) % 4):
+                paragraph = (
+                    text_frame.paragraphs[0] if k == 0 else text_frame.add_paragraph()
+                )
+                if (i + j) % 2:
+                    start = (i * 7 + j * 3 + k) % len(CHINESE_TEXT)
+                    text = (CHINESE_TEXT * 2)[start : start + 20 + (i + k) % 40]
+                else:
+                    count = 8 + (i + j + k) % 30
+                    text = " ".join(
+                        ENGLISH_WORDS[(i + n) % len(ENGLISH_WORDS)] for n in range(count)
+                    )
+                run = paragraph.add_run()
+                run.text = text
+                run.font.name = font_name
+                run.font.size = Pt(14 + (i + k) % 4 * 4)
+                run.font.bold = k == 0
+    prs.save(str(path))
+
+
+def _wrap_textlength(line, max_width_px, draw, font):
+    """The previous _wrap_text_line: re-measure the whole prefix per word."""
+    if not line:
+        return [""]
+
+    if draw.textlength(line, font=font) <= max_width_px:
+        return [line]
+
+    wrapped = []
+    words = line.split(" ")
+    current_line = ""
+
+    for word in words:
+        test_line = current_line + (" " if current_line else "") + word
+        if draw.textlength(test_line, font=font) <= max_width_px:
+            current_line = test_line
+        else:
+            if current_line:
+                wrapped.append(current_line)
+            current_line = word
+
+    if current_line:
+        wrapped.append(current_line)
+
+    return wrapped
+
+
+def collect_lines(inventory):
+    """Collect (line, font, usable width) for every paragraph line in the deck."""
+    cases = []
+    for shapes in inventory.values():
+        for shape_data in shapes.values():
+            text_frame = shape_data.shape.text_frame
+            width, _ = shape_data._get_usable_dimensions(text_frame)
+            default_size = shape_data._get_default_font_size()
+            for para_data, paragraph in zip(
+                shape_data.paragraphs,
+                [p for p in text_frame.paragraphs if p.text.strip()],
+            ):
+                font = get_font(
+                    para_data.font_name or "Arial",
+                    int(para_data.font_size or default_size),
+                    bold=bool(para_data.bold),
+                    italic=bool(para_data.italic),
+                )
+                for line in paragraph.text.split("\n"):
+                    cases.append((line, font, width))
+    return cases
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def compare_wrapping(cases):
+    """Time both engines and compare their wrapped line counts."""
+    draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    old, old_time = _timed(
+        lambda: [_wrap_textlength(line, width, draw, font) for line, font, width in cases]
+    )
+    text_measurer.cache_clear()
+    new, new_time = _timed(
+        lambda: [text_measurer(font).wrap(line, width) for line, font, width in cases]
+    )
+
+    print(
+        f"wrap     {len(cases)} lines   old {old_time * 1000:8.1f} ms   "
+        f"new {new_time * 1000:8.1f} ms   ({old_time / new_time:.1f}x)"
+    )
+    for script, pattern in (("English", r"^[\x00-\x7f]*$"), ("Chinese", r"[^\x00-\x7f]")):
+        selected = [i for i, (line, _, _) in enumerate(cases) if re.search(pattern, line)]
+        old_count = sum(len(old[i]) for i in selected)
+        new_count = sum(len(new[i]) for i in selected)
+        differing = sum(1 for i in selected if len(old[i]) != len(new[i]))
+        print(
+            f"{'':<8} {script:<8} wrapped lines old {old_count:6d}   "
+            f"new {new_count:6d}   paragraphs differing {differing}/{len(selected)}"
+        )
+
+
+def compare_overflow(deck_path):
+    """Run extract_text_inventory with each engine and compare overflow results."""
+
+    def old_wrap(self, line, max_width_px, font):
+        return _wrap_textlength(line, max_width_px, draw, font)
+
+    draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    new_wrap = ShapeData._wrap_text_line
+    ShapeData._wrap_text_line = old_wrap
+    try:
+        old, old_time = _timed(extract_text_inventory, deck_path)
+    finally:
+        ShapeData._wrap_text_line = new_wrap
+    text_measurer.cache_clear()
+    new, new_time = _timed(extract_text_inventory, deck_path)
+
+    differing = []
+    for slide_key, shapes in old.items():
+        for shape_key, shape_data in shapes.items():
+            before = shape_data.frame_overflow_bottom or 0.0
+            after = new[slide_key][shape_key].frame_overflow_bottom or 0.0
+            if before != after:
+                differing.append(abs(after - before))
+    total = sum(len(shapes) for shapes in old.values())
+    print(
+        f"inventory old {old_time * 1000:8.1f} ms   new {new_time * 1000:8.1f} ms   "
+        f"overflow differs on {len(differing)}/{total} shapes"
+        + (f" (max {max(differing):.2f} in)" if differing else "")
+    )
+    return new
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inventory text wrapping")
+    parser.add_argument("--slides", type=int, default=200)
+    parser.add_argument("--font", default="Arial")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        deck_path = Path(temp_dir) / "deck.pptx"
+        write_deck(deck_path, args.slides, args.font)
+        print(f"{args.slides} slides, font {args.font!r}")
+
+        inventory = compare_overflow(deck_path)
+        compare_wrapping(collect_lines(inventory))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Resolve font names to font files and load fonts for text measurement.
+
+The platform font directories are scanned once into a family/style index,
+fontconfig-style. The index is cached on disk and reused until one of the
+scanned directories changes (their mtimes are the cache key). Loaded fonts are
+kept in an LRU cache keyed by (path, size), so measuring many paragraphs in the
+same font loads the file once.
+
+Text is wrapped by TextMeasurer, which caches the advance width of each word
+per font and sums them instead of re-measuring every line prefix.
+
+Classes:
+    FontIndex: Installed fonts by family/style and file name
+    TextMeasurer: Cached word widths and greedy line wrapping for one font
+
+Main Functions:
+    get_font: Load a font by family name, size and style
+    find_font: Resolve a family name to a font file
+    load_font: Load a font file at a size (cached)
+    text_measurer: Get the shared TextMeasurer for a font
+
+Usage:
+    from fonts import get_font, text_measurer
+    font = get_font("Calibri", 18, bold=True)
+    lines = text_measurer(font).wrap("Some long text", max_width_px=200)
+"""
+
+import json
+import os
+import platform
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from PIL import ImageFont
+
+# Bump when the on-disk index format changes
+INDEX_VERSION = 1
+
+# Faces to probe in a font collection (.ttc) before giving up
+MAX_COLLECTION_FACES = 64
+
+# Style names that mean "not bold, not italic"
+REGULAR_STYLES = {"regular", "normal", "book", "roman", "plain", "medium"}
+
+# Characters that can be broken between, as in Chinese and Japanese text.
+# Korean (Hangul) uses spaces between words and is wrapped at spaces.
+CJK_CHARACTERS = (
+    "\u2e80-\u2fdf"  # CJK radicals, Kangxi radicals
+    "\u3000-\u303f"  # CJK symbols and punctuation
+    "\u3040-\u30ff"  # Hiragana, Katakana
+    "\u3100-\u312f\u31a0-\u31bf"  # Bopomofo
+    "\u3400-\u4dbf\u4e00-\u9fff"  # CJK unified ideographs and extension A
+    "\uf900-\ufaff"  # CJK compatibility ideographs
+    "\ufe30-\ufe4f"  # CJK compatibility forms
+    "\uff00-\uffef"  # Halfwidth and fullwidth forms
+    "\U00020000-\U0002fa1f"  # CJK extensions B onwards
+)
+
+# Punctuation that must not end a line; it stays with the following character
+CJK_OPENING_PUNCTUATION = "（［｛〔〈《「『【〘〖〝‘“"
+
+# Punctuation that must not start a line; it stays with the preceding character
+CJK_CLOSING_PUNCTUATION = "、。，．：；？！）］｝〕〉》」』】〙〗〟’”…‥ー・ゝゞヽヾ々"
+
+# A breakable unit: one CJK character with its surrounding opening and closing
+# punctuation, or a run of other characters
+_BREAK_UNIT = re.compile(
+    f"[{CJK_OPENING_PUNCTUATION}]*[{CJK_CHARACTERS}][{CJK_CLOSING_PUNCTUATION}]*"
+    f"|[^{CJK_CHARACTERS}]+"
+)
+
+# (path, face index) of a font file
+FontLocation = Tuple[str, int]
+
+
+def font_directories() -> Tuple[List[str], List[str]]:
+    """Get the font directories and file extensions for this platform.
+
+    Returns:
+        Tuple of (directories in priority order, lowercase file extensions)
+    """
+    if platform.system() == "Darwin":  # macOS
+        font_dirs = [
+            "/System/Library/Fonts/",
+            "/Library/Fonts/",
+            "~/Library/Fonts/",
+        ]
+        extensions = [".ttf", ".otf", ".ttc", ".dfont"]
+    else:  # Linux
+        font_dirs = [
+            "/usr/share/fonts/truetype/",
+            "/usr/local/share/fonts/",
+            "~/.fonts/",
+        ]
+        extensions = [".ttf", ".otf"]
+    return [str(Path(d).expanduser()) for d in font_dirs], extensions
+
+
+def default_cache_path() -> Path:
+    """Location of the on-disk font index."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or "~/.cache"
+    return Path(cache_home).expanduser() / "pptx-skill" / "font-index.json"
+
+
+class FontIndex:
+    """Index of installed fonts by family/style and by file name."""
+
+    def __init__(
+        self,
+        dir_mtimes: Dict[str, Optional[int]],
+        files: List[str],
+        faces: List[Tuple[str, str, str, int]],
+    ):
+        """
+        Args:
+            dir_mtimes: Every scanned directory -> mtime_ns (None if missing)
+            files: Font file paths in directory priority order
+            faces: (family, style, path, face index) for each readable face
+        """
+        self.dir_mtimes = dir_mtimes
+        self.files = files
+        self.faces = faces
+
+        # family -> style -> location; the first face found wins
+        self.families: Dict[str, Dict[str, FontLocation]] = {}
+        for family, style, path, index in faces:
+            styles = self.families.setdefault(_normalize(family), {})
+            styles.setdefault(_style_key(style), (path, index))
+
+        # file stem -> path, for matching font names against file names
+        self.stems: Dict[str, str] = {}
+        for path in files:
+            self.stems.setdefault(Path(path).stem, path)
+
+        self._resolved: Dict[Tuple[str, bool, bool], Optional[FontLocation]] = {}
+
+    @classmethod
+    def load(
+        cls,
+        font_dirs: List[str],
+        extensions: List[str],
+        cache_path: Optional[Path] = None,
+    ) -> "FontIndex":
+        """Load the cached index, rebuilding it if any font directory changed."""
+        if cache_path is not None:
+            index = cls._read_cache(cache_path, font_dirs)
+            if index is not None:
+                return index
+
+        index = cls.build(font_dirs, extensions)
+        if cache_path is not None:
+            index._write_cache(cache_path, font_dirs)
+        return index
+
+    @classmethod
+    def build(cls, font_dirs: List[str], extensions: List[str]) -> "FontIndex":
+        """Scan the font directories recursively and read each face's names."""
+        dir_mtimes: Dict[str, Optional[int]] = {}
+        files: List[str] = []
+        for font_dir in font_dirs:
+            _scan_directory(font_dir, extensions, dir_mtimes, files)
+
+        faces = []
+        for path in files:
+            for index in range(MAX_COLLECTION_FACES):
+                try:
+                    family, style = ImageFont.truetype(path, index=index).getname()
+                except Exception:
+                    break
+                if family:
+                    faces.append((family, style or "", path, index))
+                if not path.lower().endswith(".ttc"):
+                    break
+
+        return cls(dir_mtimes, files, faces)
+
+    def find(
+        self, font_name: str, bold: bool = False, italic: bool = False
+    ) -> Optional[FontLocation]:
+        """Resolve a font name to a font file.
+
+        The family/style index is tried first, preferring the requested style,
+        then the regular face, then any face of the family. Failing that, font
+        files are matched by name: exact file names first, then file names
+        containing the font name.
+
+        Args:
+            font_name: Name of the font (e.g., 'Arial', 'Calibri')
+            bold: Prefer a bold face
+            italic: Prefer an italic face
+
+        Returns:
+            (path, face index) of the font file, or None if not found
+        """
+        key = (font_name, bold, italic)
+        if key not in self._resolved:
+            self._resolved[key] = self._find(font_name, bold, italic)
+        return self._resolved[key]
+
+    def _find(
+        self, font_name: str, bold: bool, italic: bool
+    ) -> Optional[FontLocation]:
+        """Uncached lookup for find()."""
+        styles = self.families.get(_normalize(font_name))
+        if styles:
+            wanted = _style_key(("bold " if bold else "") + ("italic" if italic else ""))
+            for style in (wanted, "regular"):
+                if style in styles:
+                    return styles[style]
+            return next(iter(styles.values()))
+
+        # Common font file variations to try
+        font_variations = [
+            font_name,
+            font_name.lower(),
+            font_name.replace(" ", ""),
+            font_name.replace(" ", "-"),
+        ]
+        for variant in font_variations:
+            if variant in self.stems:
+                return self.stems[variant], 0
+
+        font_name_lower = font_name.lower().replace(" ", "")
+        for path in self.files:
+            if font_name_lower in Path(path).name.lower():
+                return path, 0
+
+        return None
+
+    @classmethod
+    def _read_cache(
+        cls, cache_path: Path, font_dirs: List[str]
+    ) -> Optional["FontIndex"]:
+        """Read the cached index if it is still valid for font_dirs."""
+        try:
+            data = json.loads(cache_path.read_text(encoding="utf-8"))
+            if data.get("version") != INDEX_VERSION or data.get("roots") != font_dirs:
+                return None
+            dir_mtimes = data["dirs"]
+            # New or removed subdirectories change their parent's mtime
+            for directory, mtime in dir_mtimes.items():
+                if _mtime(directory) != mtime:
+                    return None
+            faces = [tuple(face) for face in data["faces"]]
+            return cls(dir_mtimes, data["files"], faces)  # type: ignore[arg-type]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_cache(self, cache_path: Path, font_dirs: List[str]) -> None:
+        """Write the index to disk; an unwritable cache is not an error."""
+        data = {
+            "version": INDEX_VERSION,
+            "roots": font_dirs,
+            "dirs": self.dir_mtimes,
+            "files": self.files,
+            "faces": self.faces,
+        }
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+            temp_path.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(temp_path, cache_path)
+        except OSError:
+            pass
+
+
+_FONT_INDEX: Optional[FontIndex] = None
+
+
+def font_index() -> FontIndex:
+    """Get the process-wide font index, loading it on first use."""
+    global _FONT_INDEX
+    if _FONT_INDEX is None:
+        font_dirs, extensions = font_directories()
+        _FONT_INDEX = FontIndex.load(font_dirs, extensions, default_cache_path())
+    return _FONT_INDEX
+
+
+def find_font(
+    font_name: str, bold: bool = False, italic: bool = False
+) -> Optional[FontLocation]:
+    """Resolve a font name to (path, face index) using the font index."""
+    return font_index().find(font_name, bold=bold, italic=italic)
+
+
+@lru_cache(maxsize=128)
+def load_font(path: Optional[str], size: int, index: int = 0):
+    """Load a font file at the given size, falling back to PIL's default font.
+
+    Args:
+        path: Font file path, or None for the default font
+        size: Font size in pixels
+        index: Face index within a font collection
+
+    Returns:
+        A FreeTypeFont, or PIL's default font if the file cannot be loaded
+    """
+    if path:
+        try:
+            return ImageFont.truetype(path, size=size, index=index)
+        except Exception:
+            pass
+    return ImageFont.load_default()
+
+
+def get_font(font_name: str, size: int, bold: bool = False, italic: bool = False):
+    """Load a font by family name, size and style.
+
+    Args:
+        font_name: Name of the font (e.g., 'Arial', 'Calibri')
+        size: Font size in pixels
+        bold: Prefer a bold face
+        italic: Prefer an italic face
+
+    Returns:
+        The matching font, or PIL's default font if none is installed
+    """
+    location = find_font(font_name, bold=bold, italic=italic)
+    if location is None:
+        return load_font(None, size)
+    return load_font(location[0], size, location[1])
+
+
+class TextMeasurer:
+    """Measure and wrap text in one font using cached advance widths."""
+
+    def __init__(self, font):
+        """
+        Args:
+            font: A PIL font (FreeTypeFont or the default font)
+        """
+        self.font = font
+        self.space_width = font.getlength(" ")
+        self._widths: Dict[str, float] = {}
+
+    def width(self, text: str) -> float:
+        """Advance width of text in pixels, measured once per distinct text."""
+        width = self._widths.get(text)
+        if width is None:
+            width = self._widths[text] = self.font.getlength(text)
+        return width
+
+    def wrap(self, line: str, max_width_px: float) -> List[str]:
+        """Wrap a single line of text to fit within max_width_px.
+
+        Lines break at spaces and between CJK characters. The width of a line
+        is the sum of its words' advances plus one space width per space, so
+        each distinct word is measured once rather than every line prefix
+        being measured again; kerning across spaces is ignored. A word wider
+        than max_width_px is kept on its own line.
+        """
+        if not line:
+            return [""]
+
+        wrapped = []
+        current_line = ""
+        current_width = 0.0
+        for word in line.split(" "):
+            units = _BREAK_UNIT.findall(word) or [""]
+            for position, unit in enumerate(units):
+                # Words are joined by a space, CJK units within a word are not
+                separator = " " if position == 0 and current_line else ""
+                unit_width = self.width(unit)
+                width = current_width + unit_width
+                if separator:
+                    width += self.space_width
+                if width <= max_width_px:
+                    current_line += separator + unit
+                    current_width = width
+                else:
+                    if current_line:
+                        wrapped.append(current_line)
+                    current_line = unit
+                    current_width = unit_width
+
+        if current_line or not wrapped:
+            wrapped.append(current_line)
+
+        return wrapped
+
+
+@lru_cache(maxsize=128)
+def text_measurer(font) -> TextMeasurer:
+    """Get the TextMeasurer for a font, sharing its width cache across shapes."""
+    return TextMeasurer(font)
+
+
+def _scan_directory(
+    directory: str,
+    extensions: List[str],
+    dir_mtimes: Dict[str, Optional[int]],
+    files: List[str],
+) -> None:
+    """Record directory's mtime and collect its font files, recursively."""
+    dir_mtimes[directory] = _mtime(directory)
+    try:
+        entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+    except OSError:
+        return
+
+    subdirectories = []
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                subdirectories.append(entry.path)
+            elif entry.is_file() and entry.name.lower().endswith(tuple(extensions)):
+                files.append(entry.path)
+        except OSError:
+            continue
+
+    # Files directly in a directory take priority over those in subdirectories
+    for subdirectory in subdirectories:
+        if subdirectory not in dir_mtimes:
+            _scan_directory(subdirectory, extensions, dir_mtimes, files)
+
+
+def _mtime(path: str) -> Optional[int]:
+    """Modification time of path in nanoseconds, or None if it is missing."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _normalize(family: str) -> str:
+    """Normalize a family name for lookup: case- and space-insensitive."""
+    return family.lower().replace(" ", "").replace("-", "")
+
+
+def _style_key(style: str) -> str:
+    """Reduce a style name to one of regular, bold, italic or bold italic."""
+    words = set(style.lower().replace("-", " ").split())
+    bold = bool(words & {"bold", "black", "heavy", "semibold", "demibold"})
+    italic = bool(words & {"italic", "oblique"})
+    if bold and italic:
+        return "bold italic"
+    if bold:
+        return "bold"
+    if italic:
+        return "italic"
+    if not words or words & REGULAR_STYLES:
+        return "regular"
+    return " ".join(sorted(words))